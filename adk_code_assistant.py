@@ -1,230 +1,1020 @@
 import asyncio
+from collections import defaultdict
 from contextlib import AsyncExitStack
+from functools import singledispatch # For extracting reply text by response type
+import hashlib # For the GitHub MCP container label and the tool cache keys
+import threading # For the background MCP event loop
 import os # For GITHUB_TOKEN and OPENAI_API_KEY
+import random # For jittering queued get_website_content calls
+import re # For parsing the get_website_content input
+import subprocess # For starting long-running HTTP MCP servers
+import sys # For finding web_retriever if the RAG tool loaded it
 import requests # For Dify API calls
-import json # For Dify API calls
+from requests.adapters import HTTPAdapter # For the pooled Dify session
+from urllib3.util.retry import Retry # For retrying failed Dify connections
+import json # For Dify API calls and the MCP tool cache
+import logging # For the MCP startup summary
+from pathlib import Path # For the MCP tool cache location
+from urllib.parse import urlparse # For validating the get_website_content URL
 from datetime import datetime # For timestamped debug messages
 import traceback # For detailed error logging
 
-# Attempt to import ADK components.
+logger = logging.getLogger(__name__)
+
+# Optional: uvloop is a faster drop-in event loop for this socket- and pipe-heavy workload (MCP
+# server pipes, HTTP MCP servers, OpenAI calls). Without it the standard asyncio loop is used.
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Optional: orjson encodes and parses the Dify request and response bodies several times faster
+# than the stdlib json module. Its JSONDecodeError subclasses json.JSONDecodeError, so error
+# handling is the same either way.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Attempt to import ADK components. web_retriever (LangChain, OpenAI, FAISS) is not imported here:
+# it is the heaviest dependency tree and only the get_website_content tool needs it, so it is
+# loaded on that tool's first call.
 try:
     from google.adk.agents import LlmAgent
-    from google.adk.tools import Tool 
+    from google.adk.tools import FunctionTool
+    from google.adk.tools.base_tool import BaseTool
     from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset, StdioServerParameters
-    # Updated import: from get_web_content to create_vector_store_from_url
-    from web_retriever import create_vector_store_from_url 
+    from google.genai import types as genai_types
+    # Needed to describe cached MCP tools to the model without connecting to their server.
+    try:
+        from google.adk.tools.mcp_tool.conversion_utils import to_gemini_schema
+    except ImportError:
+        to_gemini_schema = None
+    # HTTP connection params for long-running MCP servers: streamable HTTP on newer ADK releases,
+    # SSE on older ones. Without either, the local servers can only be reached over stdio.
+    try:
+        from google.adk.tools.mcp_tool.mcp_session_manager import StreamableHTTPServerParams as HttpServerParams
+        MCP_HTTP_TRANSPORT, MCP_HTTP_PATH = "streamable-http", "/mcp"
+    except ImportError:
+        try:
+            from google.adk.tools.mcp_tool.mcp_toolset import SseServerParams as HttpServerParams
+            MCP_HTTP_TRANSPORT, MCP_HTTP_PATH = "sse", "/sse"
+        except ImportError:
+            HttpServerParams, MCP_HTTP_TRANSPORT, MCP_HTTP_PATH = None, None, None
 except ImportError as e:
     print(f"ADK Import Error: {e}")
     print("Please ensure you have the 'google-adk' package installed. You can install it using: pip install google-adk")
-    print("Also ensure 'langchain-openai', 'faiss-cpu', and other dependencies are installed.")
     raise SystemExit("ADK or related dependencies not found. Please install them and try again.")
 
-async def query_website_content_tool_func(input_str: str) -> str:
+# How the agent reaches the local FastMCP servers. "stdio" (default) spawns each script as a
+# subprocess per agent build; "http" connects to servers that are already running (started once by
+# start_local_mcp_http_servers() or by a process supervisor) so no interpreter is forked per build.
+MCP_TRANSPORT = os.environ.get("MCP_TRANSPORT", "stdio").lower()
+MCP_HTTP_HOST = "127.0.0.1"
+# Ports of the local servers that can run over HTTP. The Langflow critique script is not a FastMCP
+# server and is always spawned over stdio.
+MCP_HTTP_PORTS = {
+    "mcp_server.py": 8000,
+    "mcp_cpp_server.py": 8001,
+    "mcp_chrome_server.py": 8002,
+}
+
+# Environment handed to every spawned python3 MCP server, computed once at import instead of
+# copying os.environ per spawn. Without an explicit env the MCP stdio client only forwards a
+# handful of login variables, which silently drops the servers' own configuration.
+_MCP_SERVER_ENV_KEYS = (
+    "PATH", "HOME", "USER", "LANG", "TMPDIR", "VIRTUAL_ENV", "PYTHONPATH",
+    "DOCKER_HOST", "DOCKER_CONFIG", # cpp/chrome servers drive the Docker CLI
+    "LANGFLOW_CRITIQUE_API_URL", # Langflow critique server
+)
+_MCP_SERVER_ENV = {key: os.environ[key] for key in _MCP_SERVER_ENV_KEYS if key in os.environ}
+
+CODE_ASSISTANT_INSTRUCTION = (
+    'You are a helpful AI code assistant. '
+    'You have tools to execute bash commands, compile and run C++ code snippets, '
+    'capture screenshots of webpages, interact with GitHub (e.g., read files, list issues), '
+    'and critique code (providing feedback on quality, style, and potential issues). '
+    "You also have a tool called 'get_website_content'. This tool now performs Retrieval Augmented Generation (RAG): "
+    "it takes a comma-separated string 'URL,QUERY_STRING' (e.g., 'https://example.com,What is this page about?'), "
+    "fetches content from the URL, creates a temporary vector store, and returns the most relevant text chunks based on the query. "
+    'Use these tools as needed to answer user requests, debug code, '
+    'fetch documentation, manage repositories, critique code, retrieve and query web content, or perform other coding-related tasks.'
+)
+
+# Local MCP server scripts the agent loads tools from, with a description for log messages.
+LOCAL_MCP_SERVERS = (
+    ("mcp_server.py", "bash execution"),
+    ("mcp_cpp_server.py", "C++ execution"),
+    ("mcp_chrome_server.py", "webpage capture"),
+    ("mcp_langflow_critique_server.py", "Langflow code critique"),
+)
+
+# Concurrent get_website_content calls allowed to load/build stores and embed queries at once, so a
+# burst of tool calls does not run into the OpenAI rate limits.
+_WEB_RAG_SEMAPHORE = asyncio.Semaphore(int(os.environ.get("DEEPBLUE_EMBED_CONCURRENCY", "4")))
+
+# 'URL,QUERY_STRING[,K]' input of get_website_content: an http(s) URL, a comma, a non-empty query,
+# and optionally a comma and the number of chunks to return. Several such lines, one per line,
+# query several pages in one call.
+_WEBSITE_QUERY_INPUT_RE = re.compile(r'^\s*(https?://[^\s,]+)\s*,\s*(\S.*?)(?:\s*,\s*(\d+))?\s*$', re.DOTALL)
+WEBSITE_QUERY_DEFAULT_K = 3
+WEBSITE_QUERY_MAX_K = 10
+
+
+def _parse_website_query(text: str):
     """
-    Retrieves relevant content chunks from a website URL based on a query,
-    using a vector store and similarity search.
+    Parses one 'URL,QUERY_STRING[,K]' request.
+
+    Returns:
+        tuple[str, list[str], int] | None: The URL, its '|'-separated queries and the clamped K,
+            or None if text is not a valid request.
     """
-    print(f"Tool 'query_website_content_tool_func' called with input: '{input_str}'")
+    match = _WEBSITE_QUERY_INPUT_RE.match(text)
+    if not match:
+        return None
     try:
-        parts = input_str.split(',', 1)
-        if len(parts) != 2:
-            return "Error: Invalid input format. Expected 'URL,QUERY_STRING'. Example: 'https://example.com,What is this page about?'"
-        
-        url, query_string = parts[0].strip(), parts[1].strip()
+        if not urlparse(match.group(1)).netloc:
+            return None
+    except ValueError: # e.g. an unclosed '[' IPv6 host
+        return None
+    url, query_string, k = match.groups()
+    queries = [q.strip() for q in query_string.split("|") if q.strip()]
+    if not queries:
+        return None
+    k = min(max(int(k), 1), WEBSITE_QUERY_MAX_K) if k else WEBSITE_QUERY_DEFAULT_K
+    return url, queries, k
+
+
+def _format_query_results(queries: list[str], results: list[str]) -> str:
+    """
+    Formats the answers to the queries about one page: a single answer as is, several grouped by query.
+    """
+    if len(queries) == 1:
+        return results[0]
+    return "\n\n".join(
+        f"Results for query {i+1}: '{query}'\n{result}" for i, (query, result) in enumerate(zip(queries, results))
+    )
 
-        if not url or not query_string:
-            return "Error: URL or query string cannot be empty. Expected 'URL,QUERY_STRING'."
 
-        print(f"Parsed URL: '{url}', Query: '{query_string}'")
+async def _query_website(web_retriever, url: str, queries: list[str], k: int, openai_api_key: str):
+    """
+    Answers queries about one page with one vector store, one embeddings request and one batched
+    search, bounded by _WEB_RAG_SEMAPHORE.
+
+    Returns:
+        list[str] | str: One formatted answer per query, or an error message for the whole page.
+    """
+    if _WEB_RAG_SEMAPHORE.locked():
+        # Stagger waiting calls so they do not all hit the embeddings API the moment slots free up.
+        await asyncio.sleep(random.uniform(0, 0.05))
+    async with _WEB_RAG_SEMAPHORE:
+        vector_store = await web_retriever.get_vector_store_for_url(url, openai_api_key)
+
+        if vector_store is None:
+            # create_vector_store_from_url already prints detailed errors
+            return f"Error: Could not create vector store for the URL '{url}'. Previous logs may have more details."
+
+        print(f"Vector store created. Performing similarity search for {len(queries)} quer{'y' if len(queries) == 1 else 'ies'}.")
+        try:
+            # Repeated queries are answered by text alone. The rest share one embeddings request;
+            # each vector serves both the semantic cache lookup and the store search, and all
+            # remaining misses share one FAISS search.
+            results = [web_retriever.lookup_query_cache(vector_store, query, k) for query in queries]
+            to_embed = [i for i, result in enumerate(results) if result is None]
+            query_embeddings = {}
+            if to_embed:
+                embeddings = await web_retriever.embed_queries(vector_store, [queries[i] for i in to_embed])
+                for i, embedding in zip(to_embed, embeddings):
+                    query_embeddings[i] = embedding
+                    results[i] = web_retriever.lookup_semantic_cache(vector_store, embedding, k)
+            misses = [i for i in to_embed if results[i] is None]
+            retrieved = []
+            if misses:
+                retrieved = await web_retriever.search_vector_store(
+                    vector_store, [query_embeddings[i] for i in misses], k
+                )
+        except Exception as e:
+            return f"Error during similarity search: {e}"
+
+    for i, retrieved_docs in zip(misses, retrieved):
+        if not retrieved_docs:
+            results[i] = "No relevant documents found for your query in the website content."
+            continue
+        print(f"Found {len(retrieved_docs)} relevant document(s) for query {i+1}. Formatting output...")
+        results[i] = "\n".join(
+            f"Relevant Chunk {n+1}:\n{getattr(doc, 'page_content', '') or 'Content not available'}\n---"
+            for n, doc in enumerate(retrieved_docs)
+        )
+        web_retriever.add_to_semantic_cache(vector_store, queries[i], query_embeddings[i], k, results[i])
+    return results
 
-    except Exception as e:
-        return f"Error parsing input string: {e}. Expected 'URL,QUERY_STRING'."
+
+async def get_website_content(input_str: str) -> str:
+    """
+    Retrieves relevant content from a given URL based on a query.
+    Input should be a comma-separated string: 'URL,QUERY_STRING' or 'URL,QUERY_STRING,K',
+    where K is the number of chunks to return per query (3 by default, at most 10).
+    Several queries about the same URL can be asked at once by separating them with '|'; results are grouped by query.
+    Several URLs can be queried at once by putting one such 'URL,QUERY_STRING[,K]' request per line; they are fetched concurrently.
+    For example: 'https://example.com,What is this page about?', 'https://example.com,Installation steps,5'
+    or 'https://example.com,How do I install it?|How do I configure it?'
+    """
+    # The function name and docstring are the tool's name and description as the model sees them
+    # (FunctionTool builds its declaration from the function), so they are written for the model.
+    print(f"Tool 'get_website_content' called with input: '{input_str}'")
+    lines = [line for line in input_str.splitlines() if line.strip()]
+    requests_by_line = [_parse_website_query(line) for line in lines]
+    if len(lines) < 2 or None in requests_by_line:
+        # One request; its query may itself span several lines.
+        requests_by_line = [_parse_website_query(input_str)]
+        if requests_by_line[0] is None:
+            return "Error: Invalid input format. Expected 'URL,QUERY_STRING[,K]' with an http(s) URL, where QUERY_STRING may hold several queries separated by '|'. Example: 'https://example.com,What is this page about?'"
+    print(f"Parsed requests (URL, queries, K): {requests_by_line}")
 
     openai_api_key = os.environ.get("OPENAI_API_KEY")
     if not openai_api_key:
         return "Error: OPENAI_API_KEY environment variable not set. This tool cannot function without it."
 
-    print("Attempting to create vector store...")
-    vector_store = await create_vector_store_from_url(url, openai_api_key)
+    print("Attempting to load or create vector store...")
+    try:
+        import web_retriever
+    except ImportError as e:
+        return f"Error: The website RAG tool is unavailable ({e}). Ensure 'langchain-openai', 'faiss-cpu', and other dependencies are installed."
+
+    # Lines about the same page (and K) share one vector store lookup, embeddings request and search.
+    queries_by_page = {}
+    for url, queries, k in requests_by_line:
+        page_queries = queries_by_page.setdefault((url, k), [])
+        page_queries.extend(query for query in queries if query not in page_queries)
+    page_results = dict(zip(queries_by_page, await asyncio.gather(*(
+        _query_website(web_retriever, url, page_queries, k, openai_api_key)
+        for (url, k), page_queries in queries_by_page.items()
+    ))))
+
+    def format_request(url, queries, k):
+        page_result = page_results[url, k]
+        if isinstance(page_result, str): # An error for the whole page
+            return page_result
+        answers = dict(zip(queries_by_page[url, k], page_result))
+        return _format_query_results(queries, [answers[query] for query in queries])
+
+    if len(requests_by_line) == 1:
+        return format_request(*requests_by_line[0])
+    return "\n\n".join(
+        f"Results for '{url}':\n{format_request(url, queries, k)}" for url, queries, k in requests_by_line
+    )
+
+
+# The RAG tool is built once at import; every agent build reuses it.
+WEB_RAG_TOOL = FunctionTool(func=get_website_content)
+
+
+class AsyncLoopThread(threading.Thread):
+    """
+    A daemon thread running its own asyncio event loop forever.
+
+    The MCP client sessions live on this loop, so their receive loops and tool calls keep making
+    progress no matter what the caller's loop (the REPL, a web frontend, ...) is busy with.
+    """
+
+    def __init__(self):
+        super().__init__(name="mcp-loop", daemon=True)
+        self.loop = uvloop.new_event_loop() if uvloop is not None else asyncio.new_event_loop()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """
+        Schedules a coroutine on this thread's loop and returns a concurrent.futures.Future.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def run_coroutine(self, coro):
+        """
+        Runs a coroutine on this thread's loop and awaits its result from the calling loop.
+        """
+        return await asyncio.wrap_future(self.submit(coro))
+
+
+class MCPClientWrapper:
+    """
+    Forwards an MCP tool's calls to the MCP loop thread so parallel tool dispatches overlap.
+    """
+
+    def __init__(self, tool, loop_thread: AsyncLoopThread):
+        self.tool_run_async = tool.run_async
+        self.loop_thread = loop_thread
+
+    def run(self, **kwargs):
+        """
+        Starts the tool call on the MCP loop thread and returns a concurrent.futures.Future.
+        """
+        return self.loop_thread.submit(self.tool_run_async(**kwargs))
+
+    async def run_async(self, **kwargs):
+        return await asyncio.wrap_future(self.run(**kwargs))
+
+
+class _MCPServerSession:
+    """
+    Owns the AsyncExitStack of a single MCP server inside one task on the MCP loop thread.
+
+    MCP client sessions are anyio task groups and must be exited from the task that entered
+    them, so the sub-stack is opened and closed by the same owner task. Each server gets its
+    own cleanup domain: one that hangs on shutdown does not block the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.tools = [] # The tools registered on the agent for this server
+        self._live_tools = []
+        self._close_requested = None
+        self._owner_task = None
+        self._connect_lock = None
+
+    async def open(self, connection_params):
+        """
+        Starts the server and returns the (tools, exit_stack) result of MCPToolset.from_server.
+        """
+        self._close_requested = asyncio.Event()
+        loaded = asyncio.get_running_loop().create_future()
+
+        async def own_session():
+            try:
+                async with AsyncExitStack() as sub_stack:
+                    result = await MCPToolset.from_server(
+                        connection_params=connection_params,
+                        async_exit_stack=sub_stack
+                    )
+                    loaded.set_result(result)
+                    await self._close_requested.wait()
+            except BaseException as e:
+                if not loaded.done():
+                    loaded.set_exception(e)
+                elif not isinstance(e, asyncio.CancelledError):
+                    logger.warning(f"Error closing MCP server {self.name}: {type(e).__name__} - {e}")
+
+        self._owner_task = asyncio.create_task(own_session())
+        try:
+            # Cancelling the owner task (rather than using wait_for on from_server, which would run it
+            # in a separate task) unwinds a half-open session in the task that entered it.
+            return await asyncio.wait_for(asyncio.shield(loaded), MCP_INIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._owner_task.cancel()
+            raise asyncio.TimeoutError(f"no response within {MCP_INIT_TIMEOUT}s (MCP_INIT_TIMEOUT_S)")
+
+    async def ensure_open(self, connection_params):
+        """
+        Opens the session if it is not open yet and registers it for shutdown. Used by tools
+        hydrated from the on-disk tool cache, which only connect on their first invocation.
+        """
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._owner_task is None or self._owner_task.done():
+                tools, _ = await self.open(connection_params)
+                self._live_tools = list(tools or [])
+                _MCP_SERVER_SESSIONS[self.name] = self
+        return self._live_tools
+
+    async def aclose(self, timeout: float):
+        """
+        Closes the server session. If it does not shut down within timeout seconds the owner task
+        is cancelled, which makes the MCP stdio client kill the server process instead of waiting
+        for it; a session that ignores even that is abandoned after another timeout.
+        """
+        if self._owner_task is None or self._owner_task.done():
+            return
+        self._close_requested.set()
+        done, _ = await asyncio.wait({self._owner_task}, timeout=timeout)
+        if done:
+            return
+        logger.warning(f"MCP server {self.name} did not close within {timeout}s; killing it.")
+        self._owner_task.cancel()
+        done, _ = await asyncio.wait({self._owner_task}, timeout=timeout)
+        if not done:
+            logger.warning(f"MCP server {self.name} could not be killed; abandoning it.")
+
+
+# Seconds a single MCP server gets to start up and list its tools before it is skipped.
+MCP_INIT_TIMEOUT = float(os.environ.get("MCP_INIT_TIMEOUT_S", "15"))
+# Seconds a single MCP server gets to shut down before it is killed.
+MCP_SERVER_CLOSE_TIMEOUT = 2.0
+
+
+class _CachedMCPTool(BaseTool):
+    """
+    An MCP tool described from the on-disk tool cache. Its server is only started (and the real
+    tool looked up) the first time the tool is invoked.
+    """
+
+    def __init__(self, name: str, description: str, input_schema: dict, server_session: _MCPServerSession, connection_params):
+        super().__init__(name=name, description=description)
+        self.input_schema = input_schema
+        self._server_session = server_session
+        self._connection_params = connection_params
 
-    if vector_store is None:
-        # create_vector_store_from_url already prints detailed errors
-        return f"Error: Could not create vector store for the URL '{url}'. Previous logs may have more details."
+    def _get_declaration(self):
+        return genai_types.FunctionDeclaration(
+            name=self.name,
+            description=self.description,
+            parameters=to_gemini_schema(self.input_schema),
+        )
 
-    print(f"Vector store created. Performing similarity search for query: '{query_string}'")
+    async def run_async(self, *, args, tool_context):
+        return await _get_mcp_loop_thread().run_coroutine(self._run_on_mcp_loop(args, tool_context))
+
+    async def _run_on_mcp_loop(self, args, tool_context):
+        for tool in await self._server_session.ensure_open(self._connection_params):
+            if tool.name == self.name:
+                return await tool.run_async(args=args, tool_context=tool_context)
+        raise ValueError(f"Tool '{self.name}' is no longer provided by {self._server_session.name}.")
+
+
+# Tool metadata of the local MCP servers, keyed by script name and the SHA-256 of the script
+# source. While a script is unchanged its tools are registered from here without starting it.
+MCP_TOOL_CACHE_PATH = Path("~/.cache/deepblue/mcp_tools.json").expanduser()
+MCP_TOOL_CACHE_ENABLED = os.environ.get("MCP_TOOL_CACHE", "1") != "0" and to_gemini_schema is not None
+
+
+def _read_mcp_tool_cache() -> dict:
     try:
-        retrieved_docs = await vector_store.asimilarity_search(query_string, k=3)
-    except Exception as e:
-        return f"Error during similarity search: {e}"
+        with open(MCP_TOOL_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    if not retrieved_docs:
-        return "No relevant documents found for your query in the website content."
 
-    print(f"Found {len(retrieved_docs)} relevant document(s). Formatting output...")
-    formatted_results = []
-    for i, doc in enumerate(retrieved_docs):
-        # Ensure page_content is not None and is a string
-        content = doc.page_content if doc.page_content is not None else "Content not available"
-        formatted_results.append(f"Relevant Chunk {i+1}:\n{content}\n---")
-    
-    return "\n".join(formatted_results)
+def _write_mcp_tool_cache(tool_cache: dict):
+    try:
+        MCP_TOOL_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = MCP_TOOL_CACHE_PATH.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(tool_cache, f)
+        os.replace(temp_path, MCP_TOOL_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: Could not write MCP tool cache {MCP_TOOL_CACHE_PATH}: {e}")
 
 
-async def create_code_assistant_agent():
+def _script_sha256(script_name: str):
+    try:
+        return hashlib.sha256(Path(script_name).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def _tool_cache_entries(tools):
+    """
+    Returns the cacheable metadata of an MCP server's tools, or None if any tool lacks its schema.
+    """
+    entries = []
+    for tool in tools:
+        input_schema = getattr(getattr(tool, "mcp_tool", None), "inputSchema", None)
+        if not isinstance(input_schema, dict):
+            return None
+        entries.append({"name": tool.name, "description": tool.description, "input_schema": input_schema})
+    return entries
+
+
+_MCP_LOOP_THREAD = None # AsyncLoopThread | None, started on first agent build
+_MCP_SERVER_SESSIONS = {} # server name -> _MCPServerSession, only touched on the MCP loop thread
+
+
+def _get_mcp_loop_thread() -> AsyncLoopThread:
+    global _MCP_LOOP_THREAD
+    if _MCP_LOOP_THREAD is None:
+        _MCP_LOOP_THREAD = AsyncLoopThread()
+        _MCP_LOOP_THREAD.start()
+    return _MCP_LOOP_THREAD
+
+
+# The agent and the AsyncExitStack holding its MCP sessions open are built once per process and
+# reused: every rebuild would otherwise respawn each server subprocess and redo initialize/list_tools.
+_AGENT_CACHE = None # tuple[LlmAgent, AsyncExitStack] | None
+_AGENT_CACHE_LOCK = asyncio.Lock()
+
+
+async def create_code_assistant_agent(refresh: bool = False):
+    """
+    Returns the process-wide ADK LlmAgent and the AsyncExitStack owning its MCP server sessions.
+
+    The first call builds the agent; later calls return the same warm agent without spawning
+    any MCP server again. Call close_code_assistant_agent() once at shutdown to release the servers.
+
+    Args:
+        refresh (bool): Close the cached agent's MCP server sessions and build a new agent, e.g.
+            after an MCP server script or the GitHub token changed.
+    """
+    global _AGENT_CACHE
+    async with _AGENT_CACHE_LOCK:
+        if refresh and _AGENT_CACHE is not None:
+            _, exit_stack = _AGENT_CACHE
+            _AGENT_CACHE = None
+            await _get_mcp_loop_thread().run_coroutine(exit_stack.aclose())
+        if _AGENT_CACHE is None:
+            _AGENT_CACHE = await _build_code_assistant_agent()
+        return _AGENT_CACHE
+
+
+async def close_code_assistant_agent():
+    """
+    Closes the MCP server sessions of the cached agent (if any) and drops it from the cache.
+    """
+    global _AGENT_CACHE
+    async with _AGENT_CACHE_LOCK:
+        if _AGENT_CACHE is None:
+            return
+        _, exit_stack = _AGENT_CACHE
+        _AGENT_CACHE = None
+        # The sessions were entered on the MCP loop thread and must be exited there as well.
+        await _get_mcp_loop_thread().run_coroutine(exit_stack.aclose())
+        # The RAG tool's pooled HTTP client belongs to the caller's loop, not the MCP loop. Only
+        # close it if the tool ran; importing web_retriever just to close nothing would be slow.
+        web_retriever = sys.modules.get("web_retriever")
+        if web_retriever is not None:
+            await web_retriever.close_http_client()
+
+
+async def _close_mcp_server_sessions():
+    """
+    Closes every open MCP server session concurrently. Runs on the MCP loop thread.
+    """
+    sessions = list(_MCP_SERVER_SESSIONS.values())
+    _MCP_SERVER_SESSIONS.clear()
+    await asyncio.gather(*(session.aclose(MCP_SERVER_CLOSE_TIMEOUT) for session in sessions), return_exceptions=True)
+
+
+async def evict_mcp_server(name: str):
+    """
+    Closes a single MCP server session (e.g. a misbehaving one) without touching the others,
+    and removes its tools from the cached agent.
+
+    Args:
+        name (str): The server name, e.g. "mcp_chrome_server.py" or "github-mcp-server".
+
+    Returns:
+        bool: True if a session with that name was open and has been closed.
+    """
+    async def pop_and_close():
+        session = _MCP_SERVER_SESSIONS.pop(name, None)
+        if session is not None:
+            await session.aclose(MCP_SERVER_CLOSE_TIMEOUT)
+        return session
+
+    session = await _get_mcp_loop_thread().run_coroutine(pop_and_close())
+    if session is None:
+        return False
+    if _AGENT_CACHE is not None:
+        evicted_tool_ids = {id(tool) for tool in session.tools}
+        agent, _ = _AGENT_CACHE
+        agent.tools[:] = [tool for tool in agent.tools if id(tool) not in evicted_tool_ids]
+    print(f"Evicted MCP server {name} and its {len(session.tools)} tools.")
+    return True
+
+
+def stop_local_mcp_http_servers(server_processes, timeout: float = MCP_SERVER_CLOSE_TIMEOUT):
+    """
+    Terminates the HTTP MCP servers started by start_local_mcp_http_servers() all at once,
+    killing any that are still running after timeout seconds.
+    """
+    for server_process in server_processes:
+        server_process.terminate()
+    for server_process in server_processes:
+        try:
+            server_process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            server_process.kill()
+            server_process.wait()
+
+
+def start_local_mcp_http_servers():
+    """
+    Starts every HTTP-capable local MCP server once as a long-running background process.
+
+    Returns the list of subprocess.Popen handles so the caller can terminate them on shutdown.
+    """
+    server_processes = []
+    for script_name, port in MCP_HTTP_PORTS.items():
+        print(f"Starting {script_name} over {MCP_HTTP_TRANSPORT} on {MCP_HTTP_HOST}:{port}...")
+        server_env = dict(_MCP_SERVER_ENV, MCP_SERVER_TRANSPORT=MCP_HTTP_TRANSPORT, MCP_SERVER_PORT=str(port))
+        server_processes.append(subprocess.Popen(['python3', script_name], env=server_env))
+    return server_processes
+
+
+async def wait_for_local_mcp_http_servers(timeout: float = 15.0):
+    """
+    Waits until every HTTP-capable local MCP server accepts TCP connections, or the timeout expires.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    for script_name, port in MCP_HTTP_PORTS.items():
+        while True:
+            try:
+                _, writer = await asyncio.open_connection(MCP_HTTP_HOST, port)
+                writer.close()
+                await writer.wait_closed()
+                break
+            except OSError:
+                if loop.time() >= deadline:
+                    print(f"Warning: {script_name} is not accepting connections on {MCP_HTTP_HOST}:{port} after {timeout}s.")
+                    return
+                await asyncio.sleep(0.1)
+
+
+# The GitHub MCP server runs in one long-lived detached container. Each agent build only
+# `docker exec`s a fresh server process into it instead of paying for a full `docker run`.
+GITHUB_MCP_IMAGE = "ghcr.io/github/github-mcp-server"
+GITHUB_MCP_CONTAINER_NAME = "deepblue-gh-mcp"
+GITHUB_MCP_SERVER_BINARY = "/server/github-mcp-server"
+GITHUB_MCP_TOKEN_LABEL = "deepblue.token-sha256"
+# Read once at import: whether GitHub tools are loaded is decided by this alone.
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
+# One-off `docker run` used when the long-lived container cannot be started.
+GITHUB_MCP_RUN_ARGS = ('run', '-i', '--rm', '-e', 'GITHUB_PERSONAL_ACCESS_TOKEN', GITHUB_MCP_IMAGE)
+GITHUB_MCP_EXEC_ARGS = ('exec', '-i', GITHUB_MCP_CONTAINER_NAME, GITHUB_MCP_SERVER_BINARY, 'stdio')
+
+
+def ensure_github_mcp_container(github_token: str) -> bool:
+    """
+    Makes sure the long-lived GitHub MCP container is running with the given token,
+    (re)creating it if it is missing, stopped, or was started with another token.
+
+    Args:
+        github_token (str): The GitHub personal access token for the server.
+
+    Returns:
+        bool: True if the container is running, False if it could not be started
+              (the caller should fall back to a one-off `docker run`).
+    """
+    token_fingerprint = hashlib.sha256(github_token.encode()).hexdigest()
+    try:
+        inspect_result = subprocess.run(
+            ['docker', 'inspect', '-f', f'{{{{.State.Running}}}} {{{{index .Config.Labels "{GITHUB_MCP_TOKEN_LABEL}"}}}}',
+             GITHUB_MCP_CONTAINER_NAME],
+            capture_output=True, text=True, timeout=15
+        )
+        if inspect_result.returncode == 0 and inspect_result.stdout.split() == ["true", token_fingerprint]:
+            return True
+
+        print(f"Starting long-lived GitHub MCP container '{GITHUB_MCP_CONTAINER_NAME}'...")
+        subprocess.run(['docker', 'rm', '-f', GITHUB_MCP_CONTAINER_NAME], capture_output=True, timeout=30)
+        # -i keeps the container's own stdio server waiting on stdin, so the container stays up.
+        run_result = subprocess.run(
+            ['docker', 'run', '-d', '-i',
+             '--name', GITHUB_MCP_CONTAINER_NAME,
+             '--label', f'{GITHUB_MCP_TOKEN_LABEL}={token_fingerprint}',
+             '-e', 'GITHUB_PERSONAL_ACCESS_TOKEN',
+             GITHUB_MCP_IMAGE],
+            capture_output=True, text=True, timeout=300,
+            env=dict(os.environ, GITHUB_PERSONAL_ACCESS_TOKEN=github_token)
+        )
+        if run_result.returncode != 0:
+            print(f"Warning: Could not start GitHub MCP container: {run_result.stderr.strip()}")
+            return False
+        return True
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Warning: Could not start GitHub MCP container: {type(e).__name__} - {e}")
+        return False
+
+
+def _github_server_connection_params(github_token: str, container_running: bool):
+    """
+    Returns the ADK connection params for the GitHub MCP server: a `docker exec` into the
+    long-lived container when it is running, otherwise a one-off `docker run -i --rm`.
+    """
+    if container_running:
+        return StdioServerParameters(command='docker', args=list(GITHUB_MCP_EXEC_ARGS))
+    return StdioServerParameters(
+        command='docker',
+        args=list(GITHUB_MCP_RUN_ARGS),
+        env={"GITHUB_PERSONAL_ACCESS_TOKEN": github_token}
+    )
+
+
+def _local_server_connection_params(script_name: str):
+    """
+    Returns the ADK connection params for a local MCP server script, honoring MCP_TRANSPORT.
+    """
+    if MCP_TRANSPORT == "http" and HttpServerParams is not None and script_name in MCP_HTTP_PORTS:
+        return HttpServerParams(url=f"http://{MCP_HTTP_HOST}:{MCP_HTTP_PORTS[script_name]}{MCP_HTTP_PATH}")
+    return StdioServerParameters(
+        command='python3',
+        args=[script_name],
+        env=_MCP_SERVER_ENV
+    )
+
+
+def _warm_up_web_rag_tool():
+    """
+    Imports web_retriever and prepares its embeddings client, so the first get_website_content
+    call does not pay for it. Blocking; run in a worker thread while the MCP servers start.
+    """
+    try:
+        import web_retriever
+        web_retriever.warm_up(os.environ.get("OPENAI_API_KEY"))
+    except Exception as e:
+        logger.warning(f"Could not warm up the get_website_content tool: {e}")
+
+
+async def _build_code_assistant_agent():
     """
     Creates an ADK LlmAgent equipped with tools from various MCP servers and custom tools.
     """
+    # Overlaps with the MCP server startup below, which is mostly waiting on subprocesses.
+    rag_warm_up = asyncio.create_task(asyncio.to_thread(_warm_up_web_rag_tool))
     common_exit_stack = AsyncExitStack()
     all_mcp_tools = []
+    loop_thread = _get_mcp_loop_thread()
+    # Closing the agent's exit stack closes all server sessions concurrently, on the MCP loop thread.
+    common_exit_stack.push_async_callback(_close_mcp_server_sessions)
     
-    local_mcp_servers = [
-        ("mcp_server.py", "bash execution"),
-        ("mcp_cpp_server.py", "C++ execution"),
-        ("mcp_chrome_server.py", "webpage capture"),
-        ("mcp_langflow_critique_server.py", "Langflow code critique")
-    ]
+    if MCP_TRANSPORT == "http" and HttpServerParams is None:
+        logger.warning("MCP_TRANSPORT=http but this ADK version has no HTTP connection params. Falling back to stdio.")
 
     try:
-        for script_name, description in local_mcp_servers:
-            print(f"Attempting to load tools from {script_name} ({description})...")
-            tools, _ = await MCPToolset.from_server(
-                connection_params=StdioServerParameters(
-                    command='python3',
-                    args=[script_name]
-                ),
-                async_exit_stack=common_exit_stack
-            )
-            if tools:
-                all_mcp_tools.extend(tools)
-                tool_names = [tool.name for tool in tools]
-                print(f"Successfully loaded {len(tools)} tools from {script_name}: {tool_names}")
-            else:
-                print(f"No tools loaded from {script_name}.")
+        # Every server is started concurrently: each stdio spawn + MCP handshake is mostly idle
+        # waiting, so startup costs max(handshake) instead of the sum over all servers.
+        server_sessions = []
+        server_coros = []
+        # Per-server status and messages, emitted as one ordered summary once startup is done
+        # instead of interleaving prints from the concurrent startups.
+        server_status = {}
+        server_logs = defaultdict(list)
+        tool_cache = _read_mcp_tool_cache() if MCP_TOOL_CACHE_ENABLED else {}
+        script_hashes = {}
+        for script_name, description in LOCAL_MCP_SERVERS:
+            script_hashes[script_name] = _script_sha256(script_name) if MCP_TOOL_CACHE_ENABLED else None
+            cache_entry = tool_cache.get(script_name)
+            if script_hashes[script_name] and cache_entry and cache_entry.get("sha256") == script_hashes[script_name]:
+                # Unchanged script: register its tools from the cache and connect on first use.
+                server_session = _MCPServerSession(script_name)
+                connection_params = _local_server_connection_params(script_name)
+                cached_tools = [
+                    _CachedMCPTool(entry["name"], entry["description"], entry["input_schema"], server_session, connection_params)
+                    for entry in cache_entry["tools"]
+                ]
+                server_session.tools = cached_tools
+                all_mcp_tools.extend(cached_tools)
+                server_status[script_name] = ("cached", len(cached_tools))
+                server_logs[script_name].append("starts on first use")
+                continue
 
-        github_token = os.environ.get("GITHUB_TOKEN")
+            server_status[script_name] = ("pending", 0)
+            server_session = _MCPServerSession(script_name)
+            server_sessions.append(server_session)
+            server_coros.append(loop_thread.run_coroutine(server_session.open(
+                _local_server_connection_params(script_name)
+            )))
+
+        github_token = GITHUB_TOKEN
         if github_token:
-            print("Attempting to load tools from github-mcp-server...")
-            try:
-                github_tools, _ = await MCPToolset.from_server(
-                    connection_params=StdioServerParameters(
-                        command='docker',
-                        args=['run', '-i', '--rm', 
-                              '-e', 'GITHUB_PERSONAL_ACCESS_TOKEN',
-                              'ghcr.io/github/github-mcp-server'],
-                        env={"GITHUB_PERSONAL_ACCESS_TOKEN": github_token}
-                    ),
-                    async_exit_stack=common_exit_stack
-                )
-                if github_tools:
-                    all_mcp_tools.extend(github_tools)
-                    tool_names = [tool.name for tool in github_tools]
-                    print(f"Successfully loaded {len(github_tools)} tools from github-mcp-server: {tool_names}")
-                else:
-                    print("No tools loaded from github-mcp-server, or an error occurred during its initialization.")
-            except Exception as e_github:
-                print(f"Error loading tools from github-mcp-server: {e_github}")
-                print("Ensure Docker is running and 'ghcr.io/github/github-mcp-server' image can be pulled.")
+            server_status["github-mcp-server"] = ("pending", 0)
+            server_session = _MCPServerSession("github-mcp-server")
+            server_sessions.append(server_session)
+
+            async def open_github_session(server_session=server_session):
+                # The container check runs alongside the local server handshakes, not before them.
+                container_running = await asyncio.to_thread(ensure_github_mcp_container, github_token)
+                return await loop_thread.run_coroutine(server_session.open(
+                    _github_server_connection_params(github_token, container_running)
+                ))
+
+            server_coros.append(open_github_session())
         else:
-            print("Warning: GITHUB_TOKEN environment variable not set. Skipping GitHub tools.")
+            server_status["github-mcp-server"] = ("skipped", 0)
+            server_logs["github-mcp-server"].append("GITHUB_TOKEN environment variable not set")
 
-        # Define and add the MODIFIED web content retrieval tool (now RAG-based)
-        try:
-            web_rag_tool = Tool(
-                name="get_website_content", # Keeping the original name as per instruction context
-                description=(
-                    "Retrieves relevant content from a given URL based on a query. "
-                    "Input should be a comma-separated string: 'URL,QUERY_STRING'. "
-                    "For example: 'https://example.com,What is this page about?'"
-                ),
-                func=query_website_content_tool_func, # Using the new RAG wrapper function
-            )
-            all_mcp_tools.append(web_rag_tool)
-            print(f"Successfully added/updated custom tool: {web_rag_tool.name} with new RAG functionality.")
-        except Exception as e_custom_tool:
-            print(f"Error adding/updating custom tool 'get_website_content': {e_custom_tool}")
+        # A failing or hung server is reported and skipped; it must not prevent the others from loading.
+        server_results = await asyncio.gather(*server_coros, return_exceptions=True)
+
+        tool_cache_updated = False
+        for server_session, server_result in zip(server_sessions, server_results):
+            server_name = server_session.name
+            if isinstance(server_result, BaseException):
+                server_status[server_name] = ("failed", 0)
+                server_logs[server_name].append(f"{type(server_result).__name__} - {server_result}")
+                if server_name == "github-mcp-server":
+                    server_logs[server_name].append("Ensure Docker is running and 'ghcr.io/github/github-mcp-server' image can be pulled.")
+                continue
+
+            _MCP_SERVER_SESSIONS[server_name] = server_session
+            tools, _ = server_result
+            server_session.tools = list(tools or [])
+            cache_entries = _tool_cache_entries(tools or []) if script_hashes.get(server_name) else None
+            if cache_entries is not None:
+                tool_cache[server_name] = {"sha256": script_hashes[server_name], "tools": cache_entries}
+                tool_cache_updated = True
+            server_status[server_name] = ("connected", len(tools or []))
+            if tools:
+                for tool in tools:
+                    tool.run_async = MCPClientWrapper(tool, loop_thread).run_async
+                all_mcp_tools.extend(tools)
+                server_logs[server_name].append(", ".join(tool.name for tool in tools))
 
+        summary_lines = []
+        server_descriptions = dict(LOCAL_MCP_SERVERS, **{"github-mcp-server": "GitHub"})
+        for server_name, (status, tool_count) in server_status.items():
+            summary_lines.append(f"  [{status}] {server_name} ({server_descriptions[server_name]}): {tool_count} tools")
+            summary_lines.extend(f"      {message}" for message in server_logs[server_name])
+        any_failed = any(status == "failed" for status, _ in server_status.values())
+        logger.log(logging.WARNING if any_failed else logging.INFO, "MCP startup summary:\n" + "\n".join(summary_lines))
+        if tool_cache_updated:
+            _write_mcp_tool_cache(tool_cache)
+
+        all_mcp_tools.append(WEB_RAG_TOOL)
 
         if not all_mcp_tools:
-            print("Warning: No tools were loaded from any MCP server or defined locally. The agent will have no functional capabilities.")
+            logger.warning("No tools were loaded from any MCP server or defined locally. The agent will have no functional capabilities.")
 
     except FileNotFoundError as e:
-        print(f"Error: MCP Server script or Docker command not found: {e}. Ensure 'python3' and 'docker' are installed and MCP scripts are in the current directory.")
+        logger.error(f"MCP Server script or Docker command not found: {e}. Ensure 'python3' and 'docker' are installed and MCP scripts are in the current directory.")
         raise
     except Exception as e:
-        print(f"Critical error during MCPToolset initialization: {e}")
+        logger.error(f"Critical error during MCPToolset initialization: {e}")
         raise
+    finally:
+        # The agent doesn't wait for the warm-up, which never fails (it only logs a warning), and a
+        # failed startup doesn't leave the task pending. Cancelling only stops waiting for it: the
+        # worker thread still finishes warming up web_retriever in the background.
+        rag_warm_up.cancel()
 
     agent = LlmAgent(
         model='gemini-2.0-flash',
         name='code_assistant',
-        instruction=(
-            'You are a helpful AI code assistant. '
-            'You have tools to execute bash commands, compile and run C++ code snippets, '
-            'capture screenshots of webpages, interact with GitHub (e.g., read files, list issues), '
-            'and critique code (providing feedback on quality, style, and potential issues). '
-            "You also have a tool called 'get_website_content'. This tool now performs Retrieval Augmented Generation (RAG): " # Updated instruction
-            "it takes a comma-separated string 'URL,QUERY_STRING' (e.g., 'https://example.com,What is this page about?'), "
-            "fetches content from the URL, creates a temporary vector store, and returns the most relevant text chunks based on the query. "
-            'Use these tools as needed to answer user requests, debug code, '
-            'fetch documentation, manage repositories, critique code, retrieve and query web content, or perform other coding-related tasks.'
-        ),
+        instruction=CODE_ASSISTANT_INSTRUCTION,
         tools=all_mcp_tools,
     )
     return agent, common_exit_stack
 
-if __name__ == '__main__':
-    return agent, common_exit_stack
+
+# Methods the interactive loop can send user input to, in order of preference.
+AGENT_ENTRYPOINT_NAMES = ("chat", "process", "process_utterance")
+
+
+def resolve_agent_entrypoint(agent):
+    """
+    Returns the agent's bound method for handling user input, looked up once per agent rather
+    than on every turn.
+
+    Args:
+        agent: The agent to talk to.
+
+    Returns:
+        The first callable attribute named in AGENT_ENTRYPOINT_NAMES, or None if there is none.
+    """
+    for name in AGENT_ENTRYPOINT_NAMES:
+        entrypoint = getattr(agent, name, None)
+        if callable(entrypoint):
+            return entrypoint
+    return None
+
+
+@singledispatch
+def extract_response_text(response_obj) -> str:
+    """
+    Returns the reply text of an agent response. The implementation is picked by the response's
+    type (singledispatch caches that choice per type); this fallback handles objects exposing a
+    'text' attribute or method, and stringifies anything else.
+
+    Args:
+        response_obj: The object returned by the agent's entrypoint.
+
+    Returns:
+        The text to show the user.
+    """
+    text = getattr(response_obj, 'text', None)
+    if callable(text):
+        return text()
+    if isinstance(text, str):
+        return text
+    print(f"DEBUG: [%{datetime.now().isoformat()}] ADK Agent response is of type {type(response_obj)}, attempting to print as string.")
+    return str(response_obj)
+
+
+@extract_response_text.register
+def _(response_obj: str) -> str:
+    return response_obj
+
+
+@extract_response_text.register
+def _(response_obj: dict) -> str:
+    if 'output' in response_obj:
+        return response_obj['output']
+    print(f"DEBUG: [%{datetime.now().isoformat()}] ADK Agent response is of type {type(response_obj)}, attempting to print as string.")
+    return str(response_obj)
+
+
+async def read_user_input(prompt: str) -> str:
+    """
+    Reads a line from stdin without blocking the event loop, so MCP sessions, timeouts and other
+    background tasks keep running while the REPL waits for the user.
+
+    The read happens in a daemon thread rather than asyncio.to_thread: if the REPL is interrupted
+    while waiting, asyncio.run would otherwise block on exit until the pending input() returned.
+
+    Args:
+        prompt: The prompt to print.
+
+    Returns:
+        The line entered by the user (EOFError and KeyboardInterrupt propagate as from input()).
+    """
+    loop = asyncio.get_running_loop()
+    line_future = loop.create_future()
+
+    def deliver(set_outcome, outcome):
+        if not line_future.done():
+            set_outcome(outcome)
+
+    def read_line():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(deliver, line_future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(deliver, line_future.set_result, line)
+
+    threading.Thread(target=read_line, name="repl-input", daemon=True).start()
+    return await line_future
+
+
+def _dify_request_body(payload: dict) -> dict:
+    """
+    Returns the requests keyword arguments carrying payload as the JSON request body.
+    """
+    if orjson is not None:
+        return {"data": orjson.dumps(payload)} # Content-Type is set on the session
+    return {"json": payload}
+
+
+def _parse_json(data):
+    """
+    Parses a JSON document from bytes or str.
+    """
+    return orjson.loads(data) if orjson is not None else json.loads(data)
 
 
 class DifyClient:
     def __init__(self, base_url: str, api_key: str, app_user_id: str = "adk_code_assistant_user"):
-        print(f"DEBUG: [%{datetime.now().isoformat()}] DifyClient.__init__ called with base_url='{base_url}', api_key='{'*' * (len(api_key) - 4) + api_key[-4:] if len(api_key) > 4 else 'Provided (short key)'}', app_user_id='{app_user_id}'")
+        logger.debug("DifyClient.__init__ called with base_url='%s', api_key='%s', app_user_id='%s'",
+                     base_url, '*' * (len(api_key) - 4) + api_key[-4:] if len(api_key) > 4 else 'Provided (short key)', app_user_id)
         if base_url.endswith("/"):
             self.base_url = base_url[:-1]
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Removed trailing slash from base_url. New base_url: {self.base_url}")
+            logger.debug("Removed trailing slash from base_url. New base_url: %s", self.base_url)
         else:
             self.base_url = base_url
         self.api_key = api_key
         self.app_user_id = app_user_id
+        # One pooled keep-alive session per client: later turns reuse the TCP+TLS connection.
+        # Retry only re-sends when the connection could not be made; by default urllib3 does not
+        # replay a POST whose request may already have reached Dify.
+        self._session = requests.Session()
+        self._session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=3, backoff_factor=0.2))
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._endpoint_url = f"{self.base_url}/v1/chat-messages"
+        # Fields shared by every chat request; each call only adds the query and response mode.
+        self._payload_template = {"inputs": {}, "user": self.app_user_id}
+
+    def close(self):
+        """
+        Closes the pooled connections of the client's HTTP session.
+        """
+        self._session.close()
 
     def send_chat_message(self, query: str, conversation_id: str = None) -> tuple[str | None, str | None]:
-        print(f"DEBUG: [%{datetime.now().isoformat()}] DifyClient.send_chat_message called with query (first 100 chars)='{query[:100]}...', conversation_id='{conversation_id}'")
-        endpoint_url = f"{self.base_url}/v1/chat-messages"
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Dify API endpoint URL: {endpoint_url}")
+        logger.debug("DifyClient.send_chat_message called with query (first 100 chars)='%.100s...', conversation_id='%s'", query, conversation_id)
+        endpoint_url = self._endpoint_url
+        logger.debug("Dify API endpoint URL: %s", endpoint_url)
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Dify API headers: {{'Authorization': 'Bearer ****', 'Content-Type': 'application/json'}}") # Mask API key in log
-
-        payload = {
-            "inputs": {}, 
-            "query": query,
-            "user": self.app_user_id,
-            "response_mode": "blocking" 
-        }
+        logger.debug("Dify API headers: {'Authorization': 'Bearer ****', 'Content-Type': 'application/json'}") # Mask API key in log
+
+        payload = {**self._payload_template, "query": query, "response_mode": "blocking"}
         if conversation_id:
             payload["conversation_id"] = conversation_id
         
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Dify API payload: {json.dumps(payload)}") # Log full payload for debugging
+        logger.debug("Dify API payload: %s", payload) # Log full payload for debugging
 
         try:
-            response = requests.post(endpoint_url, json=payload, headers=headers, timeout=120)
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Dify API response status code: {response.status_code}")
+            response = self._session.post(endpoint_url, timeout=120, **_dify_request_body(payload))
+            logger.debug("Dify API response status code: %s", response.status_code)
             if response.status_code != 200:
                 error_text = response.text
                 print(f"ERROR: [%{datetime.now().isoformat()}] Dify API Error {response.status_code}: {error_text}")
                 return f"Dify API Error {response.status_code}: {error_text}", conversation_id
             
-            data = response.json()
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Dify API response JSON data: {data}")
+            data = _parse_json(response.content)
+            logger.debug("Dify API response JSON data: %s", data)
 
             answer = data.get("answer")
             new_conversation_id = data.get("conversation_id")
 
-            answer_preview = answer[:100] + "..." if answer and len(answer) > 100 else answer
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Extracted from Dify response - Answer (preview): '{answer_preview}', New Conversation ID: '{new_conversation_id}'")
+            logger.debug("Extracted from Dify response - Answer (preview): '%.100s', New Conversation ID: '%s'", answer, new_conversation_id)
             
             return answer, new_conversation_id
 
@@ -237,8 +1027,62 @@ class DifyClient:
             print(f"ERROR: [%{datetime.now().isoformat()}] Error decoding JSON response from Dify API: {e}\nResponse text: {response.text if 'response' in locals() else 'N/A'}\nTraceback:\n{formatted_traceback}")
             return f"Error decoding JSON response from Dify API: {e}", conversation_id
 
+    def stream_chat_message(self, query: str, conversation_id: str = None):
+        """
+        Sends a chat message with Dify's streaming response mode and yields the answer as it is
+        generated, so the reply can be shown from the first token instead of after the last one.
+
+        Args:
+            query (str): The user message.
+            conversation_id (str): The Dify conversation to continue, if any.
+
+        Yields:
+            tuple[str, str | None]: An answer fragment and the conversation ID it belongs to.
+                Errors are yielded as a single fragment, like send_chat_message returns them.
+        """
+        logger.debug("DifyClient.stream_chat_message called with query (first 100 chars)='%.100s...', conversation_id='%s'", query, conversation_id)
+        endpoint_url = self._endpoint_url
+        payload = {**self._payload_template, "query": query, "response_mode": "streaming"}
+        if conversation_id:
+            payload["conversation_id"] = conversation_id
+
+        try:
+            with self._session.post(endpoint_url, timeout=120, stream=True, **_dify_request_body(payload)) as response:
+                logger.debug("Dify API response status code: %s", response.status_code)
+                if response.status_code != 200:
+                    error_text = response.text
+                    print(f"ERROR: [%{datetime.now().isoformat()}] Dify API Error {response.status_code}: {error_text}")
+                    yield f"Dify API Error {response.status_code}: {error_text}", conversation_id
+                    return
+
+                # Server-sent events: one 'data: {...}' line per event, blank lines in between.
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    event = _parse_json(line[len("data:"):])
+                    conversation_id = event.get("conversation_id") or conversation_id
+                    if event.get("event") in ("message", "agent_message") and event.get("answer"):
+                        yield event["answer"], conversation_id
+                    elif event.get("event") == "error":
+                        print(f"ERROR: [%{datetime.now().isoformat()}] Dify API stream error: {event}")
+                        yield f"Dify API Error: {event.get('message')}", conversation_id
+                        return
+                    elif event.get("event") == "message_end":
+                        return
+
+        except requests.exceptions.RequestException as e:
+            formatted_traceback = traceback.format_exc()
+            print(f"ERROR: [%{datetime.now().isoformat()}] Error communicating with Dify API: {e}\nTraceback:\n{formatted_traceback}")
+            yield f"Error communicating with Dify API: {e}", conversation_id
+        except json.JSONDecodeError as e:
+            formatted_traceback = traceback.format_exc()
+            print(f"ERROR: [%{datetime.now().isoformat()}] Error decoding a streamed Dify API event: {e}\nTraceback:\n{formatted_traceback}")
+            yield f"Error decoding JSON response from Dify API: {e}", conversation_id
+
 
 if __name__ == '__main__':
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(), format="%(levelname)s: %(message)s")
+
     async def main():
         # To run this script in interactive mode, execute it directly.
         # Once the agent is initialized, you can type messages and receive responses.
@@ -255,7 +1099,13 @@ if __name__ == '__main__':
         if agent_framework == "adk":
             print(f"DEBUG: [%{datetime.now().isoformat()}] Initializing ADK agent framework...")
             agent, exit_stack = None, None
+            http_server_processes = []
             try:
+                # Set MCP_HTTP_AUTOSTART=0 when the HTTP servers are managed externally (systemd, supervisord, ...).
+                if MCP_TRANSPORT == "http" and HttpServerParams is not None and os.environ.get("MCP_HTTP_AUTOSTART", "1") != "0":
+                    http_server_processes = start_local_mcp_http_servers()
+                    await wait_for_local_mcp_http_servers()
+
                 agent, exit_stack = await create_code_assistant_agent()
 
                 if agent:
@@ -267,13 +1117,17 @@ if __name__ == '__main__':
                         for tool in agent.tools:
                             print(f"  - Tool: {tool.name}, Description: {tool.description}")
                     
-                    print("\nADK Agent is ready.")
-                    # Start of interactive loop for ADK
-                    print("\nEntering ADK interactive mode. Type 'quit' or 'exit' to end.")
-                    while True:
+                    agent_entrypoint = resolve_agent_entrypoint(agent)
+                    if agent_entrypoint is None:
+                        print("ADK Agent: Error - Could not find a method to interact with the agent (e.g., chat, process, process_utterance). Further investigation is needed.")
+                    else:
+                        print("\nADK Agent is ready.")
+                        # Start of interactive loop for ADK
+                        print("\nEntering ADK interactive mode. Type 'quit' or 'exit' to end.")
+                    while agent_entrypoint is not None:
                         try:
                             print("\nADK Agent is ready for your input...") 
-                            user_input = input("You (ADK): ")
+                            user_input = await read_user_input("You (ADK): ")
                             print(f"DEBUG: [%{datetime.now().isoformat()}] Received user input for ADK: '{user_input}'")
 
                             if user_input.lower() in ['quit', 'exit']:
@@ -282,37 +1136,16 @@ if __name__ == '__main__':
                             
                             print(f"DEBUG: [%{datetime.now().isoformat()}] Sending input to ADK agent for processing...")
                             
-                            if hasattr(agent, 'chat') and callable(getattr(agent, 'chat')):
-                                response_obj = await agent.chat(user_input)
-                            elif hasattr(agent, 'process') and callable(getattr(agent, 'process')):
-                                response_obj = await agent.process(user_input)
-                            elif hasattr(agent, 'process_utterance') and callable(getattr(agent, 'process_utterance')):
-                                response_obj = await agent.process_utterance(user_input)
-                            else:
-                                print("ADK Agent: Error - Could not find a method to interact with the agent (e.g., chat, process, process_utterance). Further investigation is needed.")
-                                response_obj = None
+                            response_obj = await agent_entrypoint(user_input)
 
                             print(f"DEBUG: [%{datetime.now().isoformat()}] Raw response object from ADK agent: {response_obj}")
 
                             if response_obj:
-                                agent_reply_text = None
-                                if isinstance(response_obj, str):
-                                    agent_reply_text = response_obj
-                                elif hasattr(response_obj, 'text') and callable(getattr(response_obj, 'text')): 
-                                    agent_reply_text = response_obj.text()
-                                elif hasattr(response_obj, 'text') and isinstance(response_obj.text, str): 
-                                    agent_reply_text = response_obj.text
-                                elif isinstance(response_obj, dict) and 'output' in response_obj: 
-                                    agent_reply_text = response_obj['output']
-                                else:
-                                    agent_reply_text = str(response_obj) 
-                                    print(f"DEBUG: [%{datetime.now().isoformat()}] ADK Agent response is of type {type(response_obj)}, attempting to print as string.")
-
-                                print(f"Agent (ADK): {agent_reply_text}")
+                                print(f"Agent (ADK): {extract_response_text(response_obj)}")
                             else:
                                 print("Agent (ADK): No response received or error in processing.")
 
-                        except KeyboardInterrupt:
+                        except (KeyboardInterrupt, asyncio.CancelledError): # Ctrl+C arrives as a cancellation while awaiting input
                             print("\nExiting ADK interactive mode due to user interruption.")
                             break
                         except Exception as e:
@@ -336,8 +1169,9 @@ if __name__ == '__main__':
             finally:
                 if exit_stack:
                     print(f"DEBUG: [%{datetime.now().isoformat()}] Closing ADK AsyncExitStack for MCP server connections...")
-                    await exit_stack.aclose()
+                    await close_code_assistant_agent()
                     print(f"DEBUG: [%{datetime.now().isoformat()}] ADK AsyncExitStack closed.")
+                stop_local_mcp_http_servers(http_server_processes)
                 print(f"DEBUG: [%{datetime.now().isoformat()}] ADK Code Assistant finished.")
 
         elif agent_framework == "dify":
@@ -358,31 +1192,42 @@ if __name__ == '__main__':
                 dify_conversation_id = None 
                 while True:
                     try:
-                        user_input = input("You (Dify): ")
+                        user_input = await read_user_input("You (Dify): ")
                         if user_input.lower() in ['quit', 'exit']:
                             print("Exiting Dify interactive mode.")
                             break
                         print(f"DEBUG: [%{datetime.now().isoformat()}] User input for Dify: {user_input}")
                         
-                        answer, new_conv_id = dify_client.send_chat_message(user_input, conversation_id=dify_conversation_id)
-                        
+                        print("Agent (Dify): ", end="", flush=True)
+                        answered = False
+                        new_conv_id = None
+                        for chunk, new_conv_id in dify_client.stream_chat_message(user_input, conversation_id=dify_conversation_id):
+                            print(chunk, end="", flush=True)
+                            answered = True
+                        print("" if answered else "No answer received.")
+
                         if new_conv_id:
                             dify_conversation_id = new_conv_id
                             print(f"DEBUG: [%{datetime.now().isoformat()}] Updated Dify conversation ID: {dify_conversation_id}")
-                        
-                        print(f"Agent (Dify): {answer if answer else 'No answer received.'}")
 
-                    except KeyboardInterrupt:
+                    except (KeyboardInterrupt, asyncio.CancelledError):
                         print("\nExiting Dify interactive mode due to user interruption.")
                         break
                     except Exception as e:
                         print(f"ERROR: [%{datetime.now().isoformat()}] An error occurred during Dify interaction: {e}")
                         traceback.print_exc() # Ensure traceback is imported
+                dify_client.close()
                 print(f"DEBUG: [%{datetime.now().isoformat()}] Dify Code Assistant finished.")
         
         else:
-            print(f"ERROR: [%{datetime.now().isoformat()}}] Invalid AGENT_FRAMEWORK: '{agent_framework}'. Supported values are 'adk' or 'dify'.")
+            print(f"ERROR: [%{datetime.now().isoformat()}] Invalid AGENT_FRAMEWORK: '{agent_framework}'. Supported values are 'adk' or 'dify'.")
         
         print("Code Assistant finished.") # Generic message
 
-    asyncio.run(main())
+    try:
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
+    except KeyboardInterrupt:
+        pass # Ctrl+C while waiting for input; main() has already cleaned up
@@ -1,9 +1,134 @@
+import asyncio
+from contextlib import asynccontextmanager
+from functools import lru_cache
 import subprocess
 import shlex
 import os
-from datetime import datetime
+import logging
 import traceback
 
+# Debug output goes through logging so the f-string formatting and result-dict repr only happen
+# when DEBUG is enabled; this runs on every bash tool call.
+logger = logging.getLogger(__name__)
+# BASH_TOOL_DEBUG=1 traces every command to stderr, also in processes that do not configure
+# logging themselves (e.g. the stdio MCP server and the Dify plugin).
+if os.environ.get("BASH_TOOL_DEBUG", "0") == "1":
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.StreamHandler())
+
+def _split_command(command) -> list:
+    """
+    Returns the argument list for a command string or an already tokenized list.
+    """
+    # For security, if the command is a string, split it into a sequence using shlex.
+    # This helps prevent shell injection if the command string were to be constructed from untrusted input.
+    # However, the primary design assumes the MCP/developer provides the command.
+    if isinstance(command, str):
+        return list(_split_command_string(command))
+    # If it's already a list, use it as is. This might be useful if the caller
+    # has already tokenized the command safely.
+    return command
+
+
+@lru_cache(maxsize=512)
+def _split_command_string(command: str) -> tuple:
+    """
+    Memoized shlex.split: agents often re-run the same command string (e.g. polling `ls`).
+    Returns a tuple so cached results cannot be mutated by callers.
+    """
+    return tuple(shlex.split(command))
+
+
+def _empty_command_result() -> dict:
+    """
+    Returns the result reported for an empty command.
+    """
+    return {
+        "stdout": "",
+        "stderr": "Error: Empty command provided.",
+        "exit_code": -1, # Or a specific code for empty command
+        "timed_out": False,
+    }
+
+
+def _builtin_result(stdout: str = "", exit_code: int = 0) -> dict:
+    """
+    Returns the result dictionary for a command answered in-process.
+    """
+    return {"stdout": stdout, "stderr": "", "exit_code": exit_code, "timed_out": False}
+
+
+def _builtin_pwd(args: list, working_directory: str):
+    # /bin/pwd prints the physical path, symlinks resolved.
+    return None if args else _builtin_result(os.path.realpath(working_directory) + "\n")
+
+
+def _builtin_echo(args: list, working_directory: str):
+    return _builtin_result(" ".join(args) + "\n")
+
+
+def _builtin_true(args: list, working_directory: str):
+    return None if args else _builtin_result()
+
+
+def _builtin_false(args: list, working_directory: str):
+    return None if args else _builtin_result(exit_code=1)
+
+
+def _builtin_cat(args: list, working_directory: str):
+    # Only readable regular files; stdin and missing or unreadable files go to the real cat,
+    # which also produces the exact error messages.
+    paths = [os.path.join(working_directory, arg) for arg in args]
+    if not paths or not all(os.path.isfile(path) for path in paths):
+        return None
+    try:
+        chunks = []
+        for path in paths:
+            with open(path, "rb") as f:
+                chunks.append(f.read())
+    except OSError:
+        return None
+    return _builtin_result(_decode_output(b"".join(chunks)))
+
+
+# Trivial commands answered in-process, skipping a fork+exec. A handler returns None to hand the
+# command to the real executable (e.g. for arguments it does not emulate).
+_BUILTIN_COMMANDS = {
+    "pwd": _builtin_pwd,
+    "echo": _builtin_echo,
+    "true": _builtin_true,
+    "false": _builtin_false,
+    "cat": _builtin_cat,
+}
+
+
+def _run_builtin(cmd_parts: list, working_directory: str):
+    """
+    Returns the result of cmd_parts if it is a trivial command that can be answered without a
+    subprocess, otherwise None.
+    """
+    handler = _BUILTIN_COMMANDS.get(cmd_parts[0])
+    # Options change behaviour in ways not emulated here; a missing directory must fail like Popen.
+    if handler is None or any(arg.startswith("-") for arg in cmd_parts[1:]) or not os.path.isdir(working_directory):
+        return None
+    return handler(cmd_parts[1:], working_directory)
+
+
+def _decode_output(data: bytes, header: str = "") -> str:
+    """
+    Decodes captured subprocess output as UTF-8 (undecodable bytes replaced) with universal
+    newlines, prefixed by header. Output is kept as bytes until here so it is decoded exactly once.
+    """
+    if header:
+        data = b"".join((header.encode(), data))
+    text = data.decode("utf-8", "replace")
+    return text.replace("\r\n", "\n").replace("\r", "\n") if "\r" in text else text
+
+
+def _timeout_header(timeout: int) -> str:
+    return f"Command timed out after {timeout} seconds.\n"
+
+
 def run_bash_command(command: str, timeout: int = 60, working_directory: str = None) -> dict:
     """
     Executes a bash command and returns its output, error, exit code, and timeout status.
@@ -20,61 +145,53 @@ def run_bash_command(command: str, timeout: int = 60, working_directory: str = N
             - exit_code: Exit code of the command.
             - timed_out: Boolean indicating whether the command timed out.
     """
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Entering run_bash_command with command='{command}', timeout={timeout}, working_directory='{working_directory}'")
+    logger.debug("Entering run_bash_command with command='%s', timeout=%s, working_directory='%s'", command, timeout, working_directory)
     if working_directory is None:
         working_directory = os.getcwd()
-        print(f"DEBUG: [%{datetime.now().isoformat()}] working_directory defaulted to: {working_directory}")
+        logger.debug("working_directory defaulted to: %s", working_directory)
 
-    # For security, if the command is a string, split it into a sequence using shlex.
-    # This helps prevent shell injection if the command string were to be constructed from untrusted input.
-    # However, the primary design assumes the MCP/developer provides the command.
-    if isinstance(command, str):
-        cmd_parts = shlex.split(command)
-    else:
-        # If it's already a list, use it as is. This might be useful if the caller
-        # has already tokenized the command safely.
-        cmd_parts = command
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Executing command parts: {cmd_parts}")
+    cmd_parts = _split_command(command)
+    logger.debug("Executing command parts: %s", cmd_parts)
 
     if not cmd_parts: # Handle empty command after shlex.split or if an empty list was passed
-        result_dict = {
-            "stdout": "",
-            "stderr": "Error: Empty command provided.",
-            "exit_code": -1, # Or a specific code for empty command
-            "timed_out": False,
-        }
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_bash_command (empty command) with result: {result_dict}")
+        result_dict = _empty_command_result()
+        logger.debug("Exiting run_bash_command (empty command) with result: %s", result_dict)
+        return result_dict
+
+    result_dict = _run_builtin(cmd_parts, working_directory)
+    if result_dict is not None:
+        logger.debug("Exiting run_bash_command (builtin) with result: %s", result_dict)
         return result_dict
 
     try:
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Attempting to Popen: {cmd_parts} in {working_directory}")
+        logger.debug("Attempting to Popen: %s in %s", cmd_parts, working_directory)
         process = subprocess.Popen(
             cmd_parts,
             cwd=working_directory,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True  # Decode stdout/stderr as text
         )
         stdout, stderr = process.communicate(timeout=timeout)
+        stdout, stderr = _decode_output(stdout), _decode_output(stderr)
         exit_code = process.returncode
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Popen communicate completed. exit_code: {process.returncode}")
+        logger.debug("Popen communicate completed. exit_code: %s", process.returncode)
         timed_out = False
     except subprocess.TimeoutExpired:
         process.kill()
         stdout, stderr = process.communicate() # Get whatever output was captured before timeout
+        stdout, stderr = _decode_output(stdout), _decode_output(stderr, header=_timeout_header(timeout))
         exit_code = -1  # Or some other indicator of timeout
         timed_out = True
-        stderr = f"Command timed out after {timeout} seconds.\n{stderr}"
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Command timed out. stderr: {stderr}")
+        logger.debug("Command timed out. stderr: %s", stderr)
     except FileNotFoundError:
         stdout = ""
         stderr = f"Error: Command or executable not found: {cmd_parts[0] if cmd_parts else ''}"
-        print(f"DEBUG: [%{datetime.now().isoformat()}] FileNotFoundError. cmd_parts[0]: {cmd_parts[0] if cmd_parts else 'N/A'}, stderr: {stderr}")
+        logger.debug("FileNotFoundError. cmd_parts[0]: %s, stderr: %s", cmd_parts[0] if cmd_parts else 'N/A', stderr)
         exit_code = -1 # Or use a specific code like 127 for "command not found"
         timed_out = False
     except Exception as e:
         formatted_traceback = traceback.format_exc()
-        print(f"DEBUG: [%{datetime.now().isoformat()}] An unexpected exception occurred: {e}\nTraceback:\n{formatted_traceback}")
+        logger.debug("An unexpected exception occurred: %s\nTraceback:\n%s", e, formatted_traceback)
         stdout = ""
         stderr = f"An unexpected error occurred: {type(e).__name__} - {str(e)}"
         exit_code = -1 # Generic error
@@ -86,5 +203,119 @@ def run_bash_command(command: str, timeout: int = 60, working_directory: str = N
         "exit_code": exit_code,
         "timed_out": timed_out,
     }
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_bash_command with result: {result_dict}")
+    logger.debug("Exiting run_bash_command with result: %s", result_dict)
+    return result_dict
+
+
+# Commands sharing a working directory run one at a time (FIFO, since asyncio.Lock wakes waiters in
+# order); commands in different directories still run concurrently. Keyed by the resolved path and
+# reference counted, so an entry lives only while a command for that directory runs or waits.
+_DIRECTORY_LOCKS = {} # realpath -> [asyncio.Lock, number of commands holding or waiting for it]
+
+
+@asynccontextmanager
+async def _directory_lock(working_directory: str):
+    """
+    Holds the lock of working_directory for the duration of the block.
+    """
+    key = os.path.realpath(working_directory)
+    entry = _DIRECTORY_LOCKS.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _DIRECTORY_LOCKS[key]
+
+
+async def _run_subprocess(cmd_parts: list, timeout: int, working_directory: str) -> dict:
+    """
+    Runs cmd_parts in working_directory on the event loop and returns the result dictionary.
+    """
+    builtin_result = _run_builtin(cmd_parts, working_directory)
+    if builtin_result is not None:
+        return builtin_result
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd_parts,
+            cwd=working_directory,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        # communicate() runs as its own task rather than under wait_for, which would cancel it at the
+        # timeout and throw away the output read so far; once the command is killed its pipes close and
+        # the same task returns everything captured.
+        communicate = asyncio.ensure_future(process.communicate())
+        try:
+            done, _ = await asyncio.wait({communicate}, timeout=timeout)
+            if done:
+                stdout, stderr = communicate.result()
+                stdout, stderr = _decode_output(stdout), _decode_output(stderr)
+                exit_code = process.returncode
+                timed_out = False
+            else:
+                process.kill()
+                stdout, stderr = await communicate # Whatever output was captured before the timeout
+                stdout, stderr = _decode_output(stdout), _decode_output(stderr, header=_timeout_header(timeout))
+                exit_code = -1
+                timed_out = True
+                logger.debug("Command timed out. stderr: %s", stderr)
+        finally:
+            # Also reached when the awaiting request is cancelled: don't leave the command running
+            # (and its working directory unlocked) behind it.
+            communicate.cancel()
+            if process.returncode is None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+    except FileNotFoundError:
+        stdout = ""
+        stderr = f"Error: Command or executable not found: {cmd_parts[0]}"
+        exit_code = -1
+        timed_out = False
+    except Exception as e:
+        logger.debug("An unexpected exception occurred: %s", e, exc_info=True)
+        stdout = ""
+        stderr = f"An unexpected error occurred: {type(e).__name__} - {str(e)}"
+        exit_code = -1
+        timed_out = False
+
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "exit_code": exit_code,
+        "timed_out": timed_out,
+    }
+
+
+async def run_bash_command_async(command: str, timeout: int = 60, working_directory: str = None) -> dict:
+    """
+    Executes a bash command without blocking the event loop and returns the same dictionary as
+    run_bash_command, so several commands can run concurrently on one loop. Commands in the same
+    working directory are serialized so they do not race on its files.
+
+    Args:
+        command: The bash command to execute.
+        timeout: Maximum time (in seconds) to wait for the command to complete. Defaults to 60.
+        working_directory: The directory in which to execute the command. Defaults to the current working directory.
+
+    Returns:
+        A dictionary containing stdout, stderr, exit_code and timed_out, as for run_bash_command.
+    """
+    logger.debug("Entering run_bash_command_async with command='%s', timeout=%s, working_directory='%s'", command, timeout, working_directory)
+    if working_directory is None:
+        working_directory = os.getcwd()
+
+    cmd_parts = _split_command(command)
+    if not cmd_parts:
+        return _empty_command_result()
+
+    async with _directory_lock(working_directory):
+        result_dict = await _run_subprocess(cmd_parts, timeout, working_directory)
+    logger.debug("Exiting run_bash_command_async with result: %s", result_dict)
     return result_dict
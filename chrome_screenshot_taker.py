@@ -1,136 +1,686 @@
+import asyncio
 import subprocess
 import json
-import base64
 import os
+import shutil
 import tempfile
-from datetime import datetime
+import threading
+import selectors
+import atexit
+import collections
+import hashlib
+import uuid
+import time
+import logging
 import traceback
 
+# Debug output goes through logging with lazy %-formatting, so nothing is formatted per call unless
+# DEBUG is enabled. SCREENSHOT_DEBUG=1 sends it to stderr without configuring logging elsewhere.
+logger = logging.getLogger(__name__)
+if os.environ.get("SCREENSHOT_DEBUG", "0") == "1":
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.StreamHandler())
+
+# Optional: orjson parses the helper's JSON output faster than the stdlib parser.
+# Its JSONDecodeError subclasses json.JSONDecodeError.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # Assuming playwright_helper.py is in the same directory as this script.
 # When running in Docker, the script's path needs to be volume-mounted.
 PLAYWRIGHT_HELPER_SCRIPT_NAME = "playwright_helper.py"
 # Use a specific Playwright image version for consistency.
 # Check https://mcr.microsoft.com/v2/playwright/python/tags/list for available tags.
 DOCKER_IMAGE = "mcr.microsoft.com/playwright/python:v1.42.0" # Example version
+# Container CLI used for every run. Docker-compatible CLIs work too; daemonless `podman` (with the
+# crun runtime) starts containers noticeably faster than dockerd, which matters for one-shot runs.
+CONTAINER_RUNTIME = os.environ.get("DEEPBLUE_CONTAINER_RUNTIME", "docker")
+# The helper writes the PNG into a host temp directory mounted here, so only small metadata
+# JSON crosses the pipe instead of a base64-encoded image.
+CONTAINER_OUTPUT_DIR = "/out"
+SCREENSHOT_FILE_STEM = "screenshot"
+# Formats Playwright can write. JPEG (quality set in the helper) is typically several times smaller than
+# PNG for real pages, which shrinks everything downstream that stores or sends the image.
+SUPPORTED_IMAGE_FORMATS = ("jpeg", "png")
+DEFAULT_IMAGE_FORMAT = "jpeg"
+# Path of the helper script INSIDE the Docker container
+HELPER_SCRIPT_PATH_CONTAINER = f"/app/{PLAYWRIGHT_HELPER_SCRIPT_NAME}"
+# Host path of the helper script, resolved and checked once at import rather than on every call.
+HELPER_SCRIPT_PATH_HOST = os.path.join(os.path.dirname(os.path.abspath(__file__)), PLAYWRIGHT_HELPER_SCRIPT_NAME)
+_HELPER_SCRIPT_FOUND = os.path.exists(HELPER_SCRIPT_PATH_HOST)
+# Optional Chromium --host-resolver-rules (e.g. "MAP example.com 93.184.215.14, MAP *.internal 10.0.0.5")
+# for callers that already know the target IPs; matching hosts skip DNS resolution on every page load.
+HOST_RESOLVER_RULES = os.environ.get("SCREENSHOT_HOST_RESOLVER_RULES", "")
+_HOST_RESOLVER_DOCKER_ENV = ("-e", f"SCREENSHOT_HOST_RESOLVER_RULES={HOST_RESOLVER_RULES}") if HOST_RESOLVER_RULES else ()
+# Helper output quoted in error messages is cut to this many bytes (stdout head, stderr tail), so
+# malformed or very chatty output can't blow up the result dict and everything that logs it.
+RAW_OUTPUT_PREVIEW_BYTES = 512
+STDERR_PREVIEW_BYTES = 4096
+# Number of stderr lines kept from the persistent worker for error reports.
+WORKER_STDERR_TAIL_LINES = 50
+# Jobs written ahead to the persistent worker before reading answers; bounded so neither pipe fills up.
+WORKER_MAX_IN_FLIGHT_JOBS = 16
+# Default cap on containers take_many runs at once; each one runs its own Chromium.
+DEFAULT_MAX_CONCURRENT_SCREENSHOTS = 8
+# Successful screenshots are reused for this long per (url, width, height), so callers that re-capture
+# the same page (monitoring, retries) skip the container and browser entirely.
+SCREENSHOT_CACHE_TTL_SEC = 60
+SCREENSHOT_CACHE_MAX_ENTRIES = 32
+# Content hash of the last image returned per (url, width, height), kept past the TTL so callers can
+# tell whether a fresh screenshot differs from the previous one.
+IMAGE_HASH_MAX_ENTRIES = 1024
+_SCREENSHOT_CACHE: "collections.OrderedDict[tuple, tuple[float, dict]]" = collections.OrderedDict()
+_LAST_IMAGE_HASHES: "collections.OrderedDict[tuple, str]" = collections.OrderedDict()
+_screenshot_cache_lock = threading.Lock()
+
+
+class _ScreenshotWorker:
+    """
+    A long-lived container running `playwright_helper.py --serve`.
+
+    Starting a container, the Python interpreter and Chromium costs seconds per `docker run`; the worker
+    pays that once and then takes one JSON job per line on stdin, answering with one JSON line on stdout.
+    Jobs are serialized by `lock`. The worker is started lazily and restarted after it dies or times out.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process = None
+        self.container_name = None
+        self.host_output_dir = None
+        self._stdout_buffer = b""
+        self._stderr_tail = collections.deque(maxlen=WORKER_STDERR_TAIL_LINES)
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Starts the worker container. Raises FileNotFoundError if Docker is not installed."""
+        self.host_output_dir = tempfile.mkdtemp(prefix="screenshot_worker_")
+        self.container_name = f"screenshot-worker-{uuid.uuid4().hex[:12]}"
+        docker_command = [
+            CONTAINER_RUNTIME, "run",
+            "--rm",
+            "-i",                         # Keep stdin open for jobs
+            "--name", self.container_name, # Lets close() remove a wedged container
+            "--network=host",             # Same network setup as the one-shot container
+            "-v", f"{HELPER_SCRIPT_PATH_HOST}:{HELPER_SCRIPT_PATH_CONTAINER}:ro",
+            "-v", f"{self.host_output_dir}:{CONTAINER_OUTPUT_DIR}",
+            "-w", "/app",
+            *_HOST_RESOLVER_DOCKER_ENV,
+            DOCKER_IMAGE,
+            "python", HELPER_SCRIPT_PATH_CONTAINER, "--serve"
+        ]
+        logger.debug("Starting screenshot worker: %s", docker_command)
+        try:
+            self.process = subprocess.Popen(
+                docker_command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0 # Unbuffered so select() on stdout sees every byte
+            )
+        except Exception:
+            shutil.rmtree(self.host_output_dir, ignore_errors=True)
+            self.host_output_dir = None
+            raise
+        self._stdout_buffer = b""
+        self._stderr_tail.clear()
+        # The helper logs heavily to stderr; drain it so the pipe never fills and blocks the worker.
+        threading.Thread(target=self._drain_stderr, args=(self.process,), daemon=True).start()
+
+    def _drain_stderr(self, process):
+        for line in process.stderr:
+            self._stderr_tail.append(line.decode(errors='replace').rstrip())
+
+    def stderr_tail(self) -> str:
+        return "\n".join(self._stderr_tail)
+
+    def close(self, force: bool = False):
+        """
+        Stops the worker and removes its output directory.
+
+        Closing stdin lets the helper exit cleanly. With force (e.g. after a timeout, when the browser may be
+        wedged), or if it does not exit in time, the container is removed with `docker rm -f`.
+        """
+        process, self.process = self.process, None
+        if process is not None:
+            logger.debug("Stopping screenshot worker %s (pid %s, force=%s).", self.container_name, process.pid, force)
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            try:
+                if force:
+                    raise subprocess.TimeoutExpired(process.args, 0)
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                # Killing the `docker run` client alone would leave the container running.
+                try:
+                    subprocess.run([CONTAINER_RUNTIME, "rm", "-f", self.container_name], capture_output=True, timeout=30, check=False)
+                except (OSError, subprocess.TimeoutExpired) as e:
+                    logger.debug("Failed to remove container %s: %s", self.container_name, e)
+                process.kill()
+                process.wait()
+        if self.host_output_dir is not None:
+            shutil.rmtree(self.host_output_dir, ignore_errors=True)
+            self.host_output_dir = None
+
+    def send(self, job: dict):
+        """Sends one job. Raises BrokenPipeError if the worker has exited."""
+        self.process.stdin.write(json.dumps(job).encode() + b"\n")
+        self.process.stdin.flush()
+
+    def read_line(self, timeout_sec: float) -> bytes:
+        """
+        Returns the helper's next JSON result line (results come back in job order).
+
+        Raises:
+            BrokenPipeError: If the worker exited before answering.
+            subprocess.TimeoutExpired: If no answer arrived within timeout_sec.
+        """
+        deadline = time.monotonic() + timeout_sec
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.process.stdout, selectors.EVENT_READ)
+            while b"\n" not in self._stdout_buffer:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    raise subprocess.TimeoutExpired(self.process.args, timeout_sec)
+                chunk = os.read(self.process.stdout.fileno(), 65536)
+                if not chunk:
+                    raise BrokenPipeError("Screenshot worker exited.")
+                self._stdout_buffer += chunk
+        line, _, self._stdout_buffer = self._stdout_buffer.partition(b"\n")
+        return line
+
+
+_worker = _ScreenshotWorker()
+atexit.register(_worker.close)
+
+
+def _read_helper_output(results: dict, helper_stdout: bytes, screenshot_path: str, image_format: str):
+    """
+    Fills results from the helper's metadata JSON and the image it wrote to screenshot_path.
+
+    Args:
+        results: The result dict being built by take_screenshot; updated in place.
+        helper_stdout: The helper's JSON output.
+        screenshot_path: Host path of the image written by the helper.
+        image_format: The format the helper was asked to write ("jpeg" or "png").
+    """
+    try:
+        helper_output = _json_loads(helper_stdout) # Surrounding whitespace is allowed by both parsers
+
+        if helper_output.get("error"):
+            results["error"] = helper_output["error"]
+        else:
+            if os.path.exists(screenshot_path):
+                with open(screenshot_path, "rb") as f:
+                    results["image_data"] = f.read()
+                results["image_format"] = image_format
+            results["actual_url"] = helper_output.get("actual_url")
+            results["page_title"] = helper_output.get("page_title")
+
+    except json.JSONDecodeError as e:
+        formatted_traceback = traceback.format_exc()
+        raw_output = helper_stdout[:RAW_OUTPUT_PREVIEW_BYTES]
+        truncated = "..." if len(helper_stdout) > RAW_OUTPUT_PREVIEW_BYTES else ""
+        logger.debug("JSONDecodeError: %s\nRaw output for parsing (%s bytes): %r%s\nTraceback:\n%s", e, len(helper_stdout), raw_output, truncated, formatted_traceback)
+        results["error"] = f"Failed to parse JSON output from screenshot script: {e}. Raw output: {raw_output!r}{truncated}"
+        results["docker_error"] = results["error"] # Also flag as a docker_error as script output was bad
 
-def take_screenshot(url: str, width: int = 1280, height: int = 720, page_load_timeout_sec: int = 30) -> dict:
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Entering take_screenshot with url='{url}', width={width}, height={height}, page_load_timeout_sec={page_load_timeout_sec}")
-    results = {
+
+def _run_worker_jobs(batch: list, width: int, height: int, image_format: str, playwright_timeout_ms: int, timeout_sec: int):
+    """
+    Runs screenshot jobs on the persistent worker, filling each job's result dict in place.
+
+    Up to WORKER_MAX_IN_FLIGHT_JOBS jobs are written ahead so the browser never waits on the parent, while
+    neither pipe can fill up and deadlock. If the worker dies, unanswered jobs are resent to a fresh worker
+    and the job it died on is retried once; if it dies before reporting ready, the whole batch fails.
+    A job that times out gets a timeout error and the remaining jobs continue on a fresh worker.
+
+    Args:
+        batch: (url, results) pairs.
+        width: Viewport width.
+        height: Viewport height.
+        image_format: "jpeg" or "png".
+        playwright_timeout_ms: Page load timeout passed to the helper.
+        timeout_sec: How long to wait for each answer.
+    """
+    pending = collections.deque(batch)
+    retried = set()
+    with _worker.lock:
+        while pending:
+            awaiting_ready = False
+            if not _worker.is_running():
+                _worker.close()
+                _worker.start()
+                awaiting_ready = True
+            in_flight = collections.deque()
+            try:
+                while pending or in_flight:
+                    while pending and len(in_flight) < WORKER_MAX_IN_FLIGHT_JOBS:
+                        url, results = pending.popleft()
+                        file_name = f"{uuid.uuid4().hex}.{image_format}"
+                        in_flight.append((url, results, os.path.join(_worker.host_output_dir, file_name)))
+                        _worker.send({
+                            "url": url,
+                            "width": width,
+                            "height": height,
+                            "timeout_ms": playwright_timeout_ms,
+                            "image_format": image_format,
+                            "output_path": f"{CONTAINER_OUTPUT_DIR}/{file_name}"
+                        })
+                    helper_stdout = _worker.read_line(timeout_sec)
+                    if awaiting_ready:
+                        # Jobs were already queued on stdin while the browser started.
+                        awaiting_ready = False
+                        continue
+                    _, results, host_screenshot_path = in_flight.popleft()
+                    try:
+                        _read_helper_output(results, helper_stdout, host_screenshot_path, image_format)
+                    finally:
+                        try:
+                            os.remove(host_screenshot_path)
+                        except OSError:
+                            pass
+            except BrokenPipeError:
+                try:
+                    returncode = _worker.process.wait(timeout=5) # stdout closes just before the process is reaped
+                except subprocess.TimeoutExpired:
+                    returncode = None
+                stderr_tail = _worker.stderr_tail()
+                _worker.close()
+                logger.debug("Screenshot worker died (exit code %s, ready=%s, %s jobs unanswered). Stderr tail:\n%s", returncode, not awaiting_ready, len(in_flight), stderr_tail)
+                docker_error = f"Screenshot worker exited with code {returncode}. Stderr: {stderr_tail}"
+                unanswered = [(url, results) for url, results, _ in in_flight]
+                if awaiting_ready:
+                    # Never got as far as launching the browser; retrying would fail the same way.
+                    failed, pending = unanswered + list(pending), collections.deque()
+                else:
+                    # The job the worker was on may have crashed it: retry it once, resend the rest.
+                    url, results = unanswered[0]
+                    failed = [(url, results)] if id(results) in retried else []
+                    retried.add(id(results))
+                    pending.extendleft(reversed(unanswered[len(failed):]))
+                for _, results in failed:
+                    results["docker_error"] = docker_error
+                    results["error"] = f"Failed to execute screenshot script in Docker. See docker_error for details."
+            except subprocess.TimeoutExpired as e:
+                # The browser may be wedged; continue from a fresh worker.
+                _worker.close(force=True)
+                if awaiting_ready:
+                    timed_out, pending = [(url, results) for url, results, _ in in_flight] + list(pending), collections.deque()
+                else:
+                    _, results, _ = in_flight.popleft()
+                    timed_out = [(None, results)]
+                    pending.extendleft(reversed([(url, results) for url, results, _ in in_flight]))
+                for _, results in timed_out:
+                    _record_exception(results, e, timeout_sec)
+
+
+def _log_results(message: str, results: dict):
+    """Logs a result dict without its image bytes, whose repr would cost O(image size)."""
+    if logger.isEnabledFor(logging.DEBUG):
+        summary = {key: value for key, value in results.items() if key != "image_data"}
+        logger.debug("%s: %s image_bytes=%d", message, summary, len(results["image_data"] or b""))
+
+
+def _new_results(url: str) -> dict:
+    return {
         "image_data": None,
         "image_format": None,
         "error": None,
         "url_requested": url,
         "actual_url": None,
         "page_title": None,
-        "docker_error": None # For errors related to Docker execution itself
+        "docker_error": None, # For errors related to Docker execution itself
+        "image_hash": None, # blake2b digest of image_data
+        "unchanged": False # True if image_data is identical to the last screenshot of this url/viewport
     }
-    
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    helper_script_path_host = os.path.join(script_dir, PLAYWRIGHT_HELPER_SCRIPT_NAME)
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Helper script host path: {helper_script_path_host}")
 
-    if not os.path.exists(helper_script_path_host):
-        results["error"] = f"Critical error: {PLAYWRIGHT_HELPER_SCRIPT_NAME} not found at {helper_script_path_host}"
+
+def _get_cached_screenshot(key: tuple):
+    """Returns a copy of the cached result for key if it is younger than SCREENSHOT_CACHE_TTL_SEC, else None."""
+    with _screenshot_cache_lock:
+        entry = _SCREENSHOT_CACHE.get(key)
+        if entry is None:
+            return None
+        stored_at, results = entry
+        if time.monotonic() - stored_at > SCREENSHOT_CACHE_TTL_SEC:
+            del _SCREENSHOT_CACHE[key]
+            return None
+        _SCREENSHOT_CACHE.move_to_end(key)
+        return dict(results, unchanged=True)
+
+
+def _finish_screenshot(key: tuple, results: dict, use_cache: bool) -> dict:
+    """Sets image_hash/unchanged on a successful result and caches it."""
+    if results["image_data"] is None:
+        return results
+    image_hash = hashlib.blake2b(results["image_data"], digest_size=16).hexdigest()
+    results["image_hash"] = image_hash
+    with _screenshot_cache_lock:
+        results["unchanged"] = _LAST_IMAGE_HASHES.get(key) == image_hash
+        _LAST_IMAGE_HASHES[key] = image_hash
+        _LAST_IMAGE_HASHES.move_to_end(key)
+        if len(_LAST_IMAGE_HASHES) > IMAGE_HASH_MAX_ENTRIES:
+            _LAST_IMAGE_HASHES.popitem(last=False)
+        if use_cache:
+            _SCREENSHOT_CACHE[key] = (time.monotonic(), dict(results))
+            _SCREENSHOT_CACHE.move_to_end(key)
+            if len(_SCREENSHOT_CACHE) > SCREENSHOT_CACHE_MAX_ENTRIES:
+                _SCREENSHOT_CACHE.popitem(last=False)
+    return results
+
+
+def clear_screenshot_cache():
+    """Drops all cached screenshots and remembered image hashes."""
+    with _screenshot_cache_lock:
+        _SCREENSHOT_CACHE.clear()
+        _LAST_IMAGE_HASHES.clear()
+
+
+def _check_helper_script(results: dict) -> bool:
+    """Returns whether the helper script exists (checked at import), recording the error in results if not."""
+    if not _HELPER_SCRIPT_FOUND:
+        results["error"] = f"Critical error: {PLAYWRIGHT_HELPER_SCRIPT_NAME} not found at {HELPER_SCRIPT_PATH_HOST}"
         results["docker_error"] = results["error"] # Also a form of docker/setup error
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting take_screenshot (helper script not found) with results: {results}")
+        _log_results("Helper script not found", results)
+        return False
+    return True
+
+
+def _check_image_format(results: dict, image_format: str) -> bool:
+    """Returns whether image_format is supported, recording the error in results if not."""
+    if image_format not in SUPPORTED_IMAGE_FORMATS:
+        results["error"] = f"Unsupported image_format '{image_format}'. Expected one of: {', '.join(SUPPORTED_IMAGE_FORMATS)}."
+        return False
+    return True
+
+
+# The invariant parts of the one-shot `docker run` command; only the output mount and the helper's
+# arguments change per call.
+_ONE_SHOT_DOCKER_OPTIONS = (
+    CONTAINER_RUNTIME, "run",
+    "--rm",                       # Remove container after execution
+    "--network=host",             # Use host network; simpler for URLs, but consider security.
+                                  # For more isolation: remove this and ensure container has DNS.
+                                  # If issues with DNS, may need '--dns=8.8.8.8' or similar.
+    # "--cap-add=SYS_ADMIN",      # Sometimes needed for Chrome sandboxing in Docker, Playwright images might handle this.
+    "-v", f"{HELPER_SCRIPT_PATH_HOST}:{HELPER_SCRIPT_PATH_CONTAINER}:ro", # Mount helper script read-only
+    "-w", "/app",                 # Set working directory in container
+    *_HOST_RESOLVER_DOCKER_ENV,
+)
+_ONE_SHOT_HELPER_INVOCATION = (DOCKER_IMAGE, "python", HELPER_SCRIPT_PATH_CONTAINER)
+
+
+def _one_shot_docker_command(host_output_dir: str, url: str, width: int, height: int, image_format: str,
+                             playwright_timeout_ms: int) -> list:
+    """Builds the `docker run` command that takes a single screenshot and exits."""
+    return [
+        *_ONE_SHOT_DOCKER_OPTIONS,
+        "-v", f"{host_output_dir}:{CONTAINER_OUTPUT_DIR}", # Helper writes the screenshot here
+        *_ONE_SHOT_HELPER_INVOCATION,
+        url,
+        str(width),
+        str(height),
+        str(playwright_timeout_ms), # Pass timeout in milliseconds
+        f"{CONTAINER_OUTPUT_DIR}/{SCREENSHOT_FILE_STEM}.{image_format}",
+        image_format
+    ]
+
+
+def _read_docker_process_output(results: dict, returncode: int, stdout: bytes, stderr: bytes, screenshot_path: str,
+                                image_format: str):
+    """Fills results from a finished one-shot container's exit code, output and screenshot file."""
+    logger.debug("Docker process completed. Return code: %s", returncode)
+    logger.debug("Docker process stdout (first 500 bytes): %s", stdout[:500])
+    logger.debug("Docker process stderr (first 500 bytes): %s", stderr[:500])
+
+    if returncode != 0:
+        results["docker_error"] = f"Docker process exited with code {returncode}. Stderr: {stderr[-STDERR_PREVIEW_BYTES:].decode(errors='replace').strip()}"
+        # Set a general error, which might be overwritten if playwright_helper.py also reported a specific error.
+        results["error"] = f"Failed to execute screenshot script in Docker. See docker_error for details."
+
+        if stdout: # If playwright_helper.py managed to output JSON despite an error
+            try:
+                helper_output = _json_loads(stdout)
+                if helper_output.get("error"): # If playwright_helper reported a specific error
+                     results["error"] = helper_output.get("error") # Overwrite general Docker error
+            except json.JSONDecodeError:
+                # results["error"] remains the Docker execution error
+                pass
+        return
+
+    # Parse the JSON output from playwright_helper.py (printed to its stdout) and read the PNG it wrote
+    _read_helper_output(results, stdout, screenshot_path, image_format)
+
+
+def _record_exception(results: dict, e: Exception, docker_execution_timeout_sec: int):
+    """Records a failure to run Docker (timeout, missing binary or anything unexpected) in results."""
+    if isinstance(e, subprocess.TimeoutExpired):
+        results["error"] = f"Screenshot operation timed out after {docker_execution_timeout_sec} seconds (Docker execution)."
+        logger.debug("Docker command timed out. Error: %s", results['error'])
+    elif isinstance(e, FileNotFoundError): # Docker command not found
+        runtime_name = CONTAINER_RUNTIME.capitalize()
+        results["error"] = f"{runtime_name} command not found. Please ensure {runtime_name} is installed and in PATH."
+        logger.debug("Docker command not found. Error: %s", results['error'])
+    else:
+        formatted_traceback = traceback.format_exception(type(e), e, e.__traceback__)
+        logger.debug("An unexpected exception occurred: %s\nTraceback:\n%s", e, ''.join(formatted_traceback))
+        results["error"] = f"{type(e).__name__} - {str(e)}"
+    results["docker_error"] = results["error"]
+
+
+def take_screenshot(url: str, width: int = 1280, height: int = 720, page_load_timeout_sec: int = 30, persistent: bool = True,
+                    use_cache: bool = True, image_format: str = DEFAULT_IMAGE_FORMAT) -> dict:
+    """
+    Takes a screenshot of a URL with headless Chromium running in Docker.
+
+    Args:
+        url: The URL to capture.
+        width: Viewport width.
+        height: Viewport height.
+        page_load_timeout_sec: Page load timeout in seconds.
+        persistent: If True (default), reuse a long-lived worker container and browser across calls.
+            If False, start a fresh container with `docker run` for this call only.
+        use_cache: If True (default), return a successful screenshot of the same url and viewport taken
+            within SCREENSHOT_CACHE_TTL_SEC instead of capturing again, and cache this one.
+        image_format: "jpeg" (default, much smaller) or "png" (lossless).
+
+    Returns:
+        A dict with "image_data" (image bytes), "image_format", "error", "url_requested", "actual_url",
+        "page_title", "docker_error", "image_hash" and "unchanged" (True when the image is identical to
+        the previous screenshot of this url and viewport, so callers can skip re-sending it).
+    """
+    logger.debug("Entering take_screenshot with url='%s', width=%s, height=%s, page_load_timeout_sec=%s, persistent=%s", url, width, height, page_load_timeout_sec, persistent)
+    cache_key = (url, width, height, image_format)
+    if use_cache:
+        cached = _get_cached_screenshot(cache_key)
+        if cached is not None:
+            _log_results("Exiting take_screenshot (cached)", cached)
+            return cached
+    results = _new_results(url)
+    if not _check_helper_script(results):
+        return results
+    if not _check_image_format(results, image_format):
         return results
 
-    # Path of the helper script INSIDE the Docker container
-    helper_script_path_container = f"/app/{PLAYWRIGHT_HELPER_SCRIPT_NAME}"
-    
     # Timeout for the script execution within Docker, converting page_load_timeout_sec to ms for playwright_helper
     # Add a small buffer for Playwright startup within Docker.
     docker_execution_timeout_sec = page_load_timeout_sec + 15 # Total time Docker container can run
     playwright_timeout_ms = page_load_timeout_sec * 1000
 
-    docker_command = [
-        "docker", "run",
-        "--rm",                       # Remove container after execution
-        "--network=host",             # Use host network; simpler for URLs, but consider security.
-                                      # For more isolation: remove this and ensure container has DNS.
-                                      # If issues with DNS, may need '--dns=8.8.8.8' or similar.
-        # "--cap-add=SYS_ADMIN",      # Sometimes needed for Chrome sandboxing in Docker, Playwright images might handle this.
-        "-v", f"{helper_script_path_host}:{helper_script_path_container}:ro", # Mount helper script read-only
-        "-w", "/app",                 # Set working directory in container
-        DOCKER_IMAGE,
-        "python", helper_script_path_container,
-        url,
-        str(width),
-        str(height),
-        str(playwright_timeout_ms) # Pass timeout in milliseconds
-    ]
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Constructed Docker command: {' '.join(docker_command)}")
+    host_output_dir = None
+    try:
+        if persistent:
+            _run_worker_jobs([(url, results)], width, height, image_format,
+                             playwright_timeout_ms, docker_execution_timeout_sec)
+        else:
+            host_output_dir = tempfile.mkdtemp(prefix="screenshot_")
+            docker_command = _one_shot_docker_command(host_output_dir, url, width, height, image_format, playwright_timeout_ms)
+            logger.debug("Constructed Docker command: %s", docker_command)
+
+            logger.debug("Attempting to run Docker command. Timeout: %ss", docker_execution_timeout_sec)
+            process = subprocess.run(
+                docker_command,
+                capture_output=True, # Kept as bytes: the JSON parser takes them directly.
+                                     # stderr is decoded only for errors.
+                timeout=docker_execution_timeout_sec,
+                check=False # Don't raise exception for non-zero exit codes from Docker itself
+            )
+            _read_docker_process_output(results, process.returncode, process.stdout, process.stderr,
+                                        os.path.join(host_output_dir, f"{SCREENSHOT_FILE_STEM}.{image_format}"), image_format)
+    except Exception as e:
+        _record_exception(results, e, docker_execution_timeout_sec)
+    finally:
+        if host_output_dir is not None:
+            shutil.rmtree(host_output_dir, ignore_errors=True)
+
+    _finish_screenshot(cache_key, results, use_cache)
+    _log_results("Exiting take_screenshot", results)
+    return results
+
 
+def take_screenshots(urls: list, width: int = 1280, height: int = 720, page_load_timeout_sec: int = 30,
+                     use_cache: bool = True, image_format: str = DEFAULT_IMAGE_FORMAT) -> list:
+    """
+    Screenshots several URLs with one container and one browser.
+
+    All URLs go to the persistent worker in a single pipelined batch, so container and Chromium startup
+    are paid at most once for the whole list.
+
+    Args:
+        urls: The URLs to capture.
+        width: Viewport width for every screenshot.
+        height: Viewport height for every screenshot.
+        page_load_timeout_sec: Page load timeout for every screenshot.
+        use_cache: As for take_screenshot.
+        image_format: As for take_screenshot.
+
+    Returns:
+        One take_screenshot-style result dict per URL, in the same order as urls.
+    """
+    logger.debug("Entering take_screenshots with %s urls, width=%s, height=%s, page_load_timeout_sec=%s", len(urls), width, height, page_load_timeout_sec)
+    all_results = []
+    batch = []
+    for url in urls:
+        cached = _get_cached_screenshot((url, width, height, image_format)) if use_cache else None
+        if cached is not None:
+            all_results.append(cached)
+            continue
+        results = _new_results(url)
+        all_results.append(results)
+        batch.append((url, results))
+    if not batch:
+        return all_results
+
+    setup_errors = _new_results(None)
+    if _check_helper_script(setup_errors) and _check_image_format(setup_errors, image_format):
+        docker_execution_timeout_sec = page_load_timeout_sec + 15
+        try:
+            _run_worker_jobs(batch, width, height, image_format, page_load_timeout_sec * 1000, docker_execution_timeout_sec)
+        except Exception as e:
+            # Failed to start the worker at all (e.g. Docker missing): every unanswered job gets the error.
+            _record_exception(setup_errors, e, docker_execution_timeout_sec)
+
+    for url, results in batch:
+        if setup_errors["error"] and results["error"] is None and results["image_data"] is None:
+            results["error"] = setup_errors["error"]
+            results["docker_error"] = setup_errors["docker_error"]
+        _finish_screenshot((url, width, height, image_format), results, use_cache)
+    logger.debug("Exiting take_screenshots with %s results", len(all_results))
+    return all_results
+
+
+async def take_screenshot_async(url: str, width: int = 1280, height: int = 720, page_load_timeout_sec: int = 30,
+                                use_cache: bool = True, image_format: str = DEFAULT_IMAGE_FORMAT) -> dict:
+    """
+    Async version of take_screenshot that runs its own one-shot container via asyncio subprocesses.
+
+    Page loads are mostly waiting on the network, so one event loop can drive many of these at once
+    (see take_many). Shares take_screenshot's cache and returns the same dict.
+    """
+    logger.debug("Entering take_screenshot_async with url='%s', width=%s, height=%s, page_load_timeout_sec=%s", url, width, height, page_load_timeout_sec)
+    cache_key = (url, width, height, image_format)
+    if use_cache:
+        cached = _get_cached_screenshot(cache_key)
+        if cached is not None:
+            _log_results("Exiting take_screenshot_async (cached)", cached)
+            return cached
+    results = _new_results(url)
+    if not _check_helper_script(results):
+        return results
+    if not _check_image_format(results, image_format):
+        return results
+
+    docker_execution_timeout_sec = page_load_timeout_sec + 15
+    playwright_timeout_ms = page_load_timeout_sec * 1000
+    host_output_dir = tempfile.mkdtemp(prefix="screenshot_")
+    process = None
     try:
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Attempting to run Docker command. Timeout: {docker_execution_timeout_sec}s")
-        process = subprocess.run(
-            docker_command,
-            capture_output=True,
-            text=True, # Decodes stdout/stderr as UTF-8
-            timeout=docker_execution_timeout_sec,
-            check=False # Don't raise exception for non-zero exit codes from Docker itself
+        docker_command = _one_shot_docker_command(host_output_dir, url, width, height, image_format, playwright_timeout_ms)
+        logger.debug("Starting Docker command asynchronously. Timeout: %ss", docker_execution_timeout_sec)
+        process = await asyncio.create_subprocess_exec(
+            *docker_command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
         )
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Docker process completed. Return code: {process.returncode}")
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Docker process stdout (first 500 chars): {process.stdout[:500]}")
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Docker process stderr (first 500 chars): {process.stderr[:500]}")
-
-        if process.returncode != 0:
-            results["docker_error"] = f"Docker process exited with code {process.returncode}. Stderr: {process.stderr.strip()}"
-            # Set a general error, which might be overwritten if playwright_helper.py also reported a specific error.
-            results["error"] = f"Failed to execute screenshot script in Docker. See docker_error for details."
-            
-            if process.stdout: # If playwright_helper.py managed to output JSON despite an error
-                try:
-                    helper_output = json.loads(process.stdout.strip())
-                    if helper_output.get("error"): # If playwright_helper reported a specific error
-                         results["error"] = helper_output.get("error") # Overwrite general Docker error
-                except json.JSONDecodeError:
-                    # results["error"] remains the Docker execution error
-                    pass 
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting take_screenshot (Docker process error) with results: {results}")
-            return results
-
-        # Try to parse the JSON output from playwright_helper.py (printed to its stdout)
         try:
-            helper_output = json.loads(process.stdout.strip())
-            
-            if helper_output.get("error"):
-                results["error"] = helper_output["error"]
-            else:
-                if helper_output.get("image_base64"):
-                    results["image_data"] = base64.b64decode(helper_output["image_base64"])
-                    results["image_format"] = "png"
-                results["actual_url"] = helper_output.get("actual_url")
-                results["page_title"] = helper_output.get("page_title")
-
-        except json.JSONDecodeError as e:
-            formatted_traceback = traceback.format_exc()
-            print(f"DEBUG: [%{datetime.now().isoformat()}] JSONDecodeError: {e}\nRaw output for parsing: {process.stdout.strip()}\nTraceback:\n{formatted_traceback}")
-            results["error"] = f"Failed to parse JSON output from screenshot script: {e}. Raw output: {process.stdout.strip()}"
-            results["docker_error"] = results["error"] # Also flag as a docker_error as script output was bad
-
-    except subprocess.TimeoutExpired:
-        results["error"] = f"Screenshot operation timed out after {docker_execution_timeout_sec} seconds (Docker execution)."
-        results["docker_error"] = results["error"]
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Docker command timed out. Error: {results['error']}")
-    except FileNotFoundError: # Docker command not found
-        results["error"] = "Docker command not found. Please ensure Docker is installed and in PATH."
-        results["docker_error"] = results["error"]
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Docker command not found. Error: {results['error']}")
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=docker_execution_timeout_sec)
+        except asyncio.TimeoutError:
+            raise subprocess.TimeoutExpired(docker_command, docker_execution_timeout_sec)
+        _read_docker_process_output(results, process.returncode, stdout, stderr,
+                                    os.path.join(host_output_dir, f"{SCREENSHOT_FILE_STEM}.{image_format}"), image_format)
     except Exception as e:
-        formatted_traceback = traceback.format_exc()
-        print(f"DEBUG: [%{datetime.now().isoformat()}] An unexpected exception occurred: {e}\nTraceback:\n{formatted_traceback}")
-        results["error"] = f"{type(e).__name__} - {str(e)}"
-        results["docker_error"] = results["error"] # Flag as a docker_error
+        _record_exception(results, e, docker_execution_timeout_sec)
+    finally:
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
+        shutil.rmtree(host_output_dir, ignore_errors=True)
 
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting take_screenshot with results: {results}")
+    _finish_screenshot(cache_key, results, use_cache)
+    _log_results("Exiting take_screenshot_async", results)
     return results
 
+
+async def take_many(urls: list, width: int = 1280, height: int = 720, page_load_timeout_sec: int = 30,
+                    max_concurrency: int = DEFAULT_MAX_CONCURRENT_SCREENSHOTS, use_cache: bool = True,
+                    image_format: str = DEFAULT_IMAGE_FORMAT) -> list:
+    """
+    Screenshots several URLs concurrently.
+
+    Args:
+        urls: The URLs to capture.
+        width: Viewport width for every screenshot.
+        height: Viewport height for every screenshot.
+        page_load_timeout_sec: Page load timeout for every screenshot.
+        max_concurrency: Maximum number of containers (each with its own Chromium) running at once.
+        use_cache: Passed to take_screenshot_async.
+        image_format: Passed to take_screenshot_async.
+
+    Returns:
+        One take_screenshot-style result dict per URL, in the same order as urls.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def limited(url):
+        async with semaphore:
+            return await take_screenshot_async(url, width, height, page_load_timeout_sec, use_cache, image_format)
+
+    return await asyncio.gather(*(limited(url) for url in urls))
+
 if __name__ == '__main__':
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Starting chrome_screenshot_taker.py example usage...")
+    logging.basicConfig(level=logging.DEBUG, format="%(asctime)s DEBUG %(message)s")
+    logger.debug("Starting chrome_screenshot_taker.py example usage...")
     # Example Usage (requires Docker running and playwright_helper.py in the same directory)
     test_url = "https://www.google.com" # Replace with a simple, reliable URL for testing
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Example: Attempting to take screenshot of {test_url}...")
+    logger.debug("Example: Attempting to take screenshot of %s...", test_url)
     output = take_screenshot(test_url, width=800, height=600, page_load_timeout_sec=20)
 
     if output.get("image_data"):
@@ -138,7 +688,7 @@ if __name__ == '__main__':
         # or use a dedicated 'screenshots' directory if preferred.
         temp_screenshot_file = None
         try:
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmpfile:
+            with tempfile.NamedTemporaryFile(suffix=f".{output['image_format']}", delete=False) as tmpfile:
                 tmpfile.write(output["image_data"])
                 temp_screenshot_file = tmpfile.name
             print(f"Screenshot saved to {temp_screenshot_file}")
@@ -148,7 +698,7 @@ if __name__ == '__main__':
             # For this example, just printing the path is sufficient.
         except Exception as e:
             formatted_traceback = traceback.format_exc()
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Error saving screenshot: {e}\nTraceback:\n{formatted_traceback}")
+            logger.debug("Error saving screenshot: %s\nTraceback:\n%s", e, formatted_traceback)
         # No automatic deletion here for the example, so user can inspect.
         # In a real app, manage temp files appropriately.
     else:
@@ -159,7 +709,7 @@ if __name__ == '__main__':
              print(f"Docker specific error: {output.get('docker_error')}")
 
     test_url_timeout = "https://httpstat.us/200?sleep=30000" # sleeps for 30s
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Example: Attempting to take screenshot of {test_url_timeout}...")
+    logger.debug("Example: Attempting to take screenshot of %s...", test_url_timeout)
     output_timeout = take_screenshot(test_url_timeout, width=800, height=600, page_load_timeout_sec=10)
     if output_timeout.get("error"):
         print(f"Error as expected: {output_timeout.get('error')}")
@@ -173,7 +723,7 @@ if __name__ == '__main__':
 
 
     test_url_invalid = "http://thissitedoesnotexistandneverwill12345.com"
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Example: Attempting to take screenshot of {test_url_invalid}...")
+    logger.debug("Example: Attempting to take screenshot of %s...", test_url_invalid)
     output_invalid = take_screenshot(test_url_invalid, width=800, height=600, page_load_timeout_sec=10)
     if output_invalid.get("error"):
         print(f"Error as expected: {output_invalid.get('error')}")
@@ -182,7 +732,7 @@ if __name__ == '__main__':
 
     # Example of a site that might cause issues or have specific error messages
     test_url_bad_ssl = "https://expired.badssl.com/"
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Example: Attempting to take screenshot of {test_url_bad_ssl}...")
+    logger.debug("Example: Attempting to take screenshot of %s...", test_url_bad_ssl)
     # playwright_helper.py has ignore_https_errors=True, so this might succeed or show a browser error page
     output_bad_ssl = take_screenshot(test_url_bad_ssl, width=800, height=600, page_load_timeout_sec=15)
     if output_bad_ssl.get("image_data"):
@@ -191,5 +741,4 @@ if __name__ == '__main__':
         print(f"Error for {test_url_bad_ssl}: {output_bad_ssl.get('error')}")
     else:
         print(f"Unexpected result for {test_url_bad_ssl}: {output_bad_ssl}")
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Finished chrome_screenshot_taker.py example usage.")
-```
+    logger.debug("Finished chrome_screenshot_taker.py example usage.")
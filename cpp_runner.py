@@ -2,24 +2,511 @@ import subprocess
 import tempfile
 import os
 import shutil # For robust directory deletion
-from typing import Union, Dict, Any
-from datetime import datetime
+from typing import Union, Dict, Any, Tuple, List
 import traceback
+import threading
+import atexit
+import uuid
+import hashlib
+import re
+import queue
+import selectors
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
-# Use ubuntu:22.04 as the Docker image
-DOCKER_IMAGE = "ubuntu:22.04"
+# Debug output goes through logging with lazy %-formatting, so nothing is formatted per call unless
+# DEBUG is enabled. CPP_RUNNER_DEBUG=1 sends it to stderr without configuring logging elsewhere.
+logger = logging.getLogger(__name__)
+if os.environ.get("CPP_RUNNER_DEBUG", "0") == "1":
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.StreamHandler())
 
-def run_cpp_code(cpp_code: str, stdin_data: Union[str, None] = None, compile_timeout: int = 10, exec_timeout: int = 5, compiler: str = "g++") -> Dict[str, Any]:
+# Sandbox image with g++ and clang++ preinstalled, built once from CPP_SANDBOX_DOCKERFILE on first use
+# so compilation doesn't run apt-get on every call. Override with DEEPBLUE_CPP_IMAGE to use a prebuilt tag.
+BASE_IMAGE = "ubuntu:22.04"
+DOCKER_IMAGE = os.environ.get("DEEPBLUE_CPP_IMAGE", "deepblue/cpp-sandbox:22.04")
+IMAGE_BUILD_TIMEOUT = 600 # Seconds; building is a one-off and is not counted against compile_timeout
+# Precompiled headers for the whole standard library live in PCH_DIR in the image: parsing the STL
+# headers dominates compile time for small snippets. A PCH is only usable with the -std/-O flags it was
+# built with, so there is one per optimization level: g++ picks the matching file from the
+# stdcpp.h.gch directory itself, clang++ is pointed at its file explicitly.
+PCH_DIR = "/opt/pch"
+
+# Built with BuildKit: the apt package lists and downloaded .debs live in cache mounts that persist
+# between builds (the base image's docker-clean hook, which deletes them, is removed), so rebuilding
+# after a package change doesn't download everything again, and they don't end up in the image.
+CPP_SANDBOX_DOCKERFILE = f"""
+FROM {BASE_IMAGE}
+RUN rm -f /etc/apt/apt.conf.d/docker-clean && \\
+    echo 'Binary::apt::APT::Keep-Downloaded-Packages "true";' > /etc/apt/apt.conf.d/keep-cache
+RUN --mount=type=cache,target=/var/cache/apt,sharing=locked \\
+    --mount=type=cache,target=/var/lib/apt/lists,sharing=locked \\
+    apt-get update && apt-get install -y --no-install-recommends g++ clang mold
+RUN set -e; mkdir -p {PCH_DIR}/stdcpp.h.gch; echo '#include <bits/stdc++.h>' > {PCH_DIR}/stdcpp.h; \\
+    for level in O0 O2; do \\
+        g++ -std=c++17 -$level -x c++-header {PCH_DIR}/stdcpp.h -o {PCH_DIR}/stdcpp.h.gch/$level.gch; \\
+        clang++ -std=c++17 -$level -x c++-header {PCH_DIR}/stdcpp.h -o {PCH_DIR}/stdcpp-clang-$level.pch; \\
+    done
+"""
+# BUILDKIT_INLINE_CACHE embeds cache metadata in the image, so a copy pushed to a registry can seed
+# --cache-from on other hosts.
+_IMAGE_BUILD_COMMAND = (
+    "docker", "build",
+    "--build-arg", "BUILDKIT_INLINE_CACHE=1",
+    "--cache-from", DOCKER_IMAGE,
+    "-t", DOCKER_IMAGE,
+    "-", # Dockerfile on stdin, no build context needed
+)
+
+_sandbox_image_ready = False
+_sandbox_image_lock = threading.Lock()
+
+def _ensure_sandbox_image() -> Union[str, None]:
+    """
+    Makes sure DOCKER_IMAGE exists locally, building it from CPP_SANDBOX_DOCKERFILE if it doesn't.
+    Only the first successful check per process touches Docker.
+
+    Returns:
+        None if the image is available, otherwise an error message.
+    """
+    global _sandbox_image_ready
+    with _sandbox_image_lock:
+        if _sandbox_image_ready:
+            return None
+        try:
+            inspect_process = subprocess.run(["docker", "image", "inspect", DOCKER_IMAGE], capture_output=True, text=True)
+            if inspect_process.returncode != 0:
+                logger.debug("Sandbox image %s not found locally; building it.", DOCKER_IMAGE)
+                build_process = subprocess.run(
+                    list(_IMAGE_BUILD_COMMAND),
+                    env=dict(os.environ, DOCKER_BUILDKIT="1"), # Cache mounts need BuildKit
+                    input=CPP_SANDBOX_DOCKERFILE,
+                    timeout=IMAGE_BUILD_TIMEOUT,
+                    capture_output=True,
+                    text=True
+                )
+                if build_process.returncode != 0:
+                    logger.debug("Sandbox image build failed. Return code: %s", build_process.returncode)
+                    return f"Failed to build C++ sandbox image {DOCKER_IMAGE}:\n{build_process.stderr}"
+                logger.debug("Sandbox image %s built.", DOCKER_IMAGE)
+        except subprocess.TimeoutExpired:
+            return f"Building C++ sandbox image {DOCKER_IMAGE} timed out after {IMAGE_BUILD_TIMEOUT} seconds."
+        except FileNotFoundError:
+            return "Error: Docker command not found. Please ensure Docker is installed and in PATH."
+        _sandbox_image_ready = True
+        return None
+
+# Sandbox containers (`sleep infinity`) are kept running and reused: compile and execute are dispatched
+# with `docker exec` instead of paying a container start and teardown per phase. Each call checks out
+# an idle container, so concurrent calls (see run_cpp_code_many) run in separate containers; up to
+# SANDBOX_MAX_CONTAINERS are started on demand. Each container mounts its own host directory (under
+# _sandbox_root) at /sandbox, which is the working directory of the one call using it, so a job can't
+# see the files of jobs running in other containers.
+SANDBOX_CONTAINER_PREFIX = "deepblue-cpp-sandbox"
+SANDBOX_MOUNT = "/sandbox"
+SANDBOX_START_TIMEOUT = 60 # Seconds
+SANDBOX_MAX_CONTAINERS = int(os.environ.get("DEEPBLUE_CPP_SANDBOXES", os.cpu_count() or 1))
+SANDBOX_WAIT_POLL = 0.5 # Seconds between checks for a free container slot while all are busy
+# The compiler's intermediate files (and anything the program writes to /tmp) live in RAM rather than
+# in the container's overlay filesystem.
+SANDBOX_TMPFS = "/tmp:rw,exec,size=64m,mode=1777"
+# Per-container limits, so a runaway snippet (fork bomb, huge allocation, busy loop) only slows down its
+# own container and not the others running next to it. The memory limit is sized for the compiler;
+# the program itself is held to EXEC_MEMORY_LIMIT_KB below. The root filesystem is read-only: only
+# /sandbox and /tmp are writable.
+SANDBOX_MEMORY = "512m"
+SANDBOX_CPUS = "1"
+SANDBOX_PIDS_LIMIT = 64
+# The compiler runs as root, the program as nobody: it can't write to /sandbox (the source, the compiler
+# output files and its own executable), only to SANDBOX_SCRATCH_DIRS. When it exits, any processes it
+# left behind (double-forked daemons) are killed as the same user, and then SANDBOX_SCRATCH_DIRS are
+# emptied as root, so the container goes back to the pool clean.
+SANDBOX_RUN_AS = "setpriv --reuid=65534 --regid=65534 --clear-groups"
+SANDBOX_SCRATCH_DIRS = "/tmp /dev/shm"
+SANDBOX_DIR_MODE = 0o711 # Lets nobody run ./temp_exec without listing or writing the directory
+
+# Fixed parts of the docker command lines, built once rather than per call.
+_SANDBOX_RUN_OPTIONS = (
+    "docker", "run", "-d", "--rm",
+    "--init",                     # Reaps orphaned processes
+    "--network=none",
+    "--tmpfs", SANDBOX_TMPFS,
+    f"--memory={SANDBOX_MEMORY}",
+    f"--memory-swap={SANDBOX_MEMORY}", # Same as --memory: no swap on top of it
+    f"--cpus={SANDBOX_CPUS}",
+    f"--pids-limit={SANDBOX_PIDS_LIMIT}",
+    "--read-only",
+    "--security-opt=no-new-privileges",
+    "-w", SANDBOX_MOUNT,
+)
+_SANDBOX_EXEC_PREFIX = ("docker", "exec", "-i")
+
+# Alternative backend: Bubblewrap runs the same sandbox script directly on the host in fresh namespaces
+# (no network, private /tmp, read-only system directories), which starts in milliseconds rather than
+# going through the Docker daemon. It uses the host's g++/clang++, which must be installed. Linux only;
+# when bwrap isn't available the Docker backend is used instead.
+SUPPORTED_BACKENDS = ("docker", "bwrap")
+DEFAULT_BACKEND = os.environ.get("DEEPBLUE_CPP_BACKEND", "docker")
+BWRAP_PATH = shutil.which("bwrap") # Looked up once at import
+_BWRAP_OPTIONS = (
+    "bwrap",
+    "--unshare-all",              # Includes the network namespace
+    "--die-with-parent",          # Killing bwrap on a backstop timeout takes the program with it
+    "--new-session",
+    "--ro-bind", "/usr", "/usr",
+    "--ro-bind-try", "/bin", "/bin",
+    "--ro-bind-try", "/lib", "/lib",
+    "--ro-bind-try", "/lib64", "/lib64",
+    "--ro-bind-try", "/etc/ld.so.cache", "/etc/ld.so.cache",
+    "--ro-bind-try", "/etc/alternatives", "/etc/alternatives",
+    "--proc", "/proc",
+    "--dev", "/dev",
+    "--tmpfs", "/tmp",
+)
+
+_sandbox_root = None # Host directory holding the containers' directories and the bwrap working directories
+_sandbox_containers = set() # Every running sandbox container, idle or checked out
+_sandbox_dirs: Dict[str, str] = {} # Container name -> host directory mounted at SANDBOX_MOUNT in it
+_idle_sandboxes: "queue.Queue[str]" = queue.Queue()
+_sandbox_slots = threading.BoundedSemaphore(SANDBOX_MAX_CONTAINERS) # One per running container
+_sandbox_lock = threading.Lock()
+
+def _remove_container(container_name: str) -> None:
+    try:
+        subprocess.run(["docker", "rm", "-f", container_name], capture_output=True, timeout=30)
+    except Exception as e:
+        logger.debug("Failed to remove container %s: %s", container_name, e)
+
+def _ensure_sandbox_root() -> None:
+    """Creates the host directory holding the sandbox and working directories, if it doesn't exist yet."""
+    global _sandbox_root
+    with _sandbox_lock:
+        if _sandbox_root is None:
+            _sandbox_root = tempfile.mkdtemp(prefix="deepblue_cpp_")
+
+def _start_sandbox() -> Tuple[Union[str, None], Union[str, None]]:
+    """
+    Starts a new sandbox container. The caller must hold a slot from _sandbox_slots.
+
+    Returns:
+        A tuple (container_name, error). container_name is None if the container could not be started,
+        in which case error holds the message.
+    """
+    _ensure_sandbox_root()
+    container_name = f"{SANDBOX_CONTAINER_PREFIX}-{uuid.uuid4().hex[:12]}"
+    sandbox_dir = tempfile.mkdtemp(dir=_sandbox_root, prefix="box_")
+    os.chmod(sandbox_dir, SANDBOX_DIR_MODE)
+    start_command = [
+        *_SANDBOX_RUN_OPTIONS,
+        "--name", container_name,
+        "-v", f"{sandbox_dir}:{SANDBOX_MOUNT}",
+        DOCKER_IMAGE,
+        "sleep", "infinity"
+    ]
+    logger.debug("Starting sandbox container: %s", start_command)
+    try:
+        start_process = subprocess.run(start_command, timeout=SANDBOX_START_TIMEOUT, capture_output=True, text=True)
+    except subprocess.TimeoutExpired:
+        _remove_container(container_name)
+        shutil.rmtree(sandbox_dir, ignore_errors=True)
+        return None, f"Starting C++ sandbox container timed out after {SANDBOX_START_TIMEOUT} seconds."
+    except FileNotFoundError:
+        shutil.rmtree(sandbox_dir, ignore_errors=True)
+        return None, "Error: Docker command not found. Please ensure Docker is installed and in PATH."
+    if start_process.returncode != 0:
+        shutil.rmtree(sandbox_dir, ignore_errors=True)
+        return None, f"Failed to start C++ sandbox container:\n{start_process.stderr}"
+    with _sandbox_lock:
+        _sandbox_containers.add(container_name)
+        _sandbox_dirs[container_name] = sandbox_dir
+    return container_name, None
+
+def _checkout_sandbox() -> Tuple[Union[str, None], Union[str, None]]:
+    """
+    Takes an idle sandbox container, starting one (after building the image if needed) when none is
+    idle and fewer than SANDBOX_MAX_CONTAINERS are running, or waiting for one otherwise.
+    Hand it back with _return_sandbox, or _discard_sandbox if it can't be reused.
+
+    Returns:
+        A tuple (container_name, error) as for _start_sandbox.
     """
-    Compiles and runs C++ code in a sandboxed environment using Docker,
-    with a choice of compiler (g++ or clang++).
+    image_error = _ensure_sandbox_image()
+    if image_error:
+        return None, image_error
+    while True:
+        try:
+            return _idle_sandboxes.get_nowait(), None
+        except queue.Empty:
+            pass
+        if _sandbox_slots.acquire(blocking=False):
+            container_name, error = _start_sandbox()
+            if container_name is None:
+                _sandbox_slots.release()
+            return container_name, error
+        # All slots taken: wait for a container to come back (or a slot to free up if one is discarded).
+        try:
+            return _idle_sandboxes.get(timeout=SANDBOX_WAIT_POLL), None
+        except queue.Empty:
+            continue
+
+def _return_sandbox(container_name: str) -> None:
+    with _sandbox_lock:
+        if container_name not in _sandbox_containers: # Removed at exit in the meantime
+            return
+    _idle_sandboxes.put(container_name)
+
+def _discard_sandbox(container_name: str) -> None:
+    """
+    Removes a sandbox container that can no longer be trusted (e.g. a timed-out process may still be
+    running in it). A fresh one is started when needed.
+    """
+    with _sandbox_lock:
+        if container_name not in _sandbox_containers:
+            return
+        _sandbox_containers.discard(container_name)
+        sandbox_dir = _sandbox_dirs.pop(container_name, None)
+    _sandbox_slots.release()
+    logger.debug("Discarding sandbox container %s", container_name)
+    _remove_container(container_name)
+    if sandbox_dir is not None:
+        shutil.rmtree(sandbox_dir, ignore_errors=True)
+
+def _sandbox_lost(returncode: int, stderr: str) -> bool:
+    """True if `docker exec` failed because the sandbox container itself is gone or stopped."""
+    return returncode != 0 and "Error response from daemon" in stderr
+
+# The bwrap backend's per-call working directories under _sandbox_root are recycled instead of created
+# and deleted on every call; only the files a call leaves behind are removed between uses. (A sandbox
+# container's directory is emptied the same way after each call.)
+WORKDIR_POOL_SIZE = 16
+WORKDIR_FILES = ("temp_code.cpp", "temp_exec", "cc.out", "cc.err", "cc.rc")
+_workdir_pool: "queue.Queue[str]" = queue.Queue(maxsize=WORKDIR_POOL_SIZE)
+
+def _checkout_workdir() -> str:
+    try:
+        return _workdir_pool.get_nowait()
+    except queue.Empty:
+        return tempfile.mkdtemp(dir=_sandbox_root)
+
+def _clear_workdir(workdir: str) -> bool:
+    """Removes the files a call leaves in workdir. Returns False if anything else is left in it."""
+    for file_name in WORKDIR_FILES:
+        try:
+            os.unlink(os.path.join(workdir, file_name))
+        except FileNotFoundError:
+            pass
+    try:
+        return not os.listdir(workdir)
+    except OSError:
+        return False
+
+def _return_workdir(workdir: str) -> None:
+    """Empties workdir and puts it back in the pool, or deletes it if the program left other files behind or the pool is full."""
+    if _clear_workdir(workdir):
+        try:
+            _workdir_pool.put_nowait(workdir)
+            return
+        except queue.Full:
+            pass
+    shutil.rmtree(workdir, ignore_errors=True)
+
+@atexit.register
+def _shutdown_sandbox() -> None:
+    with _sandbox_lock:
+        container_names = list(_sandbox_containers)
+        _sandbox_containers.clear()
+        _sandbox_dirs.clear()
+    for container_name in container_names:
+        _remove_container(container_name)
+    if _sandbox_root is not None:
+        shutil.rmtree(_sandbox_root, ignore_errors=True)
+
+# Written by the sandbox script into the call's directory when compilation fails, holding the
+# compiler's exit code. The status never goes through stdout, which belongs to the program.
+COMPILE_STATUS_FILE = "cc.rc"
+# `timeout -s KILL` exits with 128 + SIGKILL when it had to kill the command; --verbose makes it say so
+# on stderr.
+TIMEOUT_KILLED_EXIT_CODE = 137
+TIMEOUT_NOTICE = "timeout: sending signal"
+SANDBOX_TIMEOUT_GRACE = 5 # Seconds added to the Python-side timeout on top of compile_timeout + exec_timeout
+
+# Snippets are compiled and then run once, so by default the build is not optimized: -O0 compiles
+# several times faster and only CPU-heavy programs notice the difference (they can pass optimize=True).
+# -pipe hands intermediate output between compiler stages through pipes instead of temporary files.
+COMPILE_FLAGS = "-std=c++17 -pipe"
+OPTIMIZE_FLAGS = {False: "-O0", True: "-O2"}
+# Snippets compiled in the sandbox image whose first include is <bits/stdc++.h> (with only comments
+# before it) get that header from the precompiled one. Force-including it into other snippets would
+# change what they mean (names from headers they didn't include can clash with their own), so they are
+# compiled as written. DEEPBLUE_CPP_PCH=0 turns this off.
+PCH_ENABLED = os.environ.get("DEEPBLUE_CPP_PCH", "1") == "1"
+_PCH_OPT_IN_PATTERN = re.compile(r"\A(?:\s*//[^\n]*)*\s*#\s*include\s*<bits/stdc\+\+\.h>")
+
+# Cheap checks done before touching the sandbox: a snippet that is too large, or that cannot define main
+# (nothing that looks like "main(" in it), is rejected as a compilation error right away.
+MAX_SOURCE_BYTES = 1 << 20
+# Address space limit (ulimit -v, KiB) for the program, set after compiling; it also applies under bwrap,
+# which has no container limits.
+EXEC_MEMORY_LIMIT_KB = 256 * 1024
+_MAIN_PATTERN = re.compile(r"\bmain\s*\(")
+
+# Link with mold where it is installed (the sandbox image has it), which is several times faster than
+# GNU ld against libstdc++. The g++ in the image (GCC 11) predates -fuse-ld=mold, so it is pointed at
+# mold's ld wrapper directory with -B instead; clang++ takes -fuse-ld=mold.
+MOLD_LINKER_FLAGS = {"g++": ("/usr/libexec/mold/ld", "-B/usr/libexec/mold"), "clang++": ("/usr/bin/ld.mold", "-fuse-ld=mold")}
+
+def _pch_flags(compiler_exe: str, optimize_flag: str) -> str:
+    if compiler_exe == "clang++":
+        return f"-include-pch {PCH_DIR}/stdcpp-clang{optimize_flag}.pch"
+    return f"-include {PCH_DIR}/stdcpp.h"
+
+# Compiled executables are cached by a hash of the source, compiler, flags and image, so resubmitting the
+# same snippet skips compilation. An executable is stored after its program has run, so only those built
+# where the program could not have replaced it are cached: in a sandbox container the program runs as
+# SANDBOX_RUN_AS and can't write its directory, under bwrap it can, so bwrap runs are never cached.
+CACHE_DIR = os.path.expanduser(os.environ.get("DEEPBLUE_CPP_CACHE", "~/.cache/deepblue_cpp"))
+
+def _executable_cache_key(environment: str, compiler_exe: str, compile_flags: str, cpp_code: str) -> str:
+    return hashlib.sha256(f"{environment}|{compiler_exe}|{compile_flags}|{cpp_code}".encode("utf-8")).hexdigest()
+
+def _load_cached_executable(cache_key: str, destination: str) -> bool:
+    """Copies the cached executable for cache_key to destination. Returns False on a cache miss."""
+    try:
+        shutil.copy(os.path.join(CACHE_DIR, cache_key), destination)
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logger.debug("Could not read executable cache entry %s: %s", cache_key, e)
+        return False
+    return True
+
+def _store_cached_executable(cache_key: str, source: str) -> None:
+    """Adds a freshly compiled executable to the cache. Written to a temp file first so readers never see a partial copy."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=f".{cache_key}.")
+        os.close(fd)
+        try:
+            shutil.copy(source, temp_path)
+            os.replace(temp_path, os.path.join(CACHE_DIR, cache_key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except OSError as e:
+        logger.debug("Could not store executable cache entry %s: %s", cache_key, e)
+
+# Each of the program's stdout/stderr (and the compiler's output files) is kept to at most this many
+# bytes. A program that prints more is killed, so a tight print loop can't exhaust host memory before
+# exec_timeout fires.
+MAX_OUTPUT_BYTES = 1 << 20
+OUTPUT_TRUNCATED_NOTICE = "\n[output truncated]"
+_PIPE_CHUNK_BYTES = 65536
+
+def _read_text(path: str, limit: int = MAX_OUTPUT_BYTES) -> str:
+    try:
+        with open(path, "rb") as f:
+            data = f.read(limit + 1)
+    except FileNotFoundError:
+        return ""
+    text = data[:limit].decode("utf-8", errors="replace")
+    return text + OUTPUT_TRUNCATED_NOTICE if len(data) > limit else text
+
+def _read_compile_status(workdir: str) -> Union[int, None]:
+    """Returns the compiler's exit code recorded in COMPILE_STATUS_FILE, or None if compilation didn't fail."""
+    try:
+        with open(os.path.join(workdir, COMPILE_STATUS_FILE), "rb") as f:
+            status = f.read(16)
+    except FileNotFoundError:
+        return None
+    try:
+        return int(status.strip())
+    except ValueError:
+        return -1
+
+def _run_capped(command: List[str], input_bytes: bytes, timeout: float, max_output: int = MAX_OUTPUT_BYTES) -> Tuple[int, bytes, bytes, bool]:
+    """
+    Runs command, feeding it input_bytes and collecting stdout/stderr as they arrive, like
+    subprocess.run(capture_output=True) but with each stream bounded: once either would exceed
+    max_output the process is killed.
+
+    Returns:
+        A tuple (returncode, stdout, stderr, truncated).
+
+    Raises:
+        subprocess.TimeoutExpired: If the process is still running after timeout seconds (it is killed).
+    """
+    deadline = time.monotonic() + timeout
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    buffers = {process.stdout: bytearray(), process.stderr: bytearray()}
+    pending = memoryview(input_bytes)
+    truncated = False
+    try:
+        with selectors.DefaultSelector() as selector:
+            for stream in buffers:
+                selector.register(stream, selectors.EVENT_READ)
+            if pending:
+                os.set_blocking(process.stdin.fileno(), False)
+                selector.register(process.stdin, selectors.EVENT_WRITE)
+            else:
+                process.stdin.close()
+            while selector.get_map() and not truncated:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(command, timeout)
+                for key, _ in selector.select(remaining):
+                    if key.fileobj is process.stdin:
+                        try:
+                            pending = pending[os.write(key.fd, pending[:_PIPE_CHUNK_BYTES]):]
+                        except BlockingIOError:
+                            continue
+                        except BrokenPipeError: # The program exited or closed stdin without reading it all
+                            pending = pending[:0]
+                        if not pending:
+                            selector.unregister(process.stdin)
+                            process.stdin.close()
+                        continue
+                    chunk = os.read(key.fd, _PIPE_CHUNK_BYTES)
+                    if not chunk:
+                        selector.unregister(key.fileobj)
+                        continue
+                    buffer = buffers[key.fileobj]
+                    if len(buffer) + len(chunk) > max_output:
+                        buffer += chunk[:max_output - len(buffer)]
+                        truncated = True
+                        process.kill()
+                        break
+                    buffer += chunk
+        returncode = process.wait(timeout=max(deadline - time.monotonic(), 0))
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        for stream in (process.stdin, process.stdout, process.stderr):
+            stream.close()
+    return returncode, bytes(buffers[process.stdout]), bytes(buffers[process.stderr]), truncated
+
+def run_cpp_code(cpp_code: str, stdin_data: Union[str, None] = None, compile_timeout: int = 10, exec_timeout: int = 5, compiler: str = "g++", use_cache: bool = True, optimize: bool = False, backend: Union[str, None] = None) -> Dict[str, Any]:
+    """
+    Compiles and runs C++ code in a sandboxed environment using Docker (or Bubblewrap),
+    with a choice of compiler (g++ or clang++). Both phases run in one `docker exec`
+    in a pooled sandbox container, or in one `bwrap` invocation on the host.
 
     Args:
         cpp_code: A string containing the C++ code to compile and run.
-        stdin_data: Optional string data to be passed to the C++ program's standard input.
+        stdin_data: Optional string data to be passed (UTF-8 encoded) to the C++ program's standard input.
+            If None, the program sees an empty standard input.
         compile_timeout: Timeout in seconds for the compilation phase.
         exec_timeout: Timeout in seconds for the execution phase.
         compiler: The C++ compiler to use. Supported values are "g++" (default) and "clang++".
+        use_cache: Reuse a previously compiled executable for identical code, compiler and flags
+            (stored under CACHE_DIR). On a cache hit the compilation output fields are empty.
+            The bwrap backend always compiles.
+        optimize: Compile with -O2 instead of -O0. Worth it only for CPU-heavy snippets, since the
+            program runs once and -O2 makes compilation several times slower.
+        backend: "docker" or "bwrap" (host compilers, much faster to start). Defaults to DEFAULT_BACKEND
+            (env DEEPBLUE_CPP_BACKEND, "docker"). "bwrap" falls back to "docker" if bwrap isn't installed.
 
     Returns:
         A dictionary containing the results of the compilation and execution.
@@ -27,7 +514,7 @@ def run_cpp_code(cpp_code: str, stdin_data: Union[str, None] = None, compile_tim
         {
             "compilation_stdout": str,
             "compilation_stderr": str,
-            "compilation_exit_code": int | None, # None if Docker command itself fails, -100 for invalid compiler
+            "compilation_exit_code": int | None, # None if Docker command itself fails, -100 for invalid compiler or backend
             "timed_out_compilation": bool,
             "execution_stdout": str | None,
             "execution_stderr": str | None,
@@ -36,7 +523,7 @@ def run_cpp_code(cpp_code: str, stdin_data: Union[str, None] = None, compile_tim
             "compiler_used": str # "g++", "clang++", or "none"
         }
     """
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Entering run_cpp_code with cpp_code='{cpp_code[:100]}...', stdin_data='{stdin_data}', compile_timeout={compile_timeout}, exec_timeout={exec_timeout}, compiler='{compiler}'")
+    logger.debug("Entering run_cpp_code with cpp_code='%.100s...', stdin_data='%s', compile_timeout=%s, exec_timeout=%s, compiler='%s', use_cache=%s, optimize=%s, backend=%s", cpp_code, stdin_data, compile_timeout, exec_timeout, compiler, use_cache, optimize, backend)
     results: Dict[str, Any] = {
         "compilation_stdout": "",
         "compilation_stderr": "",
@@ -53,142 +540,232 @@ def run_cpp_code(cpp_code: str, stdin_data: Union[str, None] = None, compile_tim
     if compiler not in ["g++", "clang++"]:
         results["compilation_stderr"] = f"Unsupported compiler: '{compiler}'. Supported compilers are 'g++' and 'clang++'."
         results["compilation_exit_code"] = -100 # Special exit code for invalid compiler
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_cpp_code (compiler validation failed) with results: {results}")
+        logger.debug("Exiting run_cpp_code (compiler validation failed) with results: %s", results)
         return results
     
+    backend = backend or DEFAULT_BACKEND
+    if backend not in SUPPORTED_BACKENDS:
+        results["compilation_stderr"] = f"Unsupported backend: '{backend}'. Supported backends are 'docker' and 'bwrap'."
+        results["compilation_exit_code"] = -100
+        logger.debug("Exiting run_cpp_code (backend validation failed) with results: %s", results)
+        return results
+    if backend == "bwrap" and BWRAP_PATH is None:
+        logger.debug("bwrap not found; falling back to the docker backend.")
+        backend = "docker"
+
     results["compiler_used"] = compiler
     compiler_exe = "clang++" if compiler == "clang++" else "g++"
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Compiler set to: {compiler_exe}")
+    logger.debug("Compiler set to: %s, backend: %s", compiler_exe, backend)
+
+    if len(cpp_code.encode("utf-8", errors="replace")) > MAX_SOURCE_BYTES:
+        results["compilation_stderr"] = f"error: source code exceeds {MAX_SOURCE_BYTES} bytes"
+    elif not _MAIN_PATTERN.search(cpp_code):
+        results["compilation_stderr"] = "error: no 'main' function"
+    if results["compilation_stderr"]:
+        results["compilation_exit_code"] = 1
+        logger.debug("Exiting run_cpp_code (pre-check failed) with results: %s", results)
+        return results
+
+    # 2. Sandbox Container (kept running, reused across calls); bwrap needs none
+    container_name = None
+    if backend == "docker":
+        container_name, sandbox_error = _checkout_sandbox()
+        if sandbox_error:
+            results["compilation_stderr"] = sandbox_error
+            results["compilation_exit_code"] = -1 # Indicate Docker error
+            logger.debug("Exiting run_cpp_code (sandbox unavailable) with results: %s", results)
+            return results
+    else:
+        _ensure_sandbox_root()
 
     temp_dir = None
+    output_truncated = False
     try:
-        # 1. Setup Temporary Directory
-        temp_dir = tempfile.mkdtemp()
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Created temporary directory: {temp_dir}")
-        cpp_filepath = os.path.join(temp_dir, "temp_code.cpp")
-        executable_filepath = os.path.join(temp_dir, "temp_exec") # Relative path for inside container
-
-        # 2. Setup Temporary Directory (moved after compiler validation)
-        # This is a duplicate of the above temp_dir creation. Removing it.
-        # temp_dir = tempfile.mkdtemp() 
-        # cpp_filepath = os.path.join(temp_dir, "temp_code.cpp")
-        # executable_filepath = os.path.join(temp_dir, "temp_exec")
-
-        # 3. Write C++ Code
-        with open(cpp_filepath, "w") as f:
-            f.write(cpp_code)
-        print(f"DEBUG: [%{datetime.now().isoformat()}] C++ code written to {cpp_filepath}")
-
-        # 4. Compilation Phase
-        # Shell command to install compilers and then compile
-        # apt-get update and install are silenced with > /dev/null 2>&1
-        docker_shell_command = (
-            f"apt-get update > /dev/null 2>&1 && apt-get install -y g++ clang > /dev/null 2>&1; "
-            f"{compiler_exe} -std=c++17 -O2 temp_code.cpp -o temp_exec"
+        # 3. This call's working directory: the container's own directory, or a pooled one for bwrap
+        temp_dir = _sandbox_dirs[container_name] if container_name is not None else _checkout_workdir()
+        logger.debug("Using working directory: %s", temp_dir)
+        executable_filepath = os.path.join(temp_dir, "temp_exec")
+
+        # Reuse a cached executable if this exact snippet was compiled before
+        compile_flags = f"{COMPILE_FLAGS} {OPTIMIZE_FLAGS[bool(optimize)]}"
+        # Only the sandbox image has the precompiled headers (a custom DEEPBLUE_CPP_IMAGE may not, so the
+        # script checks that they are there).
+        use_pch = backend == "docker" and PCH_ENABLED and _PCH_OPT_IN_PATTERN.match(cpp_code) is not None
+        pch_flags = _pch_flags(compiler_exe, OPTIMIZE_FLAGS[bool(optimize)]) if use_pch else ""
+        cache_key = _executable_cache_key(DOCKER_IMAGE, compiler_exe, f"{compile_flags} {pch_flags}", cpp_code) if use_cache and backend == "docker" else None
+        cache_hit = cache_key is not None and _load_cached_executable(cache_key, executable_filepath)
+        logger.debug("Executable cache key: %s, hit: %s", cache_key, cache_hit)
+
+        # The source is not written from the host: it is streamed in ahead of the program's stdin, and
+        # the script's `head -c` (which reads exactly that many bytes) saves it as temp_code.cpp.
+        source_bytes = b"" if cache_hit else cpp_code.encode("utf-8")
+        stdin_bytes = stdin_data.encode("utf-8") if stdin_data is not None else b""
+
+        # 4. Compile and execute in a single `docker exec` (or `bwrap`)
+        # The script first saves the source, then compiles with the compiler's output going to
+        # cc.out/cc.err in the call's directory. If compilation fails, it writes the compiler's exit code to
+        # COMPILE_STATUS_FILE there and stops; otherwise it replaces itself with the program,
+        # which inherits stdin/stdout/stderr. Both steps run under coreutils `timeout`, whose --verbose
+        # notice tells a timeout apart from the program's own exit code. On a cache hit the compile step
+        # is left out. In a container the program runs as SANDBOX_RUN_AS; whatever it left running is
+        # killed and SANDBOX_SCRATCH_DIRS are emptied before the script exits with its status; under bwrap the program already can't
+        # outlive the sandbox (its PID namespace ends with it).
+        mold_path, mold_flag = MOLD_LINKER_FLAGS[compiler_exe]
+        pch_step = f"if [ -e {PCH_DIR}/stdcpp.h ]; then PCH='{pch_flags}'; fi; " if pch_flags else ""
+        compile_step = "" if cache_hit else (
+            f"head -c {len(source_bytes)} > temp_code.cpp; "
+            f"{pch_step}"
+            f"if [ -x {mold_path} ]; then LD='{mold_flag}'; fi; "
+            f"timeout --verbose -s KILL {compile_timeout} {compiler_exe} {compile_flags} $PCH $LD temp_code.cpp -o temp_exec >cc.out 2>cc.err; "
+            f"rc=$?; if [ $rc -ne 0 ]; then echo $rc > {COMPILE_STATUS_FILE}; exit $rc; fi; "
         )
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Docker shell command for compilation: {docker_shell_command}")
-        
-        compile_command = [
-            "docker", "run", "--rm", "--network=none", # Added --network=none
-            "-v", f"{os.path.abspath(temp_dir)}:/sandbox",
-            "-w", "/sandbox",
-            DOCKER_IMAGE,
-            "sh", "-c", docker_shell_command # Run the combined command in a shell
-        ]
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Full Docker compile command: {' '.join(compile_command)}")
+        if backend == "docker":
+            execute_step = (
+                f"{SANDBOX_RUN_AS} timeout --verbose -s KILL {exec_timeout} ./temp_exec; "
+                f"rc=$?; {SANDBOX_RUN_AS} sh -c 'kill -9 -1' 2>/dev/null; "
+                f"find {SANDBOX_SCRATCH_DIRS} -mindepth 1 -delete 2>/dev/null; exit $rc"
+            )
+        else:
+            execute_step = f"exec timeout --verbose -s KILL {exec_timeout} ./temp_exec"
+        docker_shell_command = compile_step + f"ulimit -v {EXEC_MEMORY_LIMIT_KB}; " + execute_step
+        logger.debug("Docker shell command: %s", docker_shell_command)
+
+        if backend == "docker":
+            execute_command = [
+                *_SANDBOX_EXEC_PREFIX,
+                "-w", SANDBOX_MOUNT,
+                container_name,
+                "sh", "-c", docker_shell_command
+            ]
+        else:
+            execute_command = [
+                *_BWRAP_OPTIONS,
+                "--bind", temp_dir, SANDBOX_MOUNT,
+                "--chdir", SANDBOX_MOUNT,
+                "sh", "-c", docker_shell_command
+            ]
+        logger.debug("Full Docker command: %s", execute_command)
 
         try:
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Attempting to run Docker compile command. Timeout: {compile_timeout}s")
-            compile_process = subprocess.run(
-                compile_command,
-                timeout=compile_timeout,
-                capture_output=True,
-                text=True
+            # The in-container timeouts normally fire first; this is only a backstop for a wedged container.
+            backstop_timeout = compile_timeout + exec_timeout + SANDBOX_TIMEOUT_GRACE
+            logger.debug("Attempting to run Docker command. Timeout: %ss", backstop_timeout)
+            returncode, stdout_bytes, stderr_bytes, output_truncated = _run_capped(
+                execute_command,
+                source_bytes + stdin_bytes,
+                backstop_timeout
             )
-            results["compilation_stdout"] = compile_process.stdout
-            results["compilation_stderr"] = compile_process.stderr
-            results["compilation_exit_code"] = compile_process.returncode
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Docker compile process completed. Return code: {compile_process.returncode}")
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Docker compile stdout (first 500 chars): {compile_process.stdout[:500]}")
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Docker compile stderr (first 500 chars): {compile_process.stderr[:500]}")
+            # Programs may print anything, so invalid UTF-8 is replaced rather than raising.
+            stdout = stdout_bytes.decode("utf-8", errors="replace")
+            stderr = stderr_bytes.decode("utf-8", errors="replace")
+            logger.debug("Docker process completed. Return code: %s, output truncated: %s", returncode, output_truncated)
+            logger.debug("Docker stdout (first 500 chars): %.500s", stdout)
+            logger.debug("Docker stderr (first 500 chars): %.500s", stderr)
         except subprocess.TimeoutExpired:
-            results["timed_out_compilation"] = True
-            results["compilation_stderr"] = f"Compilation timed out after {compile_timeout} seconds."
-            results["compilation_exit_code"] = -1 # Indicate timeout
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Docker compile command timed out. Error: {results['compilation_stderr']}")
-        except FileNotFoundError: # Docker not found
-            results["compilation_stderr"] = "Error: Docker command not found. Please ensure Docker is installed and in PATH."
+            compiled = os.path.exists(executable_filepath)
+            if container_name is not None:
+                _discard_sandbox(container_name) # Whatever was running is still running inside it
+                container_name = None
+            if compiled:
+                results["compilation_exit_code"] = 0
+                results["timed_out_execution"] = True
+                results["execution_stderr"] = f"Execution timed out after {exec_timeout} seconds."
+                results["execution_exit_code"] = -1 # Indicate timeout
+            else:
+                results["timed_out_compilation"] = True
+                results["compilation_stderr"] = f"Compilation timed out after {compile_timeout} seconds."
+                results["compilation_exit_code"] = -1 # Indicate timeout
+            logger.debug("Docker command timed out. Exiting run_cpp_code with results: %s", results)
+            return results
+        except FileNotFoundError: # Docker (or bwrap) not found
+            results["compilation_stderr"] = "Error: Docker command not found. Please ensure Docker is installed and in PATH." if backend == "docker" else "Error: bwrap command not found."
             results["compilation_exit_code"] = -1 # Indicate Docker error
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Docker command not found during compilation. Error: {results['compilation_stderr']}")
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_cpp_code (Docker not found during compile) with results: {results}")
+            logger.debug("Exiting run_cpp_code (Docker not found) with results: %s", results)
             return results # Cannot proceed
         except Exception as e: # Other potential errors running Docker
             formatted_traceback = traceback.format_exc()
-            print(f"DEBUG: [%{datetime.now().isoformat()}] An unexpected exception occurred during Docker compilation command: {e}\nTraceback:\n{formatted_traceback}")
+            logger.debug("An unexpected exception occurred during Docker command: %s\nTraceback:\n%s", e, formatted_traceback)
             results["compilation_stderr"] = f"{type(e).__name__} - {str(e)}"
             results["compilation_exit_code"] = -1 # Indicate Docker error
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_cpp_code (Docker exception during compile) with results: {results}")
+            logger.debug("Exiting run_cpp_code (Docker exception) with results: %s", results)
             return results # Cannot proceed
 
-
-        if results["compilation_exit_code"] != 0 or results["timed_out_compilation"]:
-            # Compilation failed or timed out, skip execution
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_cpp_code (compilation failed or timed out) with results: {results}")
+        # 5. Split the compile and execute results
+        compile_status = None if cache_hit else _read_compile_status(temp_dir)
+        compile_failed = compile_status is not None
+        if container_name is not None and _sandbox_lost(returncode, stderr) and not compile_failed:
+            _discard_sandbox(container_name)
+            container_name = None
+            results["compilation_stderr"] = stderr
+            results["compilation_exit_code"] = -1 # Indicate Docker error
+            logger.debug("Exiting run_cpp_code (sandbox container lost) with results: %s", results)
             return results
 
-        # 5. Execution Phase (if compilation succeeded)
-        # Docker command: docker run --rm --network=none -i -v /host/temp_dir:/sandbox -w /sandbox <image> ./temp_exec
-        execute_command = [
-            "docker", "run", "--rm", "--network=none", "-i", # Added --network=none
-            "-v", f"{os.path.abspath(temp_dir)}:/sandbox",
-            "-w", "/sandbox",
-            DOCKER_IMAGE, # The same image already has the runtime environment
-            "./temp_exec"
-        ]
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Full Docker execute command: {' '.join(execute_command)}")
-
-        input_bytes = stdin_data.encode('utf-8') if stdin_data is not None else None
+        results["compilation_stdout"] = _read_text(os.path.join(temp_dir, "cc.out"))
+        results["compilation_stderr"] = _read_text(os.path.join(temp_dir, "cc.err"))
+        if compile_failed:
+            results["compilation_exit_code"] = compile_status
+            if results["compilation_exit_code"] == TIMEOUT_KILLED_EXIT_CODE and TIMEOUT_NOTICE in results["compilation_stderr"]:
+                results["timed_out_compilation"] = True
+                results["compilation_stderr"] = f"Compilation timed out after {compile_timeout} seconds."
+                results["compilation_exit_code"] = -1 # Indicate timeout
+            # Compilation failed or timed out, execution was skipped
+            logger.debug("Exiting run_cpp_code (compilation failed or timed out) with results: %s", results)
+            return results
 
-        try:
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Attempting to run Docker execute command. Timeout: {exec_timeout}s")
-            execute_process = subprocess.run(
-                execute_command,
-                input=input_bytes,
-                timeout=exec_timeout,
-                capture_output=True,
-                text=True # Decodes stdout/stderr as UTF-8 by default
-            )
-            results["execution_stdout"] = execute_process.stdout
-            results["execution_stderr"] = execute_process.stderr
-            results["execution_exit_code"] = execute_process.returncode
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Docker execute process completed. Return code: {execute_process.returncode}")
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Docker execute stdout (first 500 chars): {execute_process.stdout[:500]}")
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Docker execute stderr (first 500 chars): {execute_process.stderr[:500]}")
-        except subprocess.TimeoutExpired:
+        results["compilation_exit_code"] = 0
+        if cache_key is not None and not cache_hit:
+            _store_cached_executable(cache_key, executable_filepath)
+        results["execution_stdout"] = stdout
+        results["execution_stderr"] = stderr + OUTPUT_TRUNCATED_NOTICE if output_truncated else stderr
+        results["execution_exit_code"] = returncode
+        if returncode == TIMEOUT_KILLED_EXIT_CODE and TIMEOUT_NOTICE in stderr:
             results["timed_out_execution"] = True
             results["execution_stderr"] = f"Execution timed out after {exec_timeout} seconds."
             results["execution_exit_code"] = -1 # Indicate timeout
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Docker execute command timed out. Error: {results['execution_stderr']}")
-        except FileNotFoundError: # Should not happen if compilation Docker command worked
-            results["execution_stderr"] = "Error: Docker command not found for execution (unexpected)."
-            results["execution_exit_code"] = -1
-        except Exception as e: # Other potential errors running Docker
-            formatted_traceback = traceback.format_exc()
-            print(f"DEBUG: [%{datetime.now().isoformat()}] An unexpected exception occurred during Docker execution command: {e}\nTraceback:\n{formatted_traceback}")
-            results["execution_stderr"] = f"{type(e).__name__} - {str(e)}"
-            results["execution_exit_code"] = -1
 
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_cpp_code with results: {results}")
+        logger.debug("Exiting run_cpp_code with results: %s", results)
         return results
 
     finally:
         # 6. Cleanup
-        if temp_dir and os.path.exists(temp_dir):
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Cleaning up temporary directory: {temp_dir}")
-            shutil.rmtree(temp_dir)
+        if container_name is not None:
+            # Killing `docker exec` for too much output doesn't stop the program inside the container,
+            # so that container is not reused.
+            if temp_dir is not None and not output_truncated and _clear_workdir(temp_dir):
+                _return_sandbox(container_name)
+            else:
+                _discard_sandbox(container_name)
+        elif temp_dir and os.path.exists(temp_dir):
+            logger.debug("Returning working directory to the pool: %s", temp_dir)
+            _return_workdir(temp_dir)
+
+def run_cpp_code_many(snippets: List[Union[str, Dict[str, Any]]], max_parallel: Union[int, None] = None, **kwargs) -> List[Dict[str, Any]]:
+    """
+    Runs many snippets concurrently, each in its own sandbox container checked out for the duration of
+    the job (containers are started as needed, up to SANDBOX_MAX_CONTAINERS, and reused).
+
+    Args:
+        snippets: The C++ sources to run. An item may instead be a dict of run_cpp_code arguments
+            (e.g. {"cpp_code": ..., "stdin_data": ...}), which override the shared keyword arguments.
+        max_parallel: Maximum number of snippets in flight. Defaults to SANDBOX_MAX_CONTAINERS.
+        **kwargs: run_cpp_code arguments shared by all snippets (compiler, timeouts, ...).
+
+    Returns:
+        One run_cpp_code result dict per snippet, in the order given.
+    """
+    jobs = [dict(kwargs, **snippet) if isinstance(snippet, dict) else dict(kwargs, cpp_code=snippet) for snippet in snippets]
+    if not jobs:
+        return []
+    max_workers = min(max_parallel or SANDBOX_MAX_CONTAINERS, len(jobs))
+    logger.debug("run_cpp_code_many running %s snippets with max_parallel=%s", len(jobs), max_workers)
+    # The work is waiting on docker subprocesses, which releases the GIL, so threads are enough.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda job: run_cpp_code(**job), jobs))
 
 if __name__ == '__main__':
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Starting cpp_runner.py example usage...")
+    logging.basicConfig(level=logging.DEBUG, format="%(asctime)s DEBUG %(message)s")
+    logger.debug("Starting cpp_runner.py example usage...")
     # Example Usage:
 
     # 1. Simple Hello World (default g++)
@@ -199,7 +776,7 @@ if __name__ == '__main__':
         return 0;
     }
     """
-    print(f"DEBUG: [%{datetime.now().isoformat()}] --- Running Hello World (g++) ---")
+    logger.debug("--- Running Hello World (g++) ---")
     hello_results_gpp = run_cpp_code(hello_world_code, compiler="g++")
     print(f"Compiler Used: {hello_results_gpp['compiler_used']}")
     print(f"Compilation Exit Code: {hello_results_gpp['compilation_exit_code']}")
@@ -209,7 +786,7 @@ if __name__ == '__main__':
     print("-" * 30)
 
     # 1b. Simple Hello World (clang++)
-    print(f"DEBUG: [%{datetime.now().isoformat()}] --- Running Hello World (clang++) ---")
+    logger.debug("--- Running Hello World (clang++) ---")
     hello_results_clang = run_cpp_code(hello_world_code, compiler="clang++")
     print(f"Compiler Used: {hello_results_clang['compiler_used']}")
     print(f"Compilation Exit Code: {hello_results_clang['compilation_exit_code']}")
@@ -219,7 +796,7 @@ if __name__ == '__main__':
     print("-" * 30)
 
     # 1c. Invalid Compiler
-    print(f"DEBUG: [%{datetime.now().isoformat()}] --- Running with Invalid Compiler ---")
+    logger.debug("--- Running with Invalid Compiler ---")
     invalid_compiler_results = run_cpp_code(hello_world_code, compiler="invalid_compiler")
     print(f"Compiler Used: {invalid_compiler_results['compiler_used']}") # Should be 'none'
     print(f"Compilation Exit Code: {invalid_compiler_results['compilation_exit_code']}") # Should be -100
@@ -239,7 +816,7 @@ if __name__ == '__main__':
         return 0;
     }
     """
-    print(f"DEBUG: [%{datetime.now().isoformat()}] --- Running STDIN/STDOUT Example (clang++) ---")
+    logger.debug("--- Running STDIN/STDOUT Example (clang++) ---")
     stdin_results_clang = run_cpp_code(stdin_code, stdin_data="Tester Clang", compiler="clang++")
     print(f"Compiler Used: {stdin_results_clang['compiler_used']}")
     print(f"Compilation Exit Code: {stdin_results_clang['compilation_exit_code']}")
@@ -255,7 +832,7 @@ if __name__ == '__main__':
         return 0;
     }
     """
-    print(f"DEBUG: [%{datetime.now().isoformat()}] --- Running Compilation Error Example (g++) ---")
+    logger.debug("--- Running Compilation Error Example (g++) ---")
     compile_error_results_gpp = run_cpp_code(compile_error_code, compiler="g++")
     print(f"Compiler Used: {compile_error_results_gpp['compiler_used']}")
     print(f"Compilation STDERR:\n{compile_error_results_gpp['compilation_stderr']}") # Should show g++ error
@@ -273,7 +850,7 @@ if __name__ == '__main__':
         return 0;
     }
     """
-    print(f"DEBUG: [%{datetime.now().isoformat()}] --- Running Execution Timeout Example (g++) ---")
+    logger.debug("--- Running Execution Timeout Example (g++) ---")
     exec_timeout_results = run_cpp_code(exec_timeout_code, exec_timeout=2)
     print(f"Compiler Used: {exec_timeout_results['compiler_used']}")
     print(f"Compilation Exit Code: {exec_timeout_results['compilation_exit_code']}")
@@ -284,12 +861,9 @@ if __name__ == '__main__':
         print(f"Execution Timed Out: {exec_timeout_results['timed_out_execution']}") # Should be True
     print("-" * 30)
 
-    # 5. Compilation Timeout (using clang++, requires a very fast system or slow image pull to reliably trigger)
-    # The apt-get update/install part of the command might make this harder to hit unless Docker caches layers.
-    # For this example, let's assume a very small timeout.
-    print(f"DEBUG: [%{datetime.now().isoformat()}] --- Running Compilation Timeout Example (clang++) ---")
-    # Note: The 'apt-get update && apt-get install' can take time.
-    # If this times out, it might be before actual C++ compilation.
+    # 5. Compilation Timeout (using clang++, requires a very small timeout to reliably trigger)
+    # Building the sandbox image on first use is not counted against compile_timeout.
+    logger.debug("--- Running Compilation Timeout Example (clang++) ---")
     compile_timeout_results_clang = run_cpp_code(hello_world_code, compile_timeout=1, compiler="clang++") # Very small timeout
     print(f"Compiler Used: {compile_timeout_results_clang['compiler_used']}")
     print(f"Compilation STDERR:\n{compile_timeout_results_clang['compilation_stderr']}")
@@ -307,7 +881,7 @@ if __name__ == '__main__':
         return 0;
     }
     """
-    print(f"DEBUG: [%{datetime.now().isoformat()}] --- Running Runtime Error Example (g++) ---")
+    logger.debug("--- Running Runtime Error Example (g++) ---")
     runtime_error_results_gpp = run_cpp_code(runtime_error_code, compiler="g++")
     print(f"Compiler Used: {runtime_error_results_gpp['compiler_used']}")
     print(f"Compilation Exit Code: {runtime_error_results_gpp['compilation_exit_code']}")
@@ -318,7 +892,7 @@ if __name__ == '__main__':
     print("-" * 30)
 
     # 7. No input provided to code expecting input (using clang++)
-    print(f"DEBUG: [%{datetime.now().isoformat()}] --- Running No Input For Code Expecting Input (clang++) ---")
+    logger.debug("--- Running No Input For Code Expecting Input (clang++) ---")
     no_input_results_clang = run_cpp_code(stdin_code, stdin_data=None, exec_timeout=2, compiler="clang++")
     print(f"Compiler Used: {no_input_results_clang['compiler_used']}")
     print(f"Compilation Exit Code: {no_input_results_clang['compilation_exit_code']}")
@@ -335,5 +909,4 @@ if __name__ == '__main__':
     # print("If Docker is not installed or not in PATH, this test should indicate an error.")
     # print("Expected: compilation_stderr contains 'Docker command not found', compilation_exit_code is -1.")
     # print("-" * 30)
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Finished cpp_runner.py example usage.")
-```
+    logger.debug("Finished cpp_runner.py example usage.")
@@ -3,6 +3,9 @@ import tempfile
 import os
 import shutil
 import uuid
+import queue
+import threading
+import atexit
 from datetime import datetime
 import traceback
 
@@ -10,6 +13,36 @@ import traceback
 DEFAULT_CPU_LIMIT = "1.0"  # Number of CPUs
 DEFAULT_MEMORY_LIMIT = "256m"  # Amount of memory
 DEFAULT_GO_IMAGE = "golang:1.21-alpine" # Default Go image for Docker
+GO_BUILD_TIMEOUT = 300 # Seconds
+
+# Sandbox containers (`sleep infinity`) are kept running and reused: each job is built and run with
+# `docker exec` in an idle container instead of building, running and removing an image per call. The
+# containers keep Go's build cache, so the standard library is only compiled once per container.
+# Containers are pooled per (image, CPU limit, memory limit); up to GO_SANDBOX_POOL_SIZE idle ones are
+# kept for each. The root filesystem is read-only, so GOROOT can't be changed; the only writable places
+# are /sandbox, where main.go is written and built, /dev/shm, and the build cache, a root-only tmpfs.
+# The build runs as root, but the program runs as GO_SANDBOX_USER, so it can't touch the build cache,
+# and every process left by that user is killed after the run. Each job empties /sandbox and /dev/shm
+# first. A container whose program timed out is removed instead, since the program may still be running.
+GO_SANDBOX_PREFIX = "deepblue-go-sandbox"
+GO_SANDBOX_MOUNT = "/sandbox"
+GO_SANDBOX_TMPFS = f"{GO_SANDBOX_MOUNT}:rw,exec,size=64m,mode=1777"
+GO_SANDBOX_CACHE = "/gocache"
+GO_SANDBOX_CACHE_TMPFS = f"{GO_SANDBOX_CACHE}:rw,size=256m,mode=700"
+GO_SANDBOX_USER = "65534" # nobody
+GO_SANDBOX_POOL_SIZE = int(os.environ.get("DEEPBLUE_GO_SANDBOXES", "2"))
+GO_SANDBOX_START_TIMEOUT = 60 # Seconds
+GO_SANDBOX_CLEANUP_TIMEOUT = 30 # Seconds
+GO_SANDBOX_BUILD_SCRIPT = (
+    f"find {GO_SANDBOX_MOUNT} /dev/shm -mindepth 1 -delete && cat > main.go && go build -o main main.go"
+)
+# kill(-1) signals every process the caller may signal except itself and PID 1: here, everything the
+# program left behind. It fails with ESRCH when there is nothing left, which is not an error.
+GO_SANDBOX_KILL_SCRIPT = "kill -9 -1 2>/dev/null; exit 0"
+
+_idle_go_sandboxes = {} # (go_image, cpu_limit, memory_limit) -> queue.Queue of container names
+_go_sandboxes = set()
+_go_sandbox_lock = threading.Lock()
 
 def _execute_command_for_go(command_args, timeout_seconds=None, cwd=None, capture_output=True, text=True, **kwargs):
     # Helper to run a subprocess command, similar to the one in python_runner.
@@ -55,19 +88,114 @@ def _execute_command_for_go(command_args, timeout_seconds=None, cwd=None, captur
             stderr=f"An unexpected error occurred running command: {str(e)}"
         ), False
 
+def _start_go_sandbox(go_image, cpu_limit, memory_limit):
+    """
+    Starts a sandbox container for Go jobs.
+
+    Returns:
+        A tuple (container_name, process_result); container_name is None if the container didn't start.
+    """
+    container_name = f"{GO_SANDBOX_PREFIX}-{uuid.uuid4().hex[:12]}"
+    start_command = [
+        "docker", "run", "-d", "--rm", "--init", "--network=none", "--read-only",
+        f"--cpus={cpu_limit}", f"--memory={memory_limit}",
+        "--tmpfs", GO_SANDBOX_TMPFS,
+        "--tmpfs", GO_SANDBOX_CACHE_TMPFS,
+        "-e", f"GOCACHE={GO_SANDBOX_CACHE}/build",
+        "-e", f"GOTMPDIR={GO_SANDBOX_CACHE}",
+        "-w", GO_SANDBOX_MOUNT,
+        "--name", container_name,
+        go_image,
+        "sleep", "infinity"
+    ]
+    print(f"DEBUG: [%{datetime.now().isoformat()}] Starting Go sandbox container with command: {' '.join(start_command)}")
+    start_result, start_timed_out = _execute_command_for_go(start_command, timeout_seconds=GO_SANDBOX_START_TIMEOUT)
+    if start_timed_out or start_result.returncode != 0:
+        _remove_go_sandbox(container_name)
+        return None, start_result
+    with _go_sandbox_lock:
+        _go_sandboxes.add(container_name)
+    return container_name, start_result
+
+def _checkout_go_sandbox(pool_key):
+    """
+    Takes an idle sandbox container for pool_key, or starts a new one.
+
+    Returns:
+        A tuple (container_name, process_result); process_result is None when an idle container was reused.
+    """
+    with _go_sandbox_lock:
+        idle = _idle_go_sandboxes.setdefault(pool_key, queue.Queue())
+    try:
+        return idle.get_nowait(), None
+    except queue.Empty:
+        return _start_go_sandbox(*pool_key)
+
+def _return_go_sandbox(pool_key, container_name):
+    with _go_sandbox_lock:
+        idle = _idle_go_sandboxes.setdefault(pool_key, queue.Queue())
+        keep = idle.qsize() < GO_SANDBOX_POOL_SIZE
+        if keep:
+            idle.put(container_name)
+    if not keep:
+        _discard_go_sandbox(container_name)
+
+def _discard_go_sandbox(container_name):
+    with _go_sandbox_lock:
+        _go_sandboxes.discard(container_name)
+    _remove_go_sandbox(container_name)
+
+def _remove_go_sandbox(container_name):
+    print(f"DEBUG: [%{datetime.now().isoformat()}] Removing Go sandbox container {container_name}.")
+    rm_result, _ = _execute_command_for_go(["docker", "rm", "-f", container_name], timeout_seconds=GO_SANDBOX_CLEANUP_TIMEOUT)
+    if rm_result.returncode != 0:
+        print(f"DEBUG: [%{datetime.now().isoformat()}] Warning: Failed to remove Go sandbox container {container_name}. STDERR: {rm_result.stderr}")
+
+def _kill_go_sandbox_processes(container_name):
+    """
+    Kills every process run as GO_SANDBOX_USER in the container, such as children the program put in
+    the background, so none of them survives into the next job.
+
+    Returns:
+        True if the container can be reused.
+    """
+    kill_command = ["docker", "exec", "-u", GO_SANDBOX_USER, container_name, "sh", "-c", GO_SANDBOX_KILL_SCRIPT]
+    kill_result, kill_timed_out = _execute_command_for_go(kill_command, timeout_seconds=GO_SANDBOX_CLEANUP_TIMEOUT)
+    if kill_timed_out or kill_result.returncode != 0:
+        print(f"DEBUG: [%{datetime.now().isoformat()}] Warning: Failed to kill leftover processes in Go sandbox container {container_name}. STDERR: {kill_result.stderr}")
+        return False
+    return True
+
+def _go_sandbox_lost(process_result):
+    # docker exec itself failed (the container is gone or broken) rather than the command inside it.
+    return process_result.returncode != 0 and "Error response from daemon" in (process_result.stderr or "")
+
+@atexit.register
+def _shutdown_go_sandboxes():
+    with _go_sandbox_lock:
+        containers = list(_go_sandboxes)
+        _go_sandboxes.clear()
+        _idle_go_sandboxes.clear()
+    for container_name in containers:
+        try:
+            subprocess.run(["docker", "rm", "-f", container_name], capture_output=True, timeout=30)
+        except (OSError, subprocess.SubprocessError):
+            pass
+
 def run_go_code(code: str, timeout: int = 60, 
                 go_image: str = DEFAULT_GO_IMAGE,
                 cpu_limit: str = DEFAULT_CPU_LIMIT, 
                 memory_limit: str = DEFAULT_MEMORY_LIMIT):
     """
-    Runs Go code in a sandboxed Docker environment.
+    Runs Go code in a sandboxed Docker environment: the code is built and run with `docker exec` in a
+    pooled sandbox container that is started on first use and reused across calls.
 
     Args:
         code: The Go code to execute.
         timeout: Maximum execution time in seconds.
         go_image: The base Docker image to use for Go execution.
-        cpu_limit: Docker CPU limit (e.g., "1.0" for 1 CPU).
-        memory_limit: Docker memory limit (e.g., "256m").
+        cpu_limit: Docker CPU limit (e.g., "1.0" for 1 CPU). Applies to building and running.
+        memory_limit: Docker memory limit (e.g., "256m"). Applies to building and running.
 
     Returns:
         A dictionary containing:
@@ -75,7 +203,7 @@ def run_go_code(code: str, timeout: int = 60,
             'stderr': Standard error from the code execution.
             'exit_code': Exit code of the script. 0 for success.
             'timed_out': Boolean, True if execution timed out.
-            'error': A high-level error message if setup or Docker interaction failed.
+            'error': A high-level error message if setup, the Go build or Docker interaction failed.
     """
     print(f"DEBUG: [%{datetime.now().isoformat()}] Entering run_go_code with code='{code[:100]}...', timeout={timeout}, go_image='{go_image}', cpu_limit='{cpu_limit}', memory_limit='{memory_limit}'")
     result = {
@@ -83,80 +211,56 @@ def run_go_code(code: str, timeout: int = 60,
         "timed_out": False, "error": None 
     }
     
-    exec_id = str(uuid.uuid4())
-    temp_dir = None
-    docker_image_tag = f"go-exec-{exec_id}"
-    image_built = False
+    pool_key = (go_image, cpu_limit, memory_limit)
+    container_name = None
+    keep_container = False
 
     try:
-        temp_dir = tempfile.mkdtemp(prefix=f"gorunner_{exec_id}_")
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Created temporary directory: {temp_dir}")
-        
-        main_go_path = os.path.join(temp_dir, "main.go")
-        with open(main_go_path, "w", encoding="utf-8") as f:
-            f.write(code)
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Go code written to {main_go_path}")
-
-        # For simplicity, this initial version does not explicitly handle 'go.mod' or external packages.
-        # It assumes single-file Go programs or programs where dependencies are fetched by Go commands (e.g. go run .)
-        # A more advanced version might need to parse imports and run 'go get'.
-        
-        dockerfile_content = f"""
-FROM {go_image}
-WORKDIR /app
-COPY main.go .
-# Attempt to fetch dependencies if any are specified in the code via go.mod implicitly or explicitly
-# For single file, 'go run' handles some cases. For complex projects, go.mod would be needed.
-# This RUN command might fail if main.go has unresolvable imports and no go.mod,
-# but it's a common pattern for simple Go Dockerfiles.
-# RUN go mod init tempmod && go mod tidy 
-# Or, if assuming simple scripts, just build/run directly.
-# Let's try building first, then running the binary. This is generally safer.
-RUN go build -o /app/main main.go
-CMD ["/app/main"]
-"""
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Dockerfile content (first 200 chars): {dockerfile_content[:200]}...")
-        with open(os.path.join(temp_dir, "Dockerfile"), "w", encoding="utf-8") as f:
-            f.write(dockerfile_content)
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Dockerfile written to {os.path.join(temp_dir, 'Dockerfile')}")
-
-        # 1. Build the Docker image
-        build_command = ["docker", "build", "-t", docker_image_tag, "-f", os.path.join(temp_dir, "Dockerfile"), temp_dir]
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Building Go Docker image {docker_image_tag} with command: {' '.join(build_command)}")
+        container_name, start_result = _checkout_go_sandbox(pool_key)
+        if container_name is None:
+            result['error'] = "Failed to start Go sandbox container."
+            result['stderr'] = start_result.stderr
+            result['exit_code'] = start_result.returncode
+            print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_go_code (sandbox start failed) with result: {result}")
+            return result
+        print(f"DEBUG: [%{datetime.now().isoformat()}] Using Go sandbox container {container_name}.")
+
+        # 1. Build: the code goes in on stdin, replacing the previous job's files.
+        # For simplicity, this does not handle 'go.mod' or external packages; single-file programs only.
+        build_command = ["docker", "exec", "-i", container_name, "sh", "-c", GO_SANDBOX_BUILD_SCRIPT]
+        print(f"DEBUG: [%{datetime.now().isoformat()}] Building Go code with command: {' '.join(build_command)}")
         
-        build_process_result, build_timed_out = _execute_command_for_go(build_command, timeout_seconds=300) # Build timeout
+        build_process_result, build_timed_out = _execute_command_for_go(build_command, timeout_seconds=GO_BUILD_TIMEOUT, input=code)
 
         if build_timed_out:
-            result['error'] = "Docker image build for Go timed out."
+            result['error'] = "Go build timed out."
             result['stderr'] = build_process_result.stderr
             result['timed_out'] = True
             print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_go_code (build timeout) with result: {result}")
             return result
         
         if build_process_result.returncode != 0:
-            result['error'] = "Docker image build for Go failed."
+            result['error'] = "Go build failed."
             result['stderr'] = f"Build STDOUT:\n{build_process_result.stdout}\n\nBuild STDERR:\n{build_process_result.stderr}"
             result['exit_code'] = build_process_result.returncode
+            keep_container = not _go_sandbox_lost(build_process_result)
             print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_go_code (build failed) with result: {result}")
             return result
         
-        image_built = True
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Go Docker image {docker_image_tag} built successfully.")
-
-        # 2. Run the Docker container
-        run_command = [
-            "docker", "run", "--rm", "--network=none",
-            f"--cpus={cpu_limit}", f"--memory={memory_limit}",
-            docker_image_tag
-        ]
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Running Go Docker container with command: {' '.join(run_command)} (timeout: {timeout}s)")
+        print(f"DEBUG: [%{datetime.now().isoformat()}] Go code built successfully in {container_name}.")
+
+        # 2. Run the binary as the unprivileged user
+        run_command = ["docker", "exec", "-u", GO_SANDBOX_USER, container_name, "./main"]
+        print(f"DEBUG: [%{datetime.now().isoformat()}] Running Go program with command: {' '.join(run_command)} (timeout: {timeout}s)")
         
-        run_process_result, run_timed_out = _execute_command_for_go(run_command, timeout_seconds=timeout)
+        run_process_result, run_timed_out = _execute_command_for_go(run_command, timeout_seconds=timeout, stdin=subprocess.DEVNULL)
 
         result['timed_out'] = run_timed_out
         result['stdout'] = run_process_result.stdout
         result['stderr'] = run_process_result.stderr
         result['exit_code'] = run_process_result.returncode
+        keep_container = (not run_timed_out and not _go_sandbox_lost(run_process_result)
+                          and _kill_go_sandbox_processes(container_name))
         
         if run_timed_out:
             result['stderr'] = (str(result['stderr']) + f"\nExecution timed out after {timeout} seconds.").lstrip()
@@ -169,22 +273,11 @@ CMD ["/app/main"]
         if not result['stderr']: 
             result['stderr'] = str(e)
     finally:
-        if image_built:
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Attempting to remove Go Docker image {docker_image_tag}...")
-            rmi_command = ["docker", "rmi", "-f", docker_image_tag]
-            rmi_result, _ = _execute_command_for_go(rmi_command, timeout_seconds=30)
-            if rmi_result.returncode != 0:
-                print(f"DEBUG: [%{datetime.now().isoformat()}] Warning: Failed to remove Go Docker image {docker_image_tag}. STDERR: {rmi_result.stderr}")
+        if container_name is not None:
+            if keep_container:
+                _return_go_sandbox(pool_key, container_name)
             else:
-                print(f"DEBUG: [%{datetime.now().isoformat()}] Successfully removed Go Docker image {docker_image_tag}.")
-        
-        if temp_dir and os.path.exists(temp_dir):
-            try:
-                print(f"DEBUG: [%{datetime.now().isoformat()}] Attempting to remove temporary directory {temp_dir}...")
-                shutil.rmtree(temp_dir)
-                print(f"DEBUG: [%{datetime.now().isoformat()}] Successfully removed temporary directory {temp_dir}.")
-            except Exception as e:
-                print(f"DEBUG: [%{datetime.now().isoformat()}] Warning: Failed to remove temporary directory {temp_dir}: {str(e)}")
+                _discard_go_sandbox(container_name)
     print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting run_go_code with result: {result}")
     return result
 
@@ -29,6 +29,7 @@
 from typing import Union, Dict, Any # For type hinting
 from datetime import datetime
 import traceback
+import os
 
 # Attempt to import FastMCP and Context, and install if missing
 try:
@@ -74,7 +75,7 @@ mcp_app = FastMCP(
 )
 
 @mcp_app.tool()
-def capture_webpage(ctx: Context, url: str, width: int = 1280, height: int = 720) -> Union[Image, Dict[str, str]]:
+def capture_webpage(ctx: Context, url: str, width: int = 1280, height: int = 720, image_format: str = "jpeg") -> Union[Image, Dict[str, str]]:
     """
     Captures a screenshot of a given webpage URL using a headless Chrome browser.
 
@@ -86,25 +87,27 @@ def capture_webpage(ctx: Context, url: str, width: int = 1280, height: int = 720
         url: The URL of the webpage to capture.
         width: The viewport width for the headless browser. Defaults to 1280.
         height: The viewport height for the headless browser. Defaults to 720.
+        image_format: "jpeg" (default, much smaller) or "png" (lossless).
 
     Returns:
-        An MCP Image object containing the PNG screenshot data on success.
+        An MCP Image object containing the screenshot data on success.
         On failure, returns a dictionary with "error" and "message" keys detailing the issue.
-        Example successful return: Image(data=b'png_bytes', format='png')
+        Example successful return: Image(data=b'jpeg_bytes', format='jpeg')
         Example error return: {"error": "ScreenshotFailed", "message": "Details of the failure..."}
     """
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Entering capture_webpage tool with url='{url}', width={width}, height={height}")
+    print(f"DEBUG: [%{datetime.now().isoformat()}] Entering capture_webpage tool with url='{url}', width={width}, height={height}, image_format={image_format}")
     ctx.info(f"Attempting to capture webpage. URL: '{url}', Width: {width}, Height: {height}")
 
     # Default page_load_timeout_sec from take_screenshot is 30 seconds.
     # This can be exposed as another MCP tool parameter if needed.
-    screenshot_result = take_screenshot(url=url, width=width, height=height)
-    print(f"DEBUG: [%{datetime.now().isoformat()}] take_screenshot returned: {screenshot_result}")
+    screenshot_result = take_screenshot(url=url, width=width, height=height, image_format=image_format)
+    # Leave out the image bytes: their repr is as large as the image.
+    print(f"DEBUG: [%{datetime.now().isoformat()}] take_screenshot returned keys={list(screenshot_result)}, image_bytes={len(screenshot_result.get('image_data') or b'')}, error={screenshot_result.get('error')}")
 
     if screenshot_result.get("image_data"):
         ctx.info(f"Screenshot successful for '{url}'. Page Title: '{screenshot_result.get('page_title', 'N/A')}', Actual URL: '{screenshot_result.get('actual_url', 'N/A')}'")
         print(f"DEBUG: [%{datetime.now().isoformat()}] capture_webpage returning Image object.")
-        return Image(data=screenshot_result["image_data"], format=screenshot_result["image_format"]) # image_format is "png"
+        return Image(data=screenshot_result["image_data"], format=screenshot_result["image_format"]) # "jpeg" or "png"
     else:
         error_message = screenshot_result.get("error", "Unknown error during screenshot.")
         docker_error_detail = screenshot_result.get("docker_error", "")
@@ -123,7 +126,11 @@ if __name__ == "__main__":
     print("Ensure Docker is running and accessible.")
     
     try:
-        mcp_app.run() # Default host="127.0.0.1", port=8000
+        # MCP_SERVER_TRANSPORT/MCP_SERVER_PORT are set when this server is started as a long-running
+        # HTTP server (see adk_code_assistant.start_local_mcp_http_servers). Stdio is the default.
+        if "MCP_SERVER_PORT" in os.environ:
+            mcp_app.settings.port = int(os.environ["MCP_SERVER_PORT"])
+        mcp_app.run(transport=os.environ.get("MCP_SERVER_TRANSPORT", "stdio"))
     except ImportError as e:
         print(f"DEBUG: [%{datetime.now().isoformat()}] ImportError during server run: {e}")
         if "uvicorn" in str(e).lower():
@@ -136,5 +143,3 @@ if __name__ == "__main__":
         formatted_traceback = traceback.format_exc()
         print(f"DEBUG: [%{datetime.now().isoformat()}] An unexpected exception occurred during server run: {e}\nTraceback:\n{formatted_traceback}")
         print(f"An unexpected error occurred while trying to run the server: {e}")
-
-```
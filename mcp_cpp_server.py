@@ -22,6 +22,7 @@
 from typing import Union, Dict, Any # For type hinting
 from datetime import datetime
 import traceback
+import os
 
 # Attempt to import FastMCP and Context, and install if missing
 try:
@@ -67,15 +68,15 @@ mcp_app = FastMCP(
 )
 
 @mcp_app.tool()
-def execute_cpp(ctx: Context, cpp_code: str, stdin_text: Union[str, None] = None, compiler_choice: Union[str, None] = "g++") -> Dict[str, Any]:
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Entering execute_cpp tool with cpp_code (first 100 chars)='{cpp_code[:100]}...', stdin_text='{stdin_text}', compiler_choice='{compiler_choice}'")
+def execute_cpp(ctx: Context, cpp_code: str, stdin_text: Union[str, None] = None, compiler_choice: Union[str, None] = "g++", optimize: bool = False) -> Dict[str, Any]:
+    print(f"DEBUG: [%{datetime.now().isoformat()}] Entering execute_cpp tool with cpp_code (first 100 chars)='{cpp_code[:100]}...', stdin_text='{stdin_text}', compiler_choice='{compiler_choice}', optimize={optimize}")
     """
     Compiles and executes a given snippet of C++ code in a sandboxed Docker environment,
     allowing selection between g++ and clang++.
 
-    The C++ code is compiled using the chosen compiler (e.g., -std=c++17) and run.
-    Only the C++ Standard Library is typically available, limited by the Docker image used
-    in `cpp_runner.py` (ubuntu:22.04, which has g++ and clang installed by the script).
+    The C++ code is compiled using the chosen compiler (-std=c++17, unoptimized unless
+    `optimize` is set) and run. Only the C++ Standard Library is typically available, limited
+    by the sandbox image used in `cpp_runner.py` (ubuntu:22.04 with g++ and clang preinstalled).
 
     Args:
         ctx: The MCP Context object, used for logging.
@@ -84,6 +85,8 @@ def execute_cpp(ctx: Context, cpp_code: str, stdin_text: Union[str, None] = None
         compiler_choice: Optional. The C++ compiler to use. Supported values are "g++"
                          (default) and "clang++". If None or an empty string is provided,
                          it defaults to "g++".
+        optimize: Optional. Compile with -O2 instead of -O0. Only worth it for CPU-heavy
+                  programs; it makes compilation several times slower.
 
     Returns:
         A dictionary containing detailed results from the compilation and execution phases,
@@ -112,7 +115,8 @@ def execute_cpp(ctx: Context, cpp_code: str, stdin_text: Union[str, None] = None
     result = run_cpp_code(
         cpp_code=cpp_code,
         stdin_data=stdin_text,
-        compiler=selected_compiler
+        compiler=selected_compiler,
+        optimize=optimize
     )
     print(f"DEBUG: [%{datetime.now().isoformat()}] run_cpp_code returned: {result}")
 
@@ -135,7 +139,11 @@ if __name__ == "__main__":
     # The mcp_app.run() method typically starts a Uvicorn server for development.
     # Ensure 'uvicorn' and 'fastapi' are installed as dependencies of 'mcp[cli]'.
     try:
-        mcp_app.run() # Default host="127.0.0.1", port=8000
+        # MCP_SERVER_TRANSPORT/MCP_SERVER_PORT are set when this server is started as a long-running
+        # HTTP server (see adk_code_assistant.start_local_mcp_http_servers). Stdio is the default.
+        if "MCP_SERVER_PORT" in os.environ:
+            mcp_app.settings.port = int(os.environ["MCP_SERVER_PORT"])
+        mcp_app.run(transport=os.environ.get("MCP_SERVER_TRANSPORT", "stdio"))
     except ImportError as e:
         print(f"DEBUG: [%{datetime.now().isoformat()}] ImportError during server run: {e}")
         if "uvicorn" in str(e).lower():
@@ -148,5 +156,3 @@ if __name__ == "__main__":
         formatted_traceback = traceback.format_exc()
         print(f"DEBUG: [%{datetime.now().isoformat()}] An unexpected exception occurred during server run: {e}\nTraceback:\n{formatted_traceback}")
         print(f"An unexpected error occurred while trying to run the server: {e}")
-
-```
@@ -1,6 +1,8 @@
 from typing import Union # For Python 3.9+ compatibility with str | None
 from datetime import datetime
 import traceback
+import os
+import logging
 
 # Attempt to import FastMCP and Context, and install if missing
 try:
@@ -23,7 +25,14 @@ except ImportError:
         sys.exit(1)
 
 # Potentially: from mcp.server.auth import AuthSettings #, OAuthServerProvider (though provider needs implementation)
-from bash_tool import run_bash_command
+from bash_tool import run_bash_command_async
+
+# Per-call debug output goes through logging, not stdout, and is only formatted when DEBUG is enabled.
+# BASH_TOOL_DEBUG=1 sends it to stderr, together with bash_tool's own trace.
+logger = logging.getLogger(__name__)
+if os.environ.get("BASH_TOOL_DEBUG", "0") == "1":
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.StreamHandler())
 
 # !!! SECURITY WARNING !!!
 # The following server exposes a tool (`execute_bash`) that can run arbitrary shell commands.
@@ -54,7 +63,7 @@ mcp_app = FastMCP(
 
 
 @mcp_app.tool()
-def execute_bash(ctx: Context, command: str, timeout: int = 60, working_directory: Union[str, None] = None) -> dict:
+async def execute_bash(ctx: Context, command: str, timeout: int = 60, working_directory: Union[str, None] = None) -> dict:
     """
     Executes a given bash command using the run_bash_command tool and returns its output.
 
@@ -84,22 +93,23 @@ def execute_bash(ctx: Context, command: str, timeout: int = 60, working_director
         - timed_out (bool): True if the command execution exceeded the 'timeout' value
                             and was terminated, False otherwise.
     """
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Entering execute_bash tool with command='{command}', timeout={timeout}, working_directory='{working_directory}'")
+    logger.debug("Entering execute_bash tool with command=%r, timeout=%s, working_directory=%r", command, timeout, working_directory)
     # Log the attempt to execute the command using the context.
     # Caller information might be available in ctx depending on MCP server setup and auth.
     # For now, we log the command details.
-    ctx.info(f"Attempting to execute bash command: {{'command': '{command}', 'timeout': {timeout}, 'working_directory': '{working_directory}'}}")
+    await ctx.info(f"Attempting to execute bash command: {{'command': '{command}', 'timeout': {timeout}, 'working_directory': '{working_directory}'}}")
 
-    # The run_bash_command function from bash_tool.py already handles
-    # working_directory=None by defaulting to the current working directory.
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Calling run_bash_command with command='{command}', timeout={timeout}, working_directory='{working_directory}'")
-    result = run_bash_command(command=command, timeout=timeout, working_directory=working_directory)
-    print(f"DEBUG: [%{datetime.now().isoformat()}] run_bash_command returned: {result}")
+    # The run_bash_command_async function from bash_tool.py already handles
+    # working_directory=None by defaulting to the current working directory. It awaits the
+    # subprocess instead of blocking, so other requests keep being served meanwhile.
+    logger.debug("Calling run_bash_command_async with command=%r, timeout=%s, working_directory=%r", command, timeout, working_directory)
+    result = await run_bash_command_async(command=command, timeout=timeout, working_directory=working_directory)
+    logger.debug("run_bash_command_async returned: %s", result)
 
     # Log the outcome
-    ctx.info(f"Command execution result: {{'exit_code': {result['exit_code']}, 'timed_out': {result['timed_out']}}}")
+    await ctx.info(f"Command execution result: {{'exit_code': {result['exit_code']}, 'timed_out': {result['timed_out']}}}")
 
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting execute_bash tool with result: {result}")
+    logger.debug("Exiting execute_bash tool with result: %s", result)
     return result
 
 # Main block to run the server
@@ -108,7 +118,11 @@ if __name__ == "__main__":
     # The mcp_app.run() method typically starts a Uvicorn server for development.
     # Ensure 'uvicorn' and 'fastapi' are installed as dependencies of 'mcp[cli]'.
     try:
-        mcp_app.run()
+        # MCP_SERVER_TRANSPORT/MCP_SERVER_PORT are set when this server is started as a long-running
+        # HTTP server (see adk_code_assistant.start_local_mcp_http_servers). Stdio is the default.
+        if "MCP_SERVER_PORT" in os.environ:
+            mcp_app.settings.port = int(os.environ["MCP_SERVER_PORT"])
+        mcp_app.run(transport=os.environ.get("MCP_SERVER_TRANSPORT", "stdio"))
     except ImportError as e:
         print(f"DEBUG: [%{datetime.now().isoformat()}] ImportError during server run: {e}")
         print(f"Error running server: {e}")
@@ -1,69 +1,156 @@
+import os
 import sys
-import base64
 import json
+import logging
 from playwright.sync_api import sync_playwright
-from datetime import datetime
 import traceback
 
+# Debug output goes to stderr (stdout carries the JSON results). logging stamps each record itself,
+# so call sites don't build timestamps.
+logger = logging.getLogger("playwright_helper")
+LOG_FORMAT = "%(asctime)s DEBUG %(message)s"
+
+SERVE_FLAG = "--serve"
+# First line printed in serve mode once the browser is up, so the parent can tell a worker that
+# failed to start from one that crashed on a particular page.
+READY_MESSAGE = {"ready": True}
+JPEG_QUALITY = 80
+
+def launch_browser(p):
+    """
+    Launches Chromium. If SCREENSHOT_HOST_RESOLVER_RULES is set (e.g. "MAP example.com 93.184.215.14"),
+    it is passed as --host-resolver-rules so those hosts are never looked up in DNS.
+    """
+    host_resolver_rules = os.environ.get("SCREENSHOT_HOST_RESOLVER_RULES")
+    args = [f"--host-resolver-rules={host_resolver_rules}"] if host_resolver_rules else []
+    logger.debug("Launching Chromium with args=%s", args)
+    return p.chromium.launch(args=args)
+
+def capture(browser, url: str, width: int, height: int, timeout_ms: int, output_path: str, image_format: str = "png") -> dict:
+    """
+    Takes one screenshot with an already launched browser, in a fresh context so jobs don't share state.
+
+    Args:
+        browser: A launched Playwright browser.
+        url: The URL to capture.
+        width: Viewport width.
+        height: Viewport height.
+        timeout_ms: Page load timeout in milliseconds.
+        output_path: Where to write the image (inside a directory mounted from the host).
+        image_format: "png" or "jpeg" (written at JPEG_QUALITY).
+
+    Returns:
+        A dict with "actual_url", "page_title" and "error"; only this small metadata goes to stdout.
+    """
+    results = {
+        "actual_url": None,
+        "page_title": None,
+        "error": None
+    }
+    context = None
+    try:
+        context = browser.new_context(
+            viewport={'width': width, 'height': height},
+            ignore_https_errors=True # Consider making this an option later
+        )
+        logger.debug("Browser context created. Viewport: {'width': %s, 'height': %s}, Ignore HTTPS errors: True", width, height)
+        page = context.new_page()
+        logger.debug("New page created.")
+        # Using 'load' state for more reliability than 'domcontentloaded' if external resources matter for screenshot
+        logger.debug("Navigating to URL: %s with timeout %sms, wait_until='load'", url, timeout_ms)
+        page.goto(url, timeout=timeout_ms, wait_until='load')
+        logger.debug("Page navigation successful.")
+
+        logger.debug("Taking screenshot.")
+        if image_format == "jpeg":
+            image_bytes = page.screenshot(type='jpeg', quality=JPEG_QUALITY, path=output_path)
+        else:
+            image_bytes = page.screenshot(type='png', path=output_path)
+        results["actual_url"] = page.url
+        results["page_title"] = page.title()
+        logger.debug("Screenshot written to %s. Image size: %s bytes. Actual URL: %s, Title: %s", output_path, len(image_bytes), results["actual_url"], results["page_title"])
+    except Exception as e:
+        formatted_traceback = traceback.format_exc()
+        logger.debug("Exception during Playwright operation: %s\nTraceback:\n%s", e, formatted_traceback)
+        results["error"] = f"Playwright error: {type(e).__name__} - {str(e)}"
+    finally:
+        if context is not None:
+            try:
+                context.close()
+            except Exception as e:
+                logger.debug("Failed to close browser context: %s", e)
+    return results
+
+def serve():
+    """
+    Worker mode: launches the browser once and prints READY_MESSAGE, then reads one JSON job per line on stdin
+    ({"url", "width", "height", "timeout_ms", "output_path", optional "image_format"}) and prints one JSON result line per job.
+    Exits when stdin is closed or the browser disconnects, so the parent can restart it.
+    """
+    logger.debug("playwright_helper.py serving jobs from stdin.")
+    with sync_playwright() as p:
+        browser = launch_browser(p)
+        logger.debug("Browser launched for worker.")
+        print(json.dumps(READY_MESSAGE), flush=True)
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+                results = capture(browser, job["url"], int(job["width"]), int(job["height"]), int(job["timeout_ms"]), job["output_path"], job.get("image_format", "png"))
+            except (ValueError, KeyError, TypeError) as e:
+                results = {"actual_url": None, "page_title": None, "error": f"Invalid job: {type(e).__name__} - {str(e)}"}
+            logger.debug("Worker returning results (to stdout): %s", results)
+            print(json.dumps(results), flush=True)
+            if not browser.is_connected():
+                logger.debug("Browser disconnected; worker exiting.")
+                return
+        browser.close()
+    logger.debug("stdin closed; worker exiting.")
+
 def main():
-    print(f"DEBUG: [%{datetime.now().isoformat()}] playwright_helper.py main() called with argv={sys.argv}", file=sys.stderr)
-    if len(sys.argv) != 5:
-        error_message = "Incorrect number of arguments. Expected URL, width, height, timeout_ms."
+    logging.basicConfig(stream=sys.stderr, level=logging.DEBUG, format=LOG_FORMAT)
+    logger.debug("playwright_helper.py main() called with argv=%s", sys.argv)
+    if sys.argv[1:] == [SERVE_FLAG]:
+        serve()
+        return
+
+    if len(sys.argv) != 7:
+        error_message = "Incorrect number of arguments. Expected URL, width, height, timeout_ms, output_path, image_format (or --serve)."
         results_for_error = {"error": error_message}
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Incorrect number of arguments. Preparing error JSON for stdout.", file=sys.stderr)
+        logger.debug("Incorrect number of arguments. Preparing error JSON for stdout.")
         print(json.dumps(results_for_error), file=sys.stdout) # This was printing to stderr before, but instruction implies error to stdout for caller
-        print(f"DEBUG: [%{datetime.now().isoformat()}] playwright_helper.py exiting due to incorrect arguments. Error: {error_message}", file=sys.stderr)
+        logger.debug("playwright_helper.py exiting due to incorrect arguments. Error: %s", error_message)
         sys.exit(1)
 
     url = sys.argv[1]
     width = int(sys.argv[2])
     height = int(sys.argv[3])
     timeout_ms = int(sys.argv[4])
-    print(f"DEBUG: [%{datetime.now().isoformat()}] Parsed arguments: url='{url}', width={width}, height={height}, timeout_ms={timeout_ms}", file=sys.stderr)
-    
-    results = {
-        "image_base64": None,
-        "actual_url": None,
-        "page_title": None,
-        "error": None
-    }
+    # The image is written to output_path (inside a directory mounted from the host); only small
+    # metadata JSON goes to stdout.
+    output_path = sys.argv[5]
+    image_format = sys.argv[6]
+    logger.debug("Parsed arguments: url='%s', width=%s, height=%s, timeout_ms=%s, output_path=%s, image_format=%s", url, width, height, timeout_ms, output_path, image_format)
 
     try:
         with sync_playwright() as p:
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Playwright context initialized.", file=sys.stderr)
+            logger.debug("Playwright context initialized.")
             # Using chromium.launch() which should use a bundled browser if Playwright was installed correctly in the image.
             # Add args=['--no-sandbox'] IF NEEDED due to Docker environment, but Playwright's official images often handle this.
-            browser = p.chromium.launch() 
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Browser launched. Options used: default (potentially add args if specified)", file=sys.stderr)
-            context = browser.new_context(
-                viewport={'width': width, 'height': height},
-                ignore_https_errors=True # Consider making this an option later
-            )
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Browser context created. Viewport: {{'width': {width}, 'height': {height}}}, Ignore HTTPS errors: True", file=sys.stderr)
-            page = context.new_page()
-            print(f"DEBUG: [%{datetime.now().isoformat()}] New page created.", file=sys.stderr)
-            # Using 'load' state for more reliability than 'domcontentloaded' if external resources matter for screenshot
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Navigating to URL: {url} with timeout {timeout_ms}ms, wait_until='load'", file=sys.stderr)
-            page.goto(url, timeout=timeout_ms, wait_until='load') 
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Page navigation successful. Actual URL: {page.url}, Title: {page.title()}", file=sys.stderr)
-            
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Taking screenshot.", file=sys.stderr)
-            image_bytes = page.screenshot(type='png')
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Screenshot taken. Image size: {len(image_bytes)} bytes.", file=sys.stderr)
-            results["image_base64"] = base64.b64encode(image_bytes).decode()
-            results["actual_url"] = page.url
-            results["page_title"] = page.title()
-            print(f"DEBUG: [%{datetime.now().isoformat()}] Closing browser.", file=sys.stderr)
+            browser = launch_browser(p)
+            logger.debug("Browser launched. Options used: default (potentially add args if specified)")
+            results = capture(browser, url, width, height, timeout_ms, output_path, image_format)
+            logger.debug("Closing browser.")
             browser.close()
     except Exception as e:
         formatted_traceback = traceback.format_exc()
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Exception during Playwright operation: {e}\nTraceback:\n{formatted_traceback}", file=sys.stderr)
-        results["error"] = f"Playwright error: {type(e).__name__} - {str(e)}"
-    
+        logger.debug("Exception during Playwright operation: %s\nTraceback:\n%s", e, formatted_traceback)
+        results = {"actual_url": None, "page_title": None, "error": f"Playwright error: {type(e).__name__} - {str(e)}"}
+
     # Print JSON result to stdout, so the calling process can capture it.
-    print(f"DEBUG: [%{datetime.now().isoformat()}] playwright_helper.py returning results (to stdout): {results}", file=sys.stderr)
+    logger.debug("playwright_helper.py returning results (to stdout): %s", results)
     print(json.dumps(results))
 
 if __name__ == '__main__':
     main()
-```
@@ -1,15 +1,24 @@
 import asyncio
+from contextlib import AsyncExitStack
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import patch, AsyncMock, call
+from pathlib import Path
+from types import SimpleNamespace
+import subprocess
+from unittest.mock import patch, AsyncMock, MagicMock, call
 
 # Assuming adk_code_assistant.py is in the same directory or accessible via PYTHONPATH
 try:
-    from adk_code_assistant import create_code_assistant_agent, LlmAgent
+    from adk_code_assistant import create_code_assistant_agent, close_code_assistant_agent, evict_mcp_server, LlmAgent
 except ImportError:
     import sys
     import os
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-    from adk_code_assistant import create_code_assistant_agent, LlmAgent
+    from adk_code_assistant import create_code_assistant_agent, close_code_assistant_agent, evict_mcp_server, LlmAgent
 
 
 class MockAdkTool:
@@ -35,17 +44,254 @@ class MockAdkTool:
 
 class TestCreateCodeAssistantAgent(unittest.IsolatedAsyncioTestCase):
 
-    # Default mock for os.environ.get to simulate GITHUB_TOKEN being set
-    MOCK_ENV_WITH_TOKEN = {"GITHUB_TOKEN": "test_token_123"}
-    MOCK_ENV_NO_TOKEN = {} # Simulates GITHUB_TOKEN not being set
+    # GITHUB_TOKEN is read once at import, so tests patch the module constant instead of os.environ
+    GITHUB_TOKEN = "test_token_123"
+
+    def setUp(self):
+        # Never touch the real Docker daemon from unit tests; default to the one-off `docker run` path.
+        container_patcher = patch('adk_code_assistant.ensure_github_mcp_container', return_value=False)
+        self.mock_ensure_github_container = container_patcher.start()
+        self.addCleanup(container_patcher.stop)
+        # Keep the on-disk MCP tool cache out of the user's home directory.
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        cache_patcher = patch('adk_code_assistant.MCP_TOOL_CACHE_PATH', Path(cache_dir.name) / "mcp_tools.json")
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
 
-    @patch('adk_code_assistant.os.environ', MOCK_ENV_WITH_TOKEN) 
+    async def asyncTearDown(self):
+        # The agent is cached per process; drop it so each test builds against its own mocks.
+        await close_code_assistant_agent()
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', GITHUB_TOKEN)
+    @patch('adk_code_assistant.MCPToolset.from_server')
+    async def test_github_server_execs_into_long_lived_container(self, mock_mcp_from_server):
+        print("\nRunning: test_github_server_execs_into_long_lived_container")
+        self.mock_ensure_github_container.return_value = True
+        mock_mcp_from_server.return_value = ([], AsyncMock())
+
+        await create_code_assistant_agent()
+
+        self.mock_ensure_github_container.assert_called_once_with("test_token_123")
+        docker_params = [c.kwargs['connection_params'] for c in mock_mcp_from_server.call_args_list
+                         if c.kwargs['connection_params'].command == 'docker']
+        self.assertEqual(len(docker_params), 1)
+        self.assertEqual(docker_params[0].args[:3], ['exec', '-i', 'deepblue-gh-mcp'])
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', None)
+    @patch('adk_code_assistant.MCPToolset.from_server')
+    async def test_agent_is_cached_between_calls(self, mock_mcp_from_server):
+        print("\nRunning: test_agent_is_cached_between_calls")
+        mock_mcp_from_server.return_value = ([MockAdkTool(name="execute_bash")], AsyncMock())
+
+        first_agent, first_stack = await create_code_assistant_agent()
+        calls_after_first_build = mock_mcp_from_server.call_count
+        second_agent, second_stack = await create_code_assistant_agent()
+
+        self.assertIs(first_agent, second_agent)
+        self.assertIs(first_stack, second_stack)
+        self.assertEqual(mock_mcp_from_server.call_count, calls_after_first_build) # No server respawned
+
+        await close_code_assistant_agent()
+        third_agent, _ = await create_code_assistant_agent()
+        self.assertIsNot(third_agent, first_agent)
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', None)
+    @patch('adk_code_assistant.MCPToolset.from_server')
+    async def test_refresh_rebuilds_cached_agent(self, mock_mcp_from_server):
+        print("\nRunning: test_refresh_rebuilds_cached_agent")
+        closed = []
+
+        def from_server_side_effect(*args, **kwargs):
+            async def record_close():
+                closed.append(kwargs['connection_params'].args[0])
+            kwargs['async_exit_stack'].push_async_callback(record_close)
+            return ([MockAdkTool(name="execute_bash")], kwargs['async_exit_stack'])
+
+        mock_mcp_from_server.side_effect = from_server_side_effect
+
+        first_agent, first_stack = await create_code_assistant_agent()
+        calls_after_first_build = mock_mcp_from_server.call_count
+        second_agent, second_stack = await create_code_assistant_agent(refresh=True)
+
+        self.assertIsNot(second_agent, first_agent)
+        self.assertIsNot(second_stack, first_stack)
+        self.assertEqual(len(closed), calls_after_first_build) # The old servers were shut down
+        self.assertEqual(mock_mcp_from_server.call_count, 2 * calls_after_first_build)
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', None)
+    @patch('adk_code_assistant.MCPToolset.from_server')
+    async def test_mcp_tool_calls_run_on_loop_thread(self, mock_mcp_from_server):
+        print("\nRunning: test_mcp_tool_calls_run_on_loop_thread")
+        import threading
+        call_threads = []
+        bash_tool = MockAdkTool(name="execute_bash")
+        bash_tool.run_async.side_effect = lambda **kwargs: call_threads.append(threading.current_thread()) or {"output": "ok"}
+        mock_mcp_from_server.return_value = ([bash_tool], AsyncMock())
+
+        agent, _ = await create_code_assistant_agent()
+        tool = next(t for t in agent.tools if t.name == "execute_bash")
+        results = await asyncio.gather(*(tool.run_async(args={"command": "true"}, tool_context=None) for _ in range(3)))
+
+        self.assertEqual(results, [{"output": "ok"}] * 3)
+        self.assertEqual(len(call_threads), 3)
+        self.assertTrue(all(t.name == "mcp-loop" for t in call_threads))
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', None)
+    @patch('adk_code_assistant.MCPToolset.from_server')
+    async def test_evict_mcp_server_closes_only_that_server(self, mock_mcp_from_server):
+        print("\nRunning: test_evict_mcp_server_closes_only_that_server")
+        closed_servers = []
+
+        def from_server_side_effect(*args, **kwargs):
+            script_name = kwargs['connection_params'].args[0]
+            async def record_close():
+                closed_servers.append(script_name)
+            kwargs['async_exit_stack'].push_async_callback(record_close)
+            return ([MockAdkTool(name=f"tool_from_{script_name}")], kwargs['async_exit_stack'])
+
+        mock_mcp_from_server.side_effect = from_server_side_effect
+
+        agent, _ = await create_code_assistant_agent()
+        self.assertTrue(await evict_mcp_server("mcp_chrome_server.py"))
+
+        self.assertEqual(closed_servers, ["mcp_chrome_server.py"])
+        tool_names = [t.name for t in agent.tools]
+        self.assertNotIn("tool_from_mcp_chrome_server.py", tool_names)
+        self.assertIn("tool_from_mcp_server.py", tool_names)
+        self.assertFalse(await evict_mcp_server("mcp_chrome_server.py")) # Already gone
+
+        await close_code_assistant_agent()
+        self.assertCountEqual(closed_servers, ["mcp_chrome_server.py", "mcp_server.py", "mcp_cpp_server.py", "mcp_langflow_critique_server.py"])
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', None)
+    @patch('adk_code_assistant.MCP_SERVER_CLOSE_TIMEOUT', 0.2)
+    @patch('adk_code_assistant.MCPToolset.from_server')
+    async def test_hung_server_does_not_block_shutdown(self, mock_mcp_from_server):
+        print("\nRunning: test_hung_server_does_not_block_shutdown")
+        closed_servers = []
+
+        def from_server_side_effect(*args, **kwargs):
+            script_name = kwargs['connection_params'].args[0]
+            async def close():
+                if script_name == "mcp_chrome_server.py":
+                    await asyncio.sleep(60) # Simulates a browser that never dies
+                closed_servers.append(script_name)
+            kwargs['async_exit_stack'].push_async_callback(close)
+            return ([MockAdkTool(name=f"tool_from_{script_name}")], kwargs['async_exit_stack'])
+
+        mock_mcp_from_server.side_effect = from_server_side_effect
+
+        await create_code_assistant_agent()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await close_code_assistant_agent()
+
+        self.assertLess(loop.time() - started, 5)
+        self.assertCountEqual(closed_servers, ["mcp_server.py", "mcp_cpp_server.py", "mcp_langflow_critique_server.py"])
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', None)
+    @patch('adk_code_assistant.MCP_INIT_TIMEOUT', 0.2)
+    @patch('adk_code_assistant.MCPToolset.from_server')
+    async def test_hung_server_startup_times_out_and_is_skipped(self, mock_mcp_from_server):
+        print("\nRunning: test_hung_server_startup_times_out_and_is_skipped")
+
+        async def from_server_side_effect(*args, **kwargs):
+            script_name = kwargs['connection_params'].args[0]
+            if script_name == "mcp_chrome_server.py":
+                await asyncio.sleep(60) # Simulates a server stuck launching Chrome
+            return ([MockAdkTool(name=f"tool_from_{script_name}")], kwargs['async_exit_stack'])
+
+        mock_mcp_from_server.side_effect = from_server_side_effect
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        agent, _ = await create_code_assistant_agent()
+
+        self.assertLess(loop.time() - started, 5)
+        tool_names = [t.name for t in agent.tools]
+        self.assertNotIn("tool_from_mcp_chrome_server.py", tool_names)
+        self.assertIn("tool_from_mcp_server.py", tool_names)
+        self.assertIn("tool_from_mcp_cpp_server.py", tool_names)
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', None)
+    @patch('adk_code_assistant.MCP_TOOL_CACHE_ENABLED', True)
+    @patch('adk_code_assistant.MCPToolset.from_server')
+    async def test_cached_tools_skip_discovery_and_connect_on_first_use(self, mock_mcp_from_server):
+        print("\nRunning: test_cached_tools_skip_discovery_and_connect_on_first_use")
+
+        def from_server_side_effect(*args, **kwargs):
+            script_name = kwargs['connection_params'].args[0]
+            tool = MockAdkTool(name=f"tool_from_{script_name}")
+            tool.mcp_tool = SimpleNamespace(inputSchema={"type": "object", "properties": {}})
+            return ([tool], kwargs['async_exit_stack'])
+
+        mock_mcp_from_server.side_effect = from_server_side_effect
+
+        await create_code_assistant_agent() # Cold start: discovers and caches every local server
+        self.assertEqual(mock_mcp_from_server.call_count, 4)
+        await close_code_assistant_agent()
+        mock_mcp_from_server.reset_mock()
+
+        agent, _ = await create_code_assistant_agent() # Warm start: no server is started
+        self.assertEqual(mock_mcp_from_server.call_count, 0)
+        cached_tool = next(t for t in agent.tools if t.name == "tool_from_mcp_cpp_server.py")
+
+        result = await cached_tool.run_async(args={"cpp_code": "int main(){}"}, tool_context=None)
+
+        self.assertEqual(result, {"output": "tool_from_mcp_cpp_server.py executed"})
+        self.assertEqual(mock_mcp_from_server.call_count, 1)
+        self.assertEqual(mock_mcp_from_server.call_args.kwargs['connection_params'].args[0], "mcp_cpp_server.py")
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', None)
+    @patch('adk_code_assistant.MCPToolset.from_server')
+    async def test_startup_is_reported_in_one_summary(self, mock_mcp_from_server):
+        print("\nRunning: test_startup_is_reported_in_one_summary")
+
+        def from_server_side_effect(*args, **kwargs):
+            script_name = kwargs['connection_params'].args[0]
+            if script_name == "mcp_chrome_server.py":
+                raise RuntimeError("Chrome failed to launch")
+            return ([MockAdkTool(name=f"tool_from_{script_name}")], kwargs['async_exit_stack'])
+
+        mock_mcp_from_server.side_effect = from_server_side_effect
+
+        with self.assertLogs('adk_code_assistant', level='INFO') as logs:
+            await create_code_assistant_agent()
+
+        summaries = [record for record in logs.records if record.getMessage().startswith("MCP startup summary:")]
+        self.assertEqual(len(summaries), 1)
+        summary = summaries[0].getMessage()
+        self.assertIn("[connected] mcp_server.py (bash execution): 1 tools", summary)
+        self.assertIn("[failed] mcp_chrome_server.py (webpage capture): 0 tools", summary)
+        self.assertIn("RuntimeError - Chrome failed to launch", summary)
+        self.assertIn("[skipped] github-mcp-server", summary)
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', None)
+    @patch('adk_code_assistant.MCP_TRANSPORT', "http")
+    @patch('adk_code_assistant.MCPToolset.from_server')
+    async def test_http_transport_uses_urls_for_fastmcp_servers(self, mock_mcp_from_server):
+        print("\nRunning: test_http_transport_uses_urls_for_fastmcp_servers")
+        import adk_code_assistant
+        if adk_code_assistant.HttpServerParams is None:
+            self.skipTest("This ADK version has no HTTP connection params.")
+        mock_mcp_from_server.return_value = ([], AsyncMock())
+
+        await create_code_assistant_agent()
+
+        params = [c.kwargs['connection_params'] for c in mock_mcp_from_server.call_args_list]
+        urls = [p.url for p in params if hasattr(p, 'url')]
+        self.assertIn(f"http://127.0.0.1:8000{adk_code_assistant.MCP_HTTP_PATH}", urls)
+        self.assertEqual(len(urls), 3) # Langflow critique server stays on stdio
+
+    @patch('adk_code_assistant.GITHUB_TOKEN', GITHUB_TOKEN) 
     @patch('adk_code_assistant.MCPToolset.from_server')
     async def test_successful_tool_loading_all_servers_including_github(self, mock_mcp_from_server):
         print("\nRunning: test_successful_tool_loading_all_servers_including_github")
         mock_bash_tools = [MockAdkTool(name="execute_bash")]
         mock_cpp_tools = [MockAdkTool(name="execute_cpp")]
         mock_chrome_tools = [MockAdkTool(name="capture_webpage")]
+        mock_critique_tools = [MockAdkTool(name="critique_code")]
         mock_github_tools = [MockAdkTool(name="github_get_file_content")]
         mock_exit_stack_instance = AsyncMock()
 
@@ -53,6 +299,7 @@ class TestCreateCodeAssistantAgent(unittest.IsolatedAsyncioTestCase):
             (mock_bash_tools, mock_exit_stack_instance),
             (mock_cpp_tools, mock_exit_stack_instance),
             (mock_chrome_tools, mock_exit_stack_instance),
+            (mock_critique_tools, mock_exit_stack_instance),
             (mock_github_tools, mock_exit_stack_instance)
         ]
 
@@ -62,26 +309,28 @@ class TestCreateCodeAssistantAgent(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(agent.name, 'code_assistant')
         self.assertIn("interact with GitHub", agent.instruction)
         
-        expected_tools = mock_bash_tools + mock_cpp_tools + mock_chrome_tools + mock_github_tools
-        self.assertEqual(len(agent.tools), len(expected_tools))
+        expected_tools = mock_bash_tools + mock_cpp_tools + mock_chrome_tools + mock_critique_tools + mock_github_tools
+        self.assertEqual(len(agent.tools), len(expected_tools) + 1) # Plus the local get_website_content RAG tool
         for tool in expected_tools:
             self.assertTrue(any(t.name == tool.name for t in agent.tools), f"Tool {tool.name} not found")
+        self.assertTrue(any(t.name == "get_website_content" for t in agent.tools))
 
-        self.assertEqual(mock_mcp_from_server.call_count, 4)
+        self.assertEqual(mock_mcp_from_server.call_count, 5)
         
         actual_call_args = mock_mcp_from_server.call_args_list
         self.assertEqual(actual_call_args[0][1]['connection_params'].args, ['mcp_server.py'])
         self.assertEqual(actual_call_args[1][1]['connection_params'].args, ['mcp_cpp_server.py'])
         self.assertEqual(actual_call_args[2][1]['connection_params'].args, ['mcp_chrome_server.py'])
+        self.assertEqual(actual_call_args[3][1]['connection_params'].args, ['mcp_langflow_critique_server.py'])
         
-        github_call_params = actual_call_args[3][1]['connection_params']
+        github_call_params = actual_call_args[4][1]['connection_params']
         self.assertEqual(github_call_params.command, 'docker')
         self.assertIn('ghcr.io/github/github-mcp-server', github_call_params.args)
         self.assertIn('GITHUB_PERSONAL_ACCESS_TOKEN', github_call_params.args) # Check env var name is passed to docker run
         self.assertEqual(github_call_params.env, {"GITHUB_PERSONAL_ACCESS_TOKEN": "test_token_123"}) # Check actual token value passed to env
-        self.assertEqual(exit_stack, mock_exit_stack_instance)
+        self.assertIsInstance(exit_stack, AsyncExitStack) # The agent's own stack, owning every server session
 
-    @patch('adk_code_assistant.os.environ', MOCK_ENV_NO_TOKEN) # Simulate GITHUB_TOKEN not set
+    @patch('adk_code_assistant.GITHUB_TOKEN', None) # Simulate GITHUB_TOKEN not set
     @patch('adk_code_assistant.MCPToolset.from_server')
     async def test_successful_tool_loading_no_github_token(self, mock_mcp_from_server):
         print("\nRunning: test_successful_tool_loading_no_github_token")
@@ -93,8 +342,9 @@ class TestCreateCodeAssistantAgent(unittest.IsolatedAsyncioTestCase):
         mock_mcp_from_server.side_effect = [
             (mock_bash_tools, mock_exit_stack_instance),
             (mock_cpp_tools, mock_exit_stack_instance),
-            (mock_chrome_tools, mock_exit_stack_instance)
-            # No 4th call expected for GitHub
+            (mock_chrome_tools, mock_exit_stack_instance),
+            ([], mock_exit_stack_instance) # Langflow critique server
+            # No 5th call expected for GitHub
         ]
 
         agent, _ = await create_code_assistant_agent()
@@ -103,12 +353,12 @@ class TestCreateCodeAssistantAgent(unittest.IsolatedAsyncioTestCase):
         self.assertIn("interact with GitHub", agent.instruction) # Instruction is updated regardless
         
         expected_tools = mock_bash_tools + mock_cpp_tools + mock_chrome_tools
-        self.assertEqual(len(agent.tools), len(expected_tools))
+        self.assertEqual(len(agent.tools), len(expected_tools) + 1) # Plus the get_website_content RAG tool
         self.assertFalse(any(t.name == "github_get_file_content" for t in agent.tools)) # No GitHub tools
-        self.assertEqual(mock_mcp_from_server.call_count, 3)
+        self.assertEqual(mock_mcp_from_server.call_count, 4)
 
 
-    @patch('adk_code_assistant.os.environ', MOCK_ENV_WITH_TOKEN)
+    @patch('adk_code_assistant.GITHUB_TOKEN', GITHUB_TOKEN)
     @patch('adk_code_assistant.MCPToolset.from_server')
     async def test_partial_loading_github_fails_returns_no_tools(self, mock_mcp_from_server):
         print("\nRunning: test_partial_loading_github_fails_returns_no_tools")
@@ -121,15 +371,16 @@ class TestCreateCodeAssistantAgent(unittest.IsolatedAsyncioTestCase):
             (mock_bash_tools, mock_exit_stack_instance),
             (mock_cpp_tools, mock_exit_stack_instance),
             (mock_chrome_tools, mock_exit_stack_instance),
+            ([], mock_exit_stack_instance), # Langflow critique server returns no tools
             ([], mock_exit_stack_instance) # GitHub server returns no tools
         ]
         agent, _ = await create_code_assistant_agent()
-        self.assertEqual(mock_mcp_from_server.call_count, 4) # Attempted to call all 4
+        self.assertEqual(mock_mcp_from_server.call_count, 5) # Attempted to call all 5
         expected_tools = mock_bash_tools + mock_cpp_tools + mock_chrome_tools
-        self.assertEqual(len(agent.tools), len(expected_tools)) # But only 3 sets of tools loaded
+        self.assertEqual(len(agent.tools), len(expected_tools) + 1) # But only 3 sets of MCP tools loaded, plus the RAG tool
         self.assertFalse(any(t.name.startswith("github_") for t in agent.tools))
 
-    @patch('adk_code_assistant.os.environ', MOCK_ENV_NO_TOKEN) 
+    @patch('adk_code_assistant.GITHUB_TOKEN', None) 
     @patch('adk_code_assistant.MCPToolset.from_server')
     async def test_no_tools_loaded_all_local_servers_fail_no_github(self, mock_mcp_from_server):
         print("\nRunning: test_no_tools_loaded_all_local_servers_fail_no_github")
@@ -137,23 +388,26 @@ class TestCreateCodeAssistantAgent(unittest.IsolatedAsyncioTestCase):
         mock_mcp_from_server.side_effect = [
             ([], mock_exit_stack_instance), 
             ([], mock_exit_stack_instance), 
+            ([], mock_exit_stack_instance),
             ([], mock_exit_stack_instance)
         ]
         agent, _ = await create_code_assistant_agent()
         self.assertIsInstance(agent, LlmAgent)
-        self.assertEqual(len(agent.tools), 0)
-        self.assertEqual(mock_mcp_from_server.call_count, 3) 
+        self.assertEqual([t.name for t in agent.tools], ["get_website_content"]) # Only the local RAG tool
+        self.assertEqual(mock_mcp_from_server.call_count, 4) 
 
-    @patch('adk_code_assistant.os.environ', MOCK_ENV_NO_TOKEN) 
+    @patch('adk_code_assistant.GITHUB_TOKEN', None) 
     @patch('adk_code_assistant.MCPToolset.from_server')
     async def test_mcp_toolset_raises_file_not_found_for_local_server(self, mock_mcp_from_server):
         print("\nRunning: test_mcp_toolset_raises_file_not_found_for_local_server")
         mock_mcp_from_server.side_effect = FileNotFoundError("mcp_server.py script not found error")
-        with self.assertRaisesRegex(FileNotFoundError, "mcp_server.py script not found error"):
-            await create_code_assistant_agent()
-        mock_mcp_from_server.assert_called_once() 
+        # Servers are started concurrently and a failing server is skipped rather than aborting startup.
+        agent, _ = await create_code_assistant_agent()
+        self.assertIsInstance(agent, LlmAgent)
+        self.assertFalse(any(t.name == "execute_bash" for t in agent.tools))
+        self.assertEqual(mock_mcp_from_server.call_count, 4) # Every local server was still attempted
 
-    @patch('adk_code_assistant.os.environ', MOCK_ENV_WITH_TOKEN)
+    @patch('adk_code_assistant.GITHUB_TOKEN', GITHUB_TOKEN)
     @patch('adk_code_assistant.MCPToolset.from_server')
     async def test_mcp_toolset_raises_file_not_found_for_docker_command(self, mock_mcp_from_server):
         print("\nRunning: test_mcp_toolset_raises_file_not_found_for_docker_command")
@@ -182,14 +436,17 @@ class TestCreateCodeAssistantAgent(unittest.IsolatedAsyncioTestCase):
 
         mock_mcp_from_server.side_effect = custom_side_effect
         
-        with self.assertRaisesRegex(FileNotFoundError, "No such file or directory: 'docker'"):
-            await create_code_assistant_agent()
+        # A missing 'docker' binary only disables the GitHub tools; the local servers still load.
+        agent, _ = await create_code_assistant_agent()
         
-        # It should try local servers (3 calls), then the GitHub one (1 call) which fails
-        self.assertEqual(mock_mcp_from_server.call_count, 4)
+        # All local servers and the GitHub one are attempted concurrently
+        self.assertEqual(mock_mcp_from_server.call_count, 5)
+        for tool in mock_bash_tools + mock_cpp_tools + mock_chrome_tools:
+            self.assertTrue(any(t.name == tool.name for t in agent.tools), f"Tool {tool.name} not found")
+        self.assertFalse(any(t.name.startswith("github_") for t in agent.tools))
 
 
-    @patch('adk_code_assistant.os.environ', MOCK_ENV_WITH_TOKEN)
+    @patch('adk_code_assistant.GITHUB_TOKEN', GITHUB_TOKEN)
     @patch('adk_code_assistant.MCPToolset.from_server')
     async def test_mcp_toolset_github_server_raises_generic_exception(self, mock_mcp_from_server):
         print("\nRunning: test_mcp_toolset_github_server_raises_generic_exception")
@@ -220,13 +477,253 @@ class TestCreateCodeAssistantAgent(unittest.IsolatedAsyncioTestCase):
         # Instead, it should print an error and continue.
         agent, _ = await create_code_assistant_agent()
         
-        self.assertEqual(mock_mcp_from_server.call_count, 4) # All 4 attempted
-        # Agent should be created with tools from the other 3 servers
+        self.assertEqual(mock_mcp_from_server.call_count, 5) # All 5 attempted
+        # Agent should be created with tools from the other 3 servers, plus the RAG tool
         expected_tools = mock_bash_tools + mock_cpp_tools + mock_chrome_tools
-        self.assertEqual(len(agent.tools), len(expected_tools))
+        self.assertEqual(len(agent.tools), len(expected_tools) + 1)
         self.assertFalse(any(t.name.startswith("github_") for t in agent.tools))
 
 
+class TestStopLocalMcpHttpServers(unittest.TestCase):
+
+    def test_kills_servers_that_ignore_terminate(self):
+        print("\nRunning: test_kills_servers_that_ignore_terminate")
+        from adk_code_assistant import stop_local_mcp_http_servers
+        polite_server = MagicMock()
+        stuck_server = MagicMock()
+        stuck_server.wait.side_effect = [subprocess.TimeoutExpired("python3", 0.1), 0]
+
+        stop_local_mcp_http_servers([polite_server, stuck_server], timeout=0.1)
+
+        polite_server.terminate.assert_called_once()
+        polite_server.kill.assert_not_called()
+        stuck_server.terminate.assert_called_once()
+        stuck_server.kill.assert_called_once()
+
+
+class TestQueryWebsiteContentToolFunc(unittest.IsolatedAsyncioTestCase):
+
+    def test_tool_declaration_matches_tool_name(self):
+        from adk_code_assistant import WEB_RAG_TOOL, WEBSITE_QUERY_DEFAULT_K, WEBSITE_QUERY_MAX_K
+        declaration = WEB_RAG_TOOL._get_declaration()
+        self.assertEqual(WEB_RAG_TOOL.name, "get_website_content")
+        self.assertEqual(declaration.name, WEB_RAG_TOOL.name)
+        self.assertIn(f"{WEBSITE_QUERY_DEFAULT_K} by default, at most {WEBSITE_QUERY_MAX_K}", declaration.description)
+
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"})
+    @patch('web_retriever.get_vector_store_for_url', new_callable=AsyncMock, return_value=None)
+    async def test_malformed_input_is_rejected_before_fetching(self, mock_get_vector_store):
+        print("\nRunning: test_malformed_input_is_rejected_before_fetching")
+        from adk_code_assistant import get_website_content
+        for bad_input in ["no comma here", "https://example.com,", "ftp://example.com,query", "https://,query", "http://[abc,query"]:
+            result = await get_website_content(bad_input)
+            self.assertTrue(result.startswith("Error: Invalid input format"), bad_input)
+        mock_get_vector_store.assert_not_awaited()
+
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"})
+    @patch('web_retriever.get_vector_store_for_url', new_callable=AsyncMock, return_value=None)
+    async def test_url_and_query_are_trimmed(self, mock_get_vector_store):
+        print("\nRunning: test_url_and_query_are_trimmed")
+        from adk_code_assistant import get_website_content
+        await get_website_content("  https://example.com/docs , What, exactly, is this?  ")
+        mock_get_vector_store.assert_awaited_once_with("https://example.com/docs", "sk-test")
+
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"})
+    async def test_optional_k_is_parsed_and_clamped(self):
+        print("\nRunning: test_optional_k_is_parsed_and_clamped")
+        from adk_code_assistant import get_website_content
+        vector_store = MagicMock()
+        with patch('web_retriever.get_vector_store_for_url', new_callable=AsyncMock, return_value=vector_store), \
+             patch('web_retriever.embed_queries', new_callable=AsyncMock, return_value=[[1.0]]), \
+             patch('web_retriever.search_vector_store', new_callable=AsyncMock,
+                   return_value=[[SimpleNamespace(page_content="chunk")]]) as mock_search, \
+             patch('web_retriever.lookup_query_cache', return_value=None), \
+             patch('web_retriever.lookup_semantic_cache', return_value=None), \
+             patch('web_retriever.add_to_semantic_cache'):
+            for input_str, expected_k in [
+                ("https://example.com,What is this?", 3),
+                ("https://example.com,What is this?, 5", 5),
+                ("https://example.com,What is this?,50", 10),
+                ("https://example.com,What is this?,0", 1),
+            ]:
+                mock_search.reset_mock()
+                result = await get_website_content(input_str)
+                self.assertEqual(result, "Relevant Chunk 1:\nchunk\n---")
+                mock_search.assert_awaited_once_with(vector_store, [[1.0]], expected_k)
+
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"})
+    async def test_multiple_queries_share_one_embedding_call_and_one_search(self):
+        print("\nRunning: test_multiple_queries_share_one_embedding_call_and_one_search")
+        from adk_code_assistant import get_website_content
+        vector_store = MagicMock()
+        embeddings = [[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]]
+        with patch('web_retriever.get_vector_store_for_url', new_callable=AsyncMock, return_value=vector_store), \
+             patch('web_retriever.embed_queries', new_callable=AsyncMock, return_value=embeddings) as mock_embed, \
+             patch('web_retriever.search_vector_store', new_callable=AsyncMock,
+                   return_value=[[SimpleNamespace(page_content="install chunk")], []]) as mock_search, \
+             patch('web_retriever.lookup_query_cache', return_value=None), \
+             patch('web_retriever.lookup_semantic_cache', side_effect=[None, "cached answer", None]), \
+             patch('web_retriever.add_to_semantic_cache') as mock_add:
+            result = await get_website_content("https://example.com, Install? | Cached? |Missing? ,2")
+
+        mock_embed.assert_awaited_once_with(vector_store, ["Install?", "Cached?", "Missing?"])
+        mock_search.assert_awaited_once_with(vector_store, [embeddings[0], embeddings[2]], 2)
+        self.assertEqual(result, (
+            "Results for query 1: 'Install?'\nRelevant Chunk 1:\ninstall chunk\n---\n\n"
+            "Results for query 2: 'Cached?'\ncached answer\n\n"
+            "Results for query 3: 'Missing?'\nNo relevant documents found for your query in the website content."
+        ))
+        mock_add.assert_called_once_with(vector_store, "Install?", embeddings[0], 2, "Relevant Chunk 1:\ninstall chunk\n---")
+
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"})
+    async def test_several_urls_are_queried_concurrently_once_each(self):
+        print("\nRunning: test_several_urls_are_queried_concurrently_once_each")
+        from adk_code_assistant import get_website_content
+        stores = {"https://a.example.com": MagicMock(name="a"), "https://b.example.com": MagicMock(name="b")}
+        in_flight = 0
+        max_in_flight = 0
+
+        async def get_vector_store(url, api_key):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.02)
+            in_flight -= 1
+            return stores.get(url)
+
+        async def search(vector_store, embeddings, k):
+            return [[SimpleNamespace(page_content=f"{vector_store._mock_name} chunk {i}")] for i in range(len(embeddings))]
+
+        with patch('web_retriever.get_vector_store_for_url', side_effect=get_vector_store) as mock_get, \
+             patch('web_retriever.lookup_query_cache', return_value=None), \
+             patch('web_retriever.embed_queries', new_callable=AsyncMock,
+                   side_effect=lambda vector_store, queries: [[1.0]] * len(queries)) as mock_embed, \
+             patch('web_retriever.lookup_semantic_cache', return_value=None), \
+             patch('web_retriever.search_vector_store', side_effect=search), \
+             patch('web_retriever.add_to_semantic_cache'):
+            result = await get_website_content(
+                "https://a.example.com,First?\nhttps://b.example.com,Other?\nhttps://missing.example.com,Q\nhttps://a.example.com,Second?"
+            )
+
+        self.assertEqual(mock_get.call_count, 3) # a.example.com is looked up once for both of its lines
+        self.assertEqual(max_in_flight, 3)
+        mock_embed.assert_any_await(stores["https://a.example.com"], ["First?", "Second?"])
+        self.assertEqual(result, (
+            "Results for 'https://a.example.com':\nRelevant Chunk 1:\na chunk 0\n---\n\n"
+            "Results for 'https://b.example.com':\nRelevant Chunk 1:\nb chunk 0\n---\n\n"
+            "Results for 'https://missing.example.com':\nError: Could not create vector store for the URL "
+            "'https://missing.example.com'. Previous logs may have more details.\n\n"
+            "Results for 'https://a.example.com':\nRelevant Chunk 1:\na chunk 1\n---"
+        ))
+
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"})
+    async def test_repeated_query_is_not_embedded_again(self):
+        print("\nRunning: test_repeated_query_is_not_embedded_again")
+        from adk_code_assistant import get_website_content
+        vector_store = MagicMock()
+        with patch('web_retriever.get_vector_store_for_url', new_callable=AsyncMock, return_value=vector_store), \
+             patch('web_retriever.lookup_query_cache', side_effect=["cached answer", None]), \
+             patch('web_retriever.embed_queries', new_callable=AsyncMock, return_value=[[1.0]]) as mock_embed, \
+             patch('web_retriever.lookup_semantic_cache', return_value="similar answer"), \
+             patch('web_retriever.search_vector_store', new_callable=AsyncMock) as mock_search:
+            result = await get_website_content("https://example.com,Seen before?|Rephrased?")
+
+        mock_embed.assert_awaited_once_with(vector_store, ["Rephrased?"])
+        mock_search.assert_not_awaited()
+        self.assertEqual(result, (
+            "Results for query 1: 'Seen before?'\ncached answer\n\n"
+            "Results for query 2: 'Rephrased?'\nsimilar answer"
+        ))
+
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"})
+    @patch('adk_code_assistant._WEB_RAG_SEMAPHORE', new_callable=lambda: asyncio.Semaphore(2))
+    async def test_concurrent_calls_are_bounded(self, _):
+        print("\nRunning: test_concurrent_calls_are_bounded")
+        from adk_code_assistant import get_website_content
+        in_flight = 0
+        max_in_flight = 0
+
+        async def slow_get_vector_store(url, api_key):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.02)
+            in_flight -= 1
+            return None
+
+        with patch('web_retriever.get_vector_store_for_url', side_effect=slow_get_vector_store):
+            results = await asyncio.gather(*(
+                get_website_content(f"https://example.com/{i},query") for i in range(5)
+            ))
+
+        self.assertEqual(max_in_flight, 2)
+        self.assertTrue(all(result.startswith("Error: Could not create vector store") for result in results))
+
+
+class TestResolveAgentEntrypoint(unittest.TestCase):
+
+    def test_prefers_chat_and_skips_non_callables(self):
+        print("\nRunning: test_prefers_chat_and_skips_non_callables")
+        from adk_code_assistant import resolve_agent_entrypoint
+        agent = SimpleNamespace(chat="not callable", process=MagicMock(), process_utterance=MagicMock())
+        self.assertIs(resolve_agent_entrypoint(agent), agent.process)
+
+    def test_returns_none_without_entrypoint(self):
+        print("\nRunning: test_returns_none_without_entrypoint")
+        from adk_code_assistant import resolve_agent_entrypoint
+        self.assertIsNone(resolve_agent_entrypoint(SimpleNamespace(name="code_assistant")))
+
+
+class TestExtractResponseText(unittest.TestCase):
+
+    def test_supported_response_shapes(self):
+        print("\nRunning: test_supported_response_shapes")
+        from adk_code_assistant import extract_response_text
+        self.assertEqual(extract_response_text("plain reply"), "plain reply")
+        self.assertEqual(extract_response_text({"output": "dict reply"}), "dict reply")
+        self.assertEqual(extract_response_text(SimpleNamespace(text="attribute reply")), "attribute reply")
+        self.assertEqual(extract_response_text(SimpleNamespace(text=lambda: "method reply")), "method reply")
+
+    def test_unknown_shapes_are_stringified(self):
+        print("\nRunning: test_unknown_shapes_are_stringified")
+        from adk_code_assistant import extract_response_text
+        self.assertEqual(extract_response_text({"answer": 1}), "{'answer': 1}")
+        self.assertEqual(extract_response_text(42), "42")
+
+
+class TestReadUserInput(unittest.IsolatedAsyncioTestCase):
+
+    async def test_loop_keeps_running_while_waiting_for_input(self):
+        print("\nRunning: test_loop_keeps_running_while_waiting_for_input")
+        from adk_code_assistant import read_user_input
+        line_entered = threading.Event()
+        ticks = 0
+
+        async def background_task():
+            nonlocal ticks
+            while not line_entered.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        def slow_input(prompt):
+            time.sleep(0.1)
+            line_entered.set()
+            return "hello"
+
+        with patch('builtins.input', side_effect=slow_input):
+            line, _ = await asyncio.gather(read_user_input("You: "), background_task())
+
+        self.assertEqual(line, "hello")
+        self.assertGreater(ticks, 1)
+
+    async def test_input_errors_propagate(self):
+        print("\nRunning: test_input_errors_propagate")
+        from adk_code_assistant import read_user_input
+        with patch('builtins.input', side_effect=EOFError):
+            with self.assertRaises(EOFError):
+                await read_user_input("You: ")
+
+
 class TestAdkCodeAssistantIntegration(unittest.IsolatedAsyncioTestCase):
 
     async def asyncSetUp(self):
@@ -239,10 +736,20 @@ class TestAdkCodeAssistantIntegration(unittest.IsolatedAsyncioTestCase):
         self.mock_chrome_tool_instance = MockAdkTool(name="capture_webpage")
         # Example GitHub tool name, actual names depend on github-mcp-server
         self.mock_github_tool_instance = MockAdkTool(name="github_get_file_contents") 
-
-        # Patch os.environ to simulate GITHUB_TOKEN being present for these integration tests
-        self.env_patcher = patch('adk_code_assistant.os.environ', TestCreateCodeAssistantAgent.MOCK_ENV_WITH_TOKEN)
-        self.mock_environ = self.env_patcher.start()
+        # The agent routes each MCP tool's run_async through the MCP loop thread; keep the mocks it forwards to
+        self.mock_bash_run_async = self.mock_bash_tool_instance.run_async
+        self.mock_cpp_run_async = self.mock_cpp_tool_instance.run_async
+        self.mock_chrome_run_async = self.mock_chrome_tool_instance.run_async
+        self.mock_github_run_async = self.mock_github_tool_instance.run_async
+
+        # Patch GITHUB_TOKEN to simulate it being present for these integration tests
+        self.env_patcher = patch('adk_code_assistant.GITHUB_TOKEN', TestCreateCodeAssistantAgent.GITHUB_TOKEN)
+        self.env_patcher.start()
+        # Use the one-off `docker run` path and no on-disk tool cache, as in the unit tests above
+        self.container_patcher = patch('adk_code_assistant.ensure_github_mcp_container', return_value=False)
+        self.container_patcher.start()
+        self.tool_cache_patcher = patch('adk_code_assistant.MCP_TOOL_CACHE_ENABLED', False)
+        self.tool_cache_patcher.start()
 
         self.mcp_patcher = patch('adk_code_assistant.MCPToolset.from_server')
         mock_mcp_from_server = self.mcp_patcher.start()
@@ -251,69 +758,158 @@ class TestAdkCodeAssistantIntegration(unittest.IsolatedAsyncioTestCase):
             ([self.mock_bash_tool_instance], self.mock_exit_stack_instance),
             ([self.mock_cpp_tool_instance], self.mock_exit_stack_instance),
             ([self.mock_chrome_tool_instance], self.mock_exit_stack_instance),
+            ([], self.mock_exit_stack_instance), # Langflow critique server
             ([self.mock_github_tool_instance], self.mock_exit_stack_instance) # For GitHub
         ]
         
         self.agent, self.exit_stack = await create_code_assistant_agent()
         self.assertIsNotNone(self.agent, "Agent creation failed in setUp")
+        self.tools_map = {tool.name: tool for tool in self.agent.tools}
         
-        # Expect 4 tools now (bash, cpp, chrome, github)
-        self.assertEqual(len(self.agent.tools), 4, 
-                        f"Agent should have 4 tools for these integration tests, got {len(self.agent.tools)}. Tools: {[t.name for t in self.agent.tools]}") # Escaped braces for subtask f-string
+        # Expect 5 tools now (bash, cpp, chrome, github, plus the get_website_content RAG tool)
+        self.assertEqual(len(self.agent.tools), 5, 
+                        f"Agent should have 5 tools for these integration tests, got {len(self.agent.tools)}. Tools: {[t.name for t in self.agent.tools]}") # Escaped braces for subtask f-string
         
         self.mock_exit_stack_instance.aclose.reset_mock()
 
     async def asyncTearDown(self):
         """Clean up after each test."""
         print("Tearing down after an Integration Test...")
-        if self.exit_stack:
-            await self.exit_stack.aclose()
+        await close_code_assistant_agent()
         self.mcp_patcher.stop() 
-        self.env_patcher.stop() 
+        self.env_patcher.stop()
+        self.container_patcher.stop()
+        self.tool_cache_patcher.stop() 
 
     async def test_bash_tool_integration_direct_call(self):
         print("\nRunning: test_bash_tool_integration_direct_call")
-        bash_tool = self.agent.tools_map.get("execute_bash")
+        bash_tool = self.tools_map.get("execute_bash")
         self.assertIsNotNone(bash_tool, "execute_bash tool not found")
-        self.assertEqual(bash_tool.run_async, self.mock_bash_tool_instance.run_async)
+        self.assertIs(bash_tool, self.mock_bash_tool_instance)
         test_args = {"command": "ls -l", "timeout": 30} # Escaped braces
         await bash_tool.run_async(args=test_args, tool_context=None)
-        self.mock_bash_tool_instance.run_async.assert_called_once_with(args=test_args, tool_context=None)
+        self.mock_bash_run_async.assert_called_once_with(args=test_args, tool_context=None)
 
     async def test_cpp_tool_integration_direct_call(self):
         print("\nRunning: test_cpp_tool_integration_direct_call")
-        cpp_tool = self.agent.tools_map.get("execute_cpp")
+        cpp_tool = self.tools_map.get("execute_cpp")
         self.assertIsNotNone(cpp_tool, "execute_cpp tool not found")
-        self.assertEqual(cpp_tool.run_async, self.mock_cpp_tool_instance.run_async)
+        self.assertIs(cpp_tool, self.mock_cpp_tool_instance)
         test_args = {"cpp_code": "int main() {return 0;}", "stdin_text": ""} # Escaped braces
         await cpp_tool.run_async(args=test_args, tool_context=None)
-        self.mock_cpp_tool_instance.run_async.assert_called_once_with(args=test_args, tool_context=None)
+        self.mock_cpp_run_async.assert_called_once_with(args=test_args, tool_context=None)
 
     async def test_chrome_tool_integration_direct_call(self):
         print("\nRunning: test_chrome_tool_integration_direct_call")
-        chrome_tool = self.agent.tools_map.get("capture_webpage")
+        chrome_tool = self.tools_map.get("capture_webpage")
         self.assertIsNotNone(chrome_tool, "capture_webpage tool not found")
-        self.assertEqual(chrome_tool.run_async, self.mock_chrome_tool_instance.run_async)
+        self.assertIs(chrome_tool, self.mock_chrome_tool_instance)
         test_args = {"url": "https://example.com", "width": 1280, "height": 720} # Escaped braces
         await chrome_tool.run_async(args=test_args, tool_context=None)
-        self.mock_chrome_tool_instance.run_async.assert_called_once_with(args=test_args, tool_context=None)
+        self.mock_chrome_run_async.assert_called_once_with(args=test_args, tool_context=None)
 
     async def test_github_tool_integration_direct_call(self):
         print("\nRunning: test_github_tool_integration_direct_call")
         github_tool_name = "github_get_file_contents" 
-        github_tool = self.agent.tools_map.get(github_tool_name)
+        github_tool = self.tools_map.get(github_tool_name)
         self.assertIsNotNone(github_tool, f"{github_tool_name} tool not found in agent's tools_map") # Escaped
-        self.assertEqual(github_tool.run_async, self.mock_github_tool_instance.run_async,
-                         f"The {github_tool_name} in agent.tools_map is not the mocked instance.") # Escaped
+        self.assertIs(github_tool, self.mock_github_tool_instance,
+                      f"The {github_tool_name} in agent.tools is not the mocked instance.") # Escaped
 
         test_args = {"owner": "testowner", "repo": "testrepo", "path": "README.md", "ref": "main"} # Escaped
         mock_tool_context = None
         
         await github_tool.run_async(args=test_args, tool_context=mock_tool_context)
         
-        self.mock_github_tool_instance.run_async.assert_called_once_with(
+        self.mock_github_run_async.assert_called_once_with(
             args=test_args, tool_context=mock_tool_context
         )
 
+
+def posted_payload(post_call):
+    """Returns the JSON body of a mocked session.post call, whichever encoder DifyClient used."""
+    if "data" in post_call.kwargs:
+        return json.loads(post_call.kwargs["data"])
+    return post_call.kwargs["json"]
+
+
+class TestDifyClient(unittest.TestCase):
+
+    def test_turns_reuse_one_pooled_session(self):
+        print("\nRunning: test_turns_reuse_one_pooled_session")
+        from adk_code_assistant import DifyClient
+        client = DifyClient(base_url="https://dify.example.com/", api_key="app-secret-key")
+        self.addCleanup(client.close)
+        response = MagicMock(status_code=200)
+        response.content = b'{"answer": "hi", "conversation_id": "conv-1"}'
+
+        with patch.object(client._session, 'post', return_value=response) as mock_post, \
+             patch('requests.post') as mock_module_post:
+            self.assertEqual(client.send_chat_message("hello"), ("hi", "conv-1"))
+            self.assertEqual(client.send_chat_message("again", conversation_id="conv-1"), ("hi", "conv-1"))
+
+        mock_module_post.assert_not_called()
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(mock_post.call_args.args, ("https://dify.example.com/v1/chat-messages",))
+        self.assertEqual(posted_payload(mock_post.call_args), {
+            "inputs": {}, "user": "adk_code_assistant_user", "query": "again",
+            "response_mode": "blocking", "conversation_id": "conv-1",
+        })
+        self.assertNotIn("conversation_id", posted_payload(mock_post.call_args_list[0])) # The template is not mutated
+        self.assertEqual(client._session.headers["Authorization"], "Bearer app-secret-key")
+        adapter = client._session.get_adapter("https://dify.example.com")
+        self.assertEqual(adapter.max_retries.total, 3)
+
+    def test_stream_chat_message_yields_answer_fragments(self):
+        print("\nRunning: test_stream_chat_message_yields_answer_fragments")
+        from adk_code_assistant import DifyClient
+        client = DifyClient(base_url="https://dify.example.com", api_key="app-secret-key")
+        self.addCleanup(client.close)
+        response = MagicMock(status_code=200)
+        response.__enter__.return_value = response
+        response.iter_lines.return_value = [
+            'data: {"event": "message", "answer": "Hel", "conversation_id": "conv-2"}',
+            '',
+            'event: ping',
+            'data: {"event": "agent_message", "answer": "lo", "conversation_id": "conv-2"}',
+            'data: {"event": "message_end", "conversation_id": "conv-2"}',
+            'data: {"event": "message", "answer": "never read", "conversation_id": "conv-2"}',
+        ]
+
+        with patch.object(client._session, 'post', return_value=response) as mock_post:
+            chunks = list(client.stream_chat_message("hello", conversation_id="conv-1"))
+
+        self.assertEqual(chunks, [("Hel", "conv-2"), ("lo", "conv-2")])
+        self.assertEqual(posted_payload(mock_post.call_args)["response_mode"], "streaming")
+        self.assertEqual(posted_payload(mock_post.call_args)["conversation_id"], "conv-1")
+        self.assertTrue(mock_post.call_args.kwargs["stream"])
+
+    def test_stdlib_json_is_used_without_orjson(self):
+        print("\nRunning: test_stdlib_json_is_used_without_orjson")
+        from adk_code_assistant import DifyClient
+        client = DifyClient(base_url="https://dify.example.com", api_key="app-secret-key")
+        self.addCleanup(client.close)
+        response = MagicMock(status_code=200, content=b'{"answer": "hi", "conversation_id": "conv-1"}')
+
+        with patch('adk_code_assistant.orjson', None), \
+             patch.object(client._session, 'post', return_value=response) as mock_post:
+            self.assertEqual(client.send_chat_message("hello"), ("hi", "conv-1"))
+
+        self.assertEqual(mock_post.call_args.kwargs["json"]["query"], "hello")
+
+    def test_stream_chat_message_reports_http_errors(self):
+        print("\nRunning: test_stream_chat_message_reports_http_errors")
+        from adk_code_assistant import DifyClient
+        client = DifyClient(base_url="https://dify.example.com", api_key="app-secret-key")
+        self.addCleanup(client.close)
+        response = MagicMock(status_code=401, text="unauthorized")
+        response.__enter__.return_value = response
+
+        with patch.object(client._session, 'post', return_value=response):
+            chunks = list(client.stream_chat_message("hello"))
+
+        self.assertEqual(chunks, [("Dify API Error 401: unauthorized", None)])
+
+
 if __name__ == '__main__':
     unittest.main()
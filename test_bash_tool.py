@@ -1,8 +1,12 @@
+import asyncio
+import time
 import unittest
+import unittest.mock
 import os
 import tempfile
 import shutil
-from bash_tool import run_bash_command
+import bash_tool
+from bash_tool import run_bash_command, run_bash_command_async
 
 class TestRunBashCommand(unittest.TestCase):
 
@@ -116,5 +120,136 @@ class TestRunBashCommand(unittest.TestCase):
         self.assertEqual(result["exit_code"], 0)
         self.assertFalse(result["timed_out"])
 
+    def test_builtin_commands_skip_the_subprocess(self):
+        """Test that trivial commands are answered in-process with the same results."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "a.txt"), "w") as f:
+                f.write("first\n")
+            with open(os.path.join(tmpdir, "b.txt"), "w") as f:
+                f.write("second\n")
+            with unittest.mock.patch("subprocess.Popen") as mock_popen:
+                results = {
+                    "pwd": run_bash_command("pwd", working_directory=tmpdir),
+                    "echo": run_bash_command("echo 'hello  world' again"),
+                    "cat": run_bash_command("cat a.txt b.txt", working_directory=tmpdir),
+                    "true": run_bash_command("true"),
+                    "false": run_bash_command("false"),
+                }
+            mock_popen.assert_not_called()
+            self.assertEqual(results["pwd"]["stdout"], os.path.realpath(tmpdir) + "\n")
+        self.assertEqual(results["echo"]["stdout"], "hello  world again\n")
+        self.assertEqual(results["cat"]["stdout"], "first\nsecond\n")
+        self.assertEqual(results["true"]["exit_code"], 0)
+        self.assertEqual(results["false"]["exit_code"], 1)
+
+    def test_builtin_commands_fall_back_for_unsupported_forms(self):
+        """Test that options and error cases still run the real executable."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            result_echo = run_bash_command("echo -n no newline")
+            result_cat = run_bash_command("cat missing.txt", working_directory=tmpdir)
+        self.assertEqual(result_echo["stdout"], "no newline")
+        self.assertNotEqual(result_cat["exit_code"], 0)
+        self.assertIn("missing.txt", result_cat["stderr"])
+
+    def test_timeout_keeps_partial_output_after_the_header(self):
+        """Test that output captured before a timeout follows the timeout notice, decoded once."""
+        result = run_bash_command(["sh", "-c", "printf 'partial\\377\\r\\n' >&2; exec sleep 5"], timeout=1)
+        self.assertTrue(result["timed_out"])
+        self.assertEqual(result["stderr"], "Command timed out after 1 seconds.\npartial\ufffd\n")
+
+    def test_repeated_command_string_is_split_once(self):
+        """Test that the shlex split of a command string is memoized and not shared mutably."""
+        bash_tool._split_command_string.cache_clear()
+        first = bash_tool._split_command("echo 'a b' c")
+        first.append("mutated")
+        second = bash_tool._split_command("echo 'a b' c")
+        self.assertEqual(second, ["echo", "a b", "c"])
+        self.assertEqual(bash_tool._split_command_string.cache_info().hits, 1)
+
+    def test_debug_output_goes_to_logging_not_stdout(self):
+        """Test that debug details are logged (lazily) instead of printed."""
+        with self.assertLogs("bash_tool", level="DEBUG") as logs, \
+             unittest.mock.patch("builtins.print") as mock_print:
+            result = run_bash_command("echo logged")
+        self.assertEqual(result["exit_code"], 0)
+        mock_print.assert_not_called()
+        self.assertTrue(any("Exiting run_bash_command" in line for line in logs.output))
+
+
+class TestRunBashCommandAsync(unittest.IsolatedAsyncioTestCase):
+
+    async def test_basic_command_stdout(self):
+        """Test a simple command and verify stdout."""
+        result = await run_bash_command_async("echo hello world")
+        self.assertEqual(result, {"stdout": "hello world\n", "stderr": "", "exit_code": 0, "timed_out": False})
+
+    async def test_command_with_error_and_working_directory(self):
+        """Test stderr, exit code and working directory handling."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            result = await run_bash_command_async("ls non_existent_file_for_test", working_directory=tmpdir)
+        self.assertEqual(result["stdout"], "")
+        self.assertIn("non_existent_file_for_test", result["stderr"])
+        self.assertNotEqual(result["exit_code"], 0)
+
+    async def test_command_timeout(self):
+        """Test that a long-running command is killed after the timeout."""
+        result = await run_bash_command_async("sleep 5", timeout=1)
+        self.assertTrue(result["timed_out"])
+        self.assertEqual(result["exit_code"], -1)
+        self.assertIn("Command timed out after 1 seconds.", result["stderr"])
+
+    async def test_timeout_keeps_partial_output_after_the_header(self):
+        """Test that output captured before a timeout follows the timeout notice, as in run_bash_command."""
+        result = await run_bash_command_async(["sh", "-c", "printf 'partial\\377\\r\\n' >&2; echo out; exec sleep 5"], timeout=1)
+        self.assertTrue(result["timed_out"])
+        self.assertEqual(result["stdout"], "out\n")
+        self.assertEqual(result["stderr"], "Command timed out after 1 seconds.\npartial\ufffd\n")
+
+    async def test_cancelled_command_is_killed(self):
+        """Test that cancelling the awaiting task kills the command instead of orphaning it."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            marker = os.path.join(tmpdir, "still_running")
+            task = asyncio.ensure_future(run_bash_command_async(f"sh -c 'sleep 1; touch {marker}'", working_directory=tmpdir))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(1.2)
+            self.assertFalse(os.path.exists(marker))
+
+    async def test_non_existent_command(self):
+        """Test a command that does not exist."""
+        result = await run_bash_command_async("my_non_existent_command_123")
+        self.assertEqual(result["exit_code"], -1)
+        self.assertIn("Command or executable not found: my_non_existent_command_123", result["stderr"])
+
+    async def test_empty_command(self):
+        """Test an empty command string."""
+        result = await run_bash_command_async("")
+        self.assertEqual(result["stderr"], "Error: Empty command provided.")
+        self.assertEqual(result["exit_code"], -1)
+
+    async def test_commands_in_different_directories_run_concurrently(self):
+        """Test that commands awaited together overlap instead of running one after another."""
+        tmpdirs = [tempfile.TemporaryDirectory() for _ in range(3)]
+        for tmpdir in tmpdirs:
+            self.addCleanup(tmpdir.cleanup)
+        start = time.monotonic()
+        results = await asyncio.gather(*(
+            run_bash_command_async("sleep 0.5", working_directory=tmpdir.name) for tmpdir in tmpdirs
+        ))
+        self.assertLess(time.monotonic() - start, 1.4)
+        self.assertTrue(all(result["exit_code"] == 0 for result in results))
+
+    async def test_commands_in_the_same_directory_run_in_order(self):
+        """Test that commands sharing a working directory are serialized, first come first served."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Without the lock the second command would read the file before the first one wrote it.
+            writer = run_bash_command_async(["sh", "-c", "sleep 0.3; echo done > state.txt"], working_directory=tmpdir)
+            reader = run_bash_command_async("cat state.txt", working_directory=os.path.join(tmpdir, "."))
+            _, read_result = await asyncio.gather(writer, reader)
+        self.assertEqual(read_result["stdout"], "done\n")
+        self.assertEqual(bash_tool._DIRECTORY_LOCKS, {}) # Entries are dropped once unused
+
 if __name__ == "__main__":
     unittest.main()
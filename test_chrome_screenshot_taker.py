@@ -1,11 +1,43 @@
 import unittest
 from unittest.mock import patch
 import os # For path manipulation if needed for mocking
-from chrome_screenshot_taker import take_screenshot, PLAYWRIGHT_HELPER_SCRIPT_NAME # Assumes chrome_screenshot_taker.py is accessible
+import subprocess
+import sys
+import time
+import asyncio
+import chrome_screenshot_taker
+from chrome_screenshot_taker import take_screenshot, take_screenshots, take_many, PLAYWRIGHT_HELPER_SCRIPT_NAME, CONTAINER_OUTPUT_DIR, SCREENSHOT_FILE_STEM # Assumes chrome_screenshot_taker.py is accessible
 
 # Ensure playwright_helper.py is in the same directory as chrome_screenshot_taker.py for tests to pass,
 # or adjust paths if tests are run from a different root.
 
+# Stands in for `playwright_helper.py --serve` in a container: answers each JSON job line with metadata
+# and writes a fake PNG into the host directory that Docker would have mounted at /out.
+FAKE_SERVE_SCRIPT = """
+import json, os, sys
+host_dir = sys.argv[1]
+if os.environ.get("FAKE_WORKER_FAILS_TO_START"):
+    sys.exit(125)
+print(json.dumps({"ready": True}), flush=True)
+for line in sys.stdin:
+    job = json.loads(line)
+    if job["url"] == "crash://":
+        sys.exit(3)
+    with open(os.path.join(host_dir, os.path.basename(job["output_path"])), "wb") as f:
+        f.write(b"\\x89PNG" + str(os.getpid()).encode())
+    print(json.dumps({"actual_url": job["url"], "page_title": "Fake", "error": None}), flush=True)
+"""
+
+# Stands in for a one-shot helper container: sleeps like a page load, then writes the image and metadata.
+FAKE_ONE_SHOT_SCRIPT = """
+import json, os, sys, time
+host_dir, url, file_name = sys.argv[1], sys.argv[2], sys.argv[3]
+time.sleep(0.5)
+with open(os.path.join(host_dir, file_name), "wb") as f:
+    f.write(url.encode())
+print(json.dumps({"actual_url": url, "page_title": "Fake", "error": None}))
+"""
+
 class TestChromeScreenshotTaker(unittest.TestCase):
 
     # Using a data URL for a very simple, self-contained test page for basic success.
@@ -13,6 +45,10 @@ class TestChromeScreenshotTaker(unittest.TestCase):
     # A reliable public URL for tests that might need more complex rendering or navigation.
     RELIABLE_PUBLIC_URL = "https://www.example.com" 
 
+    def setUp(self):
+        # Each test should exercise a real capture, not a result cached by an earlier test.
+        chrome_screenshot_taker.clear_screenshot_cache()
+
     def test_successful_screenshot(self):
         """Tests a successful screenshot of a simple data URL."""
         print(f"\nRunning test_successful_screenshot with URL: {self.SIMPLE_TEST_PAGE_URL}")
@@ -27,7 +63,7 @@ class TestChromeScreenshotTaker(unittest.TestCase):
         self.assertIsNone(result.get('docker_error'), msg=f"Unexpected Docker error: {result.get('docker_error')}")
         self.assertIsNotNone(result.get('image_data'))
         self.assertIsInstance(result.get('image_data'), bytes)
-        self.assertEqual(result.get('image_format'), "png")
+        self.assertEqual(result.get('image_format'), "jpeg")
         self.assertTrue(result.get('actual_url', '').startswith("data:text/html")) 
         self.assertEqual(result.get('page_title'), "Test Page Title")
 
@@ -45,7 +81,7 @@ class TestChromeScreenshotTaker(unittest.TestCase):
         self.assertIsNone(result.get('docker_error'), msg=f"Unexpected Docker error: {result.get('docker_error')}")
         self.assertIsNotNone(result.get('image_data'))
         self.assertIsInstance(result.get('image_data'), bytes)
-        self.assertEqual(result.get('image_format'), "png")
+        self.assertEqual(result.get('image_format'), "jpeg")
         self.assertTrue(result.get('actual_url', '').startswith("http")) # Should be the URL itself or similar
         self.assertIsNotNone(result.get('page_title')) # Title can vary for example.com
 
@@ -99,30 +135,10 @@ class TestChromeScreenshotTaker(unittest.TestCase):
         )
         self.assertIsNone(result.get('image_data'))
 
-    @patch('chrome_screenshot_taker.os.path.exists') # Patch os.path.exists in the context of chrome_screenshot_taker module
-    def test_helper_script_not_found(self, mock_exists):
+    @patch('chrome_screenshot_taker._HELPER_SCRIPT_FOUND', False) # The helper's existence is checked once at import
+    def test_helper_script_not_found(self):
         """Tests behavior when the playwright_helper.py script is not found."""
-        print(f"\nRunning test_helper_script_not_found (mocking os.path.exists)")
-        
-        # Configure the mock to return False when checking for PLAYWRIGHT_HELPER_SCRIPT_NAME
-        def side_effect_func(path_to_check):
-            # Get the directory of the chrome_screenshot_taker module to construct the full path
-            # that take_screenshot will use for the helper script.
-            module_dir = os.path.dirname(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'chrome_screenshot_taker.py'))) # Assuming test is in a subdir or similar relative path setup
-            # Fallback if path logic is tricky, assume it's in same dir as this test file for a simpler check
-            # However, chrome_screenshot_taker.py uses os.path.dirname(os.path.abspath(__file__)) for its own location.
-            # So we need to mock the path it will actually check.
-            
-            # The path checked by take_screenshot is:
-            # script_dir = os.path.dirname(os.path.abspath(__file__)) <-- __file__ of chrome_screenshot_taker.py
-            # helper_script_path_host = os.path.join(script_dir, PLAYWRIGHT_HELPER_SCRIPT_NAME)
-            # We need this mock_exists to return False for *that* specific path.
-            # A simpler way is to make it always return False for the helper script name.
-            if path_to_check.endswith(PLAYWRIGHT_HELPER_SCRIPT_NAME):
-                return False
-            return True # For other os.path.exists calls if any
-
-        mock_exists.side_effect = side_effect_func
+        print(f"\nRunning test_helper_script_not_found (patching the import-time existence check)")
         
         result = take_screenshot(self.RELIABLE_PUBLIC_URL) # URL doesn't matter much here
         
@@ -132,10 +148,245 @@ class TestChromeScreenshotTaker(unittest.TestCase):
         self.assertIn(f"Critical error: {PLAYWRIGHT_HELPER_SCRIPT_NAME} not found", result.get('docker_error', ''))
         self.assertIsNone(result.get('image_data'))
 
+    @patch('chrome_screenshot_taker.subprocess.run')
+    def test_helper_output_is_parsed(self, mock_run):
+        """Tests reading the helper's metadata JSON and the PNG it wrote to the mounted directory, without Docker."""
+        print(f"\nRunning test_helper_output_is_parsed (mocking subprocess.run)")
+        helper_stdout = b'{"actual_url": "https://example.com/", "page_title": "Example", "error": null}\n'
+        mounted_dirs = []
+
+        def fake_docker_run(command, **kwargs):
+            # Stand in for the helper writing to /out inside the container.
+            host_dir = next(arg.split(":")[0] for arg in command if arg.endswith(f":{CONTAINER_OUTPUT_DIR}"))
+            mounted_dirs.append(host_dir)
+            with open(os.path.join(host_dir, f"{SCREENSHOT_FILE_STEM}.png"), "wb") as f:
+                f.write(b"\x89PNG\r\n\x1a\n")
+            return subprocess.CompletedProcess(args=command, returncode=0, stdout=helper_stdout, stderr=b"")
+        mock_run.side_effect = fake_docker_run
+
+        result = take_screenshot(self.RELIABLE_PUBLIC_URL, persistent=False, image_format="png")
+
+        self.assertIsNone(result.get('error'))
+        self.assertEqual(result.get('image_data'), b"\x89PNG\r\n\x1a\n")
+        self.assertEqual(result.get('image_format'), "png")
+        self.assertEqual(result.get('actual_url'), "https://example.com/")
+        self.assertEqual(result.get('page_title'), "Example")
+        self.assertEqual(mock_run.call_args.args[0][-2:], [f"{CONTAINER_OUTPUT_DIR}/{SCREENSHOT_FILE_STEM}.png", "png"])
+        self.assertFalse(os.path.exists(mounted_dirs[0]), "Host output directory should be removed afterwards.")
+
+    @patch('chrome_screenshot_taker.subprocess.run')
+    def test_unsupported_image_format_is_rejected(self, mock_run):
+        """Tests that only formats Playwright can write are accepted, before Docker is started."""
+        result = take_screenshot(self.RELIABLE_PUBLIC_URL, persistent=False, image_format="webp")
+
+        self.assertIn("Unsupported image_format 'webp'", result.get('error', ''))
+        mock_run.assert_not_called()
+
+    @patch('chrome_screenshot_taker.subprocess.run')
+    def test_docker_failure_reports_decoded_stderr(self, mock_run):
+        """Tests that a failed Docker run reports its stderr as text."""
+        print(f"\nRunning test_docker_failure_reports_decoded_stderr (mocking subprocess.run)")
+        mock_run.return_value = subprocess.CompletedProcess(args=[], returncode=125, stdout=b"", stderr=b"docker: no such image\n")
+
+        result = take_screenshot(self.RELIABLE_PUBLIC_URL, persistent=False)
+
+        self.assertEqual(result.get('docker_error'), "Docker process exited with code 125. Stderr: docker: no such image")
+        self.assertNotIn('text', mock_run.call_args.kwargs)
+
+    @patch('chrome_screenshot_taker.subprocess.run')
+    def test_unparseable_helper_output_is_reported(self, mock_run):
+        """Tests that malformed helper output becomes an error instead of an exception."""
+        print(f"\nRunning test_unparseable_helper_output_is_reported (mocking subprocess.run)")
+        mock_run.return_value = subprocess.CompletedProcess(args=[], returncode=0, stdout=b"not json", stderr=b"")
+
+        result = take_screenshot(self.RELIABLE_PUBLIC_URL, persistent=False)
+
+        self.assertIn("Failed to parse JSON output from screenshot script", result.get('error', ''))
+        self.assertIsNone(result.get('image_data'))
+
+    @patch('chrome_screenshot_taker.subprocess.run')
+    def test_large_unparseable_output_is_truncated_in_error(self, mock_run):
+        """Tests that only a short prefix of malformed helper output ends up in the error message."""
+        mock_run.return_value = subprocess.CompletedProcess(args=[], returncode=0, stdout=b"x" * 1_000_000, stderr=b"")
+
+        result = take_screenshot(self.RELIABLE_PUBLIC_URL, persistent=False)
+
+        self.assertIn("Failed to parse JSON output from screenshot script", result.get('error', ''))
+        self.assertLess(len(result['error']), 1000)
+        self.assertTrue(result['error'].endswith("..."))
+
+class TestScreenshotWorker(unittest.TestCase):
+    """Persistent worker tests that run a local fake helper instead of Docker."""
+
+    def setUp(self):
+        self.popen_commands = []
+        real_popen = subprocess.Popen
+
+        def fake_popen(command, **kwargs):
+            self.popen_commands.append(command)
+            host_dir = next(arg.split(":")[0] for arg in command if arg.endswith(f":{CONTAINER_OUTPUT_DIR}"))
+            return real_popen([sys.executable, "-c", FAKE_SERVE_SCRIPT, host_dir], **kwargs)
+
+        patcher = patch('chrome_screenshot_taker.subprocess.Popen', side_effect=fake_popen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(chrome_screenshot_taker._worker.close)
+        chrome_screenshot_taker.clear_screenshot_cache()
+        self.addCleanup(chrome_screenshot_taker.clear_screenshot_cache)
+
+    def test_debug_log_leaves_out_image_bytes(self):
+        with self.assertLogs('chrome_screenshot_taker', level='DEBUG') as logs:
+            result = take_screenshot("https://example.com/a")
+
+        exit_lines = [line for line in logs.output if "Exiting take_screenshot" in line]
+        self.assertEqual(len(exit_lines), 1)
+        self.assertIn(f"image_bytes={len(result['image_data'])}", exit_lines[0])
+        self.assertNotIn("PNG", exit_lines[0])
+
+    def test_worker_is_reused_across_calls(self):
+        first = take_screenshot("https://example.com/a")
+        second = take_screenshot("https://example.com/b")
+
+        self.assertIsNone(first.get('error'))
+        self.assertEqual(first.get('actual_url'), "https://example.com/a")
+        self.assertEqual(second.get('page_title'), "Fake")
+        self.assertEqual(first.get('image_format'), "jpeg")
+        self.assertEqual(first.get('image_data'), second.get('image_data'), "Both screenshots should come from the same worker process.")
+        self.assertEqual(len(self.popen_commands), 1)
+        self.assertEqual(self.popen_commands[0][-2:], [f"/app/{PLAYWRIGHT_HELPER_SCRIPT_NAME}", "--serve"])
+        self.assertEqual(os.listdir(chrome_screenshot_taker._worker.host_output_dir), [], "Screenshot files should be removed after reading.")
+
+    def test_dead_worker_is_restarted(self):
+        take_screenshot("https://example.com/a")
+        chrome_screenshot_taker._worker.process.kill()
+        chrome_screenshot_taker._worker.process.wait()
+
+        result = take_screenshot("https://example.com/b")
+
+        self.assertIsNone(result.get('error'))
+        self.assertEqual(result.get('actual_url'), "https://example.com/b")
+        self.assertEqual(len(self.popen_commands), 2)
+
+    def test_repeated_screenshot_is_served_from_cache(self):
+        first = take_screenshot("https://example.com/a")
+        with patch('chrome_screenshot_taker._run_worker_jobs') as mock_worker:
+            second = take_screenshot("https://example.com/a")
+            mock_worker.assert_not_called()
+
+        self.assertFalse(first.get('unchanged'))
+        self.assertTrue(second.get('unchanged'))
+        self.assertEqual(second.get('image_data'), first.get('image_data'))
+        self.assertEqual(second.get('image_hash'), first.get('image_hash'))
+
+    def test_unchanged_flag_tracks_image_content(self):
+        first = take_screenshot("https://example.com/a", use_cache=False)
+        same = take_screenshot("https://example.com/a", use_cache=False)
+        # A new worker process writes different bytes in the fake helper.
+        chrome_screenshot_taker._worker.close()
+        changed = take_screenshot("https://example.com/a", use_cache=False)
+
+        self.assertFalse(first.get('unchanged'))
+        self.assertTrue(same.get('unchanged'))
+        self.assertFalse(changed.get('unchanged'))
+        self.assertNotEqual(changed.get('image_hash'), first.get('image_hash'))
+        self.assertEqual(len(self.popen_commands), 2)
+
+    def test_take_screenshots_uses_one_worker_for_the_batch(self):
+        urls = [f"https://example.com/{i}" for i in range(40)] # More than WORKER_MAX_IN_FLIGHT_JOBS
+
+        results = take_screenshots(urls)
+
+        self.assertEqual([r.get('actual_url') for r in results], urls)
+        self.assertTrue(all(r.get('image_data') and r.get('error') is None for r in results))
+        self.assertEqual(len(self.popen_commands), 1)
+        self.assertEqual(os.listdir(chrome_screenshot_taker._worker.host_output_dir), [])
+
+    def test_take_screenshots_recovers_from_a_crashing_url(self):
+        urls = ["https://example.com/a", "crash://", "https://example.com/b"]
+
+        results = take_screenshots(urls)
+
+        self.assertEqual(results[0].get('actual_url'), "https://example.com/a")
+        self.assertIn("Screenshot worker exited with code 3", results[1].get('docker_error', ''))
+        self.assertEqual(results[2].get('actual_url'), "https://example.com/b")
+        # First worker dies on crash://, the retry dies again, a third worker finishes the batch.
+        self.assertEqual(len(self.popen_commands), 3)
+
+    @patch.dict(os.environ, {"FAKE_WORKER_FAILS_TO_START": "1"})
+    def test_worker_that_cannot_start_fails_the_batch_once(self):
+        results = take_screenshots(["https://example.com/a", "https://example.com/b"])
+
+        self.assertTrue(all("Screenshot worker exited with code 125" in r.get('docker_error', '') for r in results))
+        self.assertEqual(len(self.popen_commands), 1, "A worker that never became ready should not be restarted per URL.")
+
+    @patch('chrome_screenshot_taker._HOST_RESOLVER_DOCKER_ENV', ("-e", "SCREENSHOT_HOST_RESOLVER_RULES=MAP example.com 127.0.0.1"))
+    def test_host_resolver_rules_are_passed_to_the_worker(self):
+        take_screenshot("https://example.com/a")
+
+        command = self.popen_commands[0]
+        env_index = command.index("-e")
+        self.assertEqual(command[env_index + 1], "SCREENSHOT_HOST_RESOLVER_RULES=MAP example.com 127.0.0.1")
+        self.assertLess(env_index, command.index(chrome_screenshot_taker.DOCKER_IMAGE), "Docker options must precede the image.")
+
+    @patch('chrome_screenshot_taker.CONTAINER_RUNTIME', "podman")
+    def test_worker_uses_configured_container_runtime(self):
+        take_screenshot("https://example.com/a")
+
+        self.assertEqual(self.popen_commands[0][:2], ["podman", "run"])
+
+    def test_worker_crash_during_job_is_reported(self):
+        result = take_screenshot("crash://")
+
+        self.assertIn("Screenshot worker exited with code 3", result.get('docker_error', ''))
+        self.assertIsNone(result.get('image_data'))
+        self.assertEqual(len(self.popen_commands), 2, "The job should be retried once on a fresh worker.")
+
+class TestTakeScreenshotAsync(unittest.TestCase):
+    """Async API tests that run a local fake one-shot helper instead of Docker."""
+
+    def setUp(self):
+        self.commands = []
+        real_exec = asyncio.create_subprocess_exec
+
+        async def fake_exec(*command, **kwargs):
+            self.commands.append(command)
+            host_dir = next(arg.split(":")[0] for arg in command if arg.endswith(f":{CONTAINER_OUTPUT_DIR}"))
+            url = command[command.index(f"/app/{PLAYWRIGHT_HELPER_SCRIPT_NAME}") + 1]
+            file_name = os.path.basename(command[-2])
+            return await real_exec(sys.executable, "-c", FAKE_ONE_SHOT_SCRIPT, host_dir, url, file_name, **kwargs)
+
+        patcher = patch('chrome_screenshot_taker.asyncio.create_subprocess_exec', side_effect=fake_exec)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        chrome_screenshot_taker.clear_screenshot_cache()
+        self.addCleanup(chrome_screenshot_taker.clear_screenshot_cache)
+
+    def test_take_many_runs_concurrently_and_keeps_order(self):
+        urls = [f"https://example.com/{i}" for i in range(4)]
+
+        start = time.monotonic()
+        results = asyncio.run(take_many(urls))
+        elapsed = time.monotonic() - start
+
+        self.assertEqual([r.get('actual_url') for r in results], urls)
+        self.assertEqual([r.get('image_data') for r in results], [url.encode() for url in urls])
+        self.assertTrue(all(r.get('error') is None for r in results))
+        self.assertLess(elapsed, 1.5, "Four 0.5s screenshots should overlap rather than run back to back.")
+
+    def test_take_many_respects_max_concurrency(self):
+        urls = [f"https://example.com/{i}" for i in range(3)]
+
+        start = time.monotonic()
+        results = asyncio.run(take_many(urls, max_concurrency=1))
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(len(self.commands), 3)
+        self.assertTrue(all(r.get('image_format') == "jpeg" for r in results))
+        self.assertGreaterEqual(elapsed, 1.5)
+
 if __name__ == '__main__':
     print("Running chrome_screenshot_taker tests...")
     print("IMPORTANT: Docker must be installed, running, and the user must have permissions to use it.")
     print(f"Playwright helper script ({PLAYWRIGHT_HELPER_SCRIPT_NAME}) must be in the same directory as chrome_screenshot_taker.py.")
     print(f"The Docker image used by chrome_screenshot_taker.py will be pulled if not present.")
     unittest.main()
-```
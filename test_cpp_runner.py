@@ -1,6 +1,15 @@
 import unittest
+import contextlib
+import sys
 import os
-from cpp_runner import run_cpp_code # Assuming cpp_runner.py is in the same directory or PYTHONPATH
+import shutil
+import subprocess
+import tempfile
+import threading
+import queue
+from unittest.mock import patch
+import cpp_runner
+from cpp_runner import run_cpp_code, run_cpp_code_many # Assuming cpp_runner.py is in the same directory or PYTHONPATH
 
 # A global check for Docker availability might be useful,
 # but for now, tests will fail individually if Docker is not present.
@@ -169,12 +178,12 @@ class TestCppRunner(unittest.TestCase):
 
     def test_compilation_timeout(self): # Using default compiler (g++) for this
         # This code is valid but we use a very short timeout.
-        # The apt-get update/install in the Docker command might influence this.
+        # Building the sandbox image on first use happens before compile_timeout starts counting.
         cpp_code = """
         #include <iostream>
         int main() { std::cout << "Hello!" << std::endl; return 0; }
         """
-        # Setting timeout to 2s. apt-get install can take >1s if image layers not cached.
+        # Setting timeout to 2s. Container startup alone can take >1s on slow hosts.
         # This test is more about the timeout mechanism than precise timing of C++ compilation itself.
         result = run_cpp_code(cpp_code, compile_timeout=2, compiler="g++") # Explicitly g++
         
@@ -185,7 +194,7 @@ class TestCppRunner(unittest.TestCase):
             self.assertIn(f"Compilation timed out after {2} seconds.", result['compilation_stderr'])
         else:
             print("\nWarning: Compilation timeout test did not time out compilation. "
-                  "The compile_timeout (2s) might be too generous if Docker image layers were cached "
+                  "The compile_timeout (2s) might be too generous if the sandbox image was already built "
                   "and system is fast. The test primarily checks the timeout path logic.")
             self.assertEqual(result['compilation_exit_code'], 0, msg=f"Compilation failed unexpectedly: {result['compilation_stderr']}")
 
@@ -196,11 +205,8 @@ class TestCppRunner(unittest.TestCase):
         self.assertEqual(result['compiler_used'], compiler_name)
         self.assertNotEqual(result['compilation_exit_code'], 0, f"Compilation of empty string should fail for {compiler_name}.")
         self.assertFalse(result['timed_out_compilation'])
-        # Error messages for no input can vary.
-        # g++: "g CXX: fatal error: no input files"
-        # clang++: "clang: error: no input files"
-        # So, check for "no input files" generally.
-        self.assertIn("no input files", result['compilation_stderr'].lower(), f"Expected 'no input files' error not found for {compiler_name}: {result['compilation_stderr']}")
+        # Rejected by the pre-check before the compiler runs.
+        self.assertIn("no 'main' function", result['compilation_stderr'], f"Expected missing main error not found for {compiler_name}: {result['compilation_stderr']}")
 
     def test_empty_code_string_gpp(self):
         self._run_empty_code_string("g++")
@@ -283,11 +289,457 @@ class TestCppRunner(unittest.TestCase):
         self.assertFalse(result['timed_out_compilation'])
         self.assertFalse(result['timed_out_execution'])
 
+class TestSandboxContainer(unittest.TestCase):
+    """Checks the sandbox image/container handling without needing Docker."""
+
+    def setUp(self):
+        self._reset_sandbox()
+        self.cache_dir = tempfile.mkdtemp()
+        cache_patcher = patch("cpp_runner.CACHE_DIR", self.cache_dir)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def tearDown(self):
+        self._reset_sandbox()
+
+    def _reset_sandbox(self):
+        cpp_runner._sandbox_image_ready = False
+        cpp_runner._sandbox_containers.clear()
+        cpp_runner._sandbox_dirs.clear()
+        cpp_runner._idle_sandboxes = queue.Queue()
+        cpp_runner._sandbox_slots = threading.BoundedSemaphore(cpp_runner.SANDBOX_MAX_CONTAINERS)
+        while not cpp_runner._workdir_pool.empty():
+            cpp_runner._workdir_pool.get_nowait()
+        if cpp_runner._sandbox_root is not None:
+            shutil.rmtree(cpp_runner._sandbox_root, ignore_errors=True)
+            cpp_runner._sandbox_root = None
+
+    def _fake_docker(self, build_returncode=0, job=None):
+        """
+        Fakes the docker CLI. `job(host_dir, command, kwargs)` stands in for the sandbox script run by
+        `docker exec`; it may write cc.out/cc.err into host_dir and returns (returncode, stdout, stderr).
+        """
+        calls = []
+        def fake_run(command, **kwargs):
+            calls.append((command, kwargs))
+            if command[:3] == ["docker", "image", "inspect"]:
+                return subprocess.CompletedProcess(command, 1, "", "No such image")
+            if command[:2] == ["docker", "build"]:
+                return subprocess.CompletedProcess(command, build_returncode, "", "build broke")
+            if command[:2] == ["docker", "exec"] or command[0] == "bwrap":
+                if command[0] == "bwrap":
+                    host_dir = command[command.index("--bind") + 1]
+                else:
+                    host_dir = cpp_runner._sandbox_dirs[command[command.index("-w") + 2]]
+                returncode, stdout, stderr = job(host_dir, command, kwargs) if job else (0, "ran\n", "")
+                if isinstance(stdout, str):
+                    stdout, stderr = stdout.encode(), stderr.encode()
+                return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+            return subprocess.CompletedProcess(command, 0, "", "")
+        return calls, fake_run
+
+    @contextlib.contextmanager
+    def _patch_docker(self, fake_run):
+        """Routes both plain subprocess.run calls and the output-capped sandbox run through fake_run."""
+        def fake_run_capped(command, input_bytes, timeout, max_output=cpp_runner.MAX_OUTPUT_BYTES):
+            process = fake_run(command, input=input_bytes, timeout=timeout)
+            return process.returncode, process.stdout, process.stderr, False
+        with patch("cpp_runner.subprocess.run", side_effect=fake_run), patch("cpp_runner._run_capped", side_effect=fake_run_capped):
+            yield
+
+    def _container_name(self, calls):
+        start_command = [command for command, _ in calls if command[:2] == ["docker", "run"]][0]
+        return start_command[start_command.index("--name") + 1]
+
+    def test_image_and_container_started_once(self):
+        calls, fake_run = self._fake_docker()
+        with self._patch_docker(fake_run):
+            first = run_cpp_code("int main() { return 0; }")
+            second = run_cpp_code("int main() { return 0; }")
+
+        self.assertEqual(first['compilation_exit_code'], 0)
+        self.assertEqual(first['execution_stdout'], "ran\n")
+        self.assertEqual(second['execution_exit_code'], 0)
+        commands = [command for command, _ in calls]
+        build_calls = [(command, kwargs) for command, kwargs in calls if command[:2] == ["docker", "build"]]
+        self.assertEqual(len(build_calls), 1)
+        self.assertEqual(build_calls[0][1]["input"], cpp_runner.CPP_SANDBOX_DOCKERFILE)
+        self.assertEqual(build_calls[0][1]["env"]["DOCKER_BUILDKIT"], "1")
+        start_commands = [command for command in commands if command[:2] == ["docker", "run"]]
+        self.assertEqual(len(start_commands), 1)
+        self.assertIn(cpp_runner.DOCKER_IMAGE, start_commands[0])
+        self.assertEqual(start_commands[0][-2:], ["sleep", "infinity"])
+        self.assertIn("--tmpfs", start_commands[0])
+        for option in ("--memory=512m", "--memory-swap=512m", "--cpus=1", "--pids-limit=64", "--read-only", "--security-opt=no-new-privileges"):
+            self.assertIn(option, start_commands[0])
+        exec_commands = [command for command in commands if command[:2] == ["docker", "exec"]]
+        self.assertEqual(len(exec_commands), 2) # Compile and execute fused into one exec per call
+        for command in exec_commands:
+            self.assertIn(self._container_name(calls), command)
+            self.assertNotIn("apt-get", command[-1])
+            self.assertIn(f"ulimit -v {cpp_runner.EXEC_MEMORY_LIMIT_KB}; {cpp_runner.SANDBOX_RUN_AS} timeout", command[-1])
+            self.assertIn(f"{cpp_runner.SANDBOX_RUN_AS} sh -c 'kill -9 -1' 2>/dev/null; "
+                          f"find {cpp_runner.SANDBOX_SCRATCH_DIRS} -mindepth 1 -delete 2>/dev/null; exit $rc",
+                          command[-1])
+            self.assertEqual(command[command.index("-w") + 1], cpp_runner.SANDBOX_MOUNT)
+        # The container mounts its own directory, which the second call reuses once emptied.
+        sandbox_dir = cpp_runner._sandbox_dirs[self._container_name(calls)]
+        self.assertIn(f"{sandbox_dir}:{cpp_runner.SANDBOX_MOUNT}", start_commands[0])
+        self.assertEqual(os.path.dirname(sandbox_dir), cpp_runner._sandbox_root)
+        self.assertEqual(os.stat(sandbox_dir).st_mode & 0o777, cpp_runner.SANDBOX_DIR_MODE)
+        self.assertEqual(os.listdir(cpp_runner._sandbox_root), [os.path.basename(sandbox_dir)])
+        self.assertEqual(os.listdir(sandbox_dir), [])
+
+    def test_container_with_leftover_files_not_reused(self):
+        def job(host_dir, command, kwargs):
+            open(os.path.join(host_dir, "output.txt"), "w").close() # Unexpected file in the directory
+            return 0, "", ""
+        calls, fake_run = self._fake_docker(job=job)
+        with self._patch_docker(fake_run):
+            run_cpp_code("int main() { return 0; }")
+            run_cpp_code("int main() { return 0; }")
+
+        containers = [command[command.index("-w") + 2] for command, _ in calls if command[:2] == ["docker", "exec"]]
+        self.assertNotEqual(containers[0], containers[1])
+        self.assertIn(["docker", "rm", "-f", containers[0]], [command for command, _ in calls])
+        self.assertEqual(os.listdir(cpp_runner._sandbox_root), [])
+
+    def test_concurrent_containers_mount_separate_directories(self):
+        barrier = threading.Barrier(2)
+        def job(host_dir, command, kwargs):
+            barrier.wait(timeout=5)
+            return 0, host_dir, ""
+        calls, fake_run = self._fake_docker(job=job)
+        with self._patch_docker(fake_run), patch("cpp_runner.SANDBOX_MAX_CONTAINERS", 2):
+            cpp_runner._sandbox_slots = threading.BoundedSemaphore(2)
+            results = run_cpp_code_many(["int main() {}"] * 2, use_cache=False)
+
+        volumes = [command[command.index("-v") + 1] for command, _ in calls if command[:2] == ["docker", "run"]]
+        self.assertEqual(len(set(volumes)), 2)
+        self.assertNotEqual(results[0]['execution_stdout'], results[1]['execution_stdout'])
+        for volume in volumes:
+            self.assertTrue(volume.endswith(f":{cpp_runner.SANDBOX_MOUNT}"))
+            self.assertNotEqual(volume.rsplit(":", 1)[0], cpp_runner._sandbox_root)
+
+    def test_image_build_failure_is_reported(self):
+        calls, fake_run = self._fake_docker(build_returncode=1)
+        with self._patch_docker(fake_run):
+            result = run_cpp_code("int main() { return 0; }")
+
+        self.assertEqual(result['compilation_exit_code'], -1)
+        self.assertIn("Failed to build C++ sandbox image", result['compilation_stderr'])
+        self.assertIn("build broke", result['compilation_stderr'])
+        self.assertIsNone(result['execution_exit_code'])
+        self.assertFalse(cpp_runner._sandbox_image_ready)
+        self.assertFalse(any(command[:2] == ["docker", "run"] for command, _ in calls))
+
+    def test_compile_output_split_from_program_output(self):
+        def job(host_dir, command, kwargs):
+            with open(os.path.join(host_dir, "cc.err"), "w") as f:
+                f.write("warning: unused variable 'x'\n")
+            # The source is streamed ahead of the program's stdin and split off by `head -c`.
+            source = b"int main() { int x; return 3; }"
+            self.assertIn(f"head -c {len(source)} > temp_code.cpp", command[-1])
+            self.assertEqual(kwargs["input"], source + b"42")
+            self.assertNotIn("text", kwargs)
+            return 3, "got 42\n", "program stderr\n"
+        calls, fake_run = self._fake_docker(job=job)
+        with self._patch_docker(fake_run):
+            result = run_cpp_code("int main() { int x; return 3; }", stdin_data="42")
+
+        self.assertEqual(result['compilation_exit_code'], 0)
+        self.assertEqual(result['compilation_stderr'], "warning: unused variable 'x'\n")
+        self.assertEqual(result['execution_stdout'], "got 42\n")
+        self.assertEqual(result['execution_stderr'], "program stderr\n")
+        self.assertEqual(result['execution_exit_code'], 3)
+
+    def test_executable_cache(self):
+        def job(host_dir, command, kwargs):
+            if "temp_code.cpp" in command[-1]: # Compile step present
+                with open(os.path.join(host_dir, "temp_exec"), "wb") as f:
+                    f.write(b"ELF")
+            with open(os.path.join(host_dir, "temp_exec"), "rb") as f:
+                return 0, f.read().decode() + "\n", ""
+        calls, fake_run = self._fake_docker(job=job)
+        code = "int main() { return 0; }"
+        with self._patch_docker(fake_run):
+            first = run_cpp_code(code)
+            second = run_cpp_code(code)
+            other_compiler = run_cpp_code(code, compiler="clang++")
+            uncached = run_cpp_code(code, use_cache=False)
+
+        scripts = [command[-1] for command, _ in calls if command[:2] == ["docker", "exec"]]
+        self.assertIn("g++", scripts[0])
+        self.assertNotIn("temp_code.cpp", scripts[1]) # Served from the cache
+        self.assertIn("clang++", scripts[2])
+        self.assertIn("temp_code.cpp", scripts[3])
+        for result in (first, second, other_compiler, uncached):
+            self.assertEqual(result['compilation_exit_code'], 0)
+            self.assertEqual(result['execution_stdout'], "ELF\n")
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2) # g++ and clang++ builds
+
+    def test_bwrap_runs_are_not_cached(self):
+        def job(host_dir, command, kwargs):
+            with open(os.path.join(host_dir, "temp_exec"), "wb") as f:
+                f.write(b"ELF") # The program can write its own directory under bwrap
+            return 0, "", ""
+        calls, fake_run = self._fake_docker(job=job)
+        with self._patch_docker(fake_run), patch("cpp_runner.BWRAP_PATH", "/usr/bin/bwrap"):
+            run_cpp_code("int main() { return 0; }", backend="bwrap")
+            run_cpp_code("int main() { return 0; }", backend="bwrap")
+
+        self.assertTrue(all("temp_code.cpp" in command[-1] for command, _ in calls))
+        self.assertFalse(os.path.exists(self.cache_dir) and os.listdir(self.cache_dir))
+
+    def test_optimize_flag(self):
+        calls, fake_run = self._fake_docker()
+        with self._patch_docker(fake_run):
+            run_cpp_code("int main() { return 0; }", use_cache=False)
+            run_cpp_code("int main() { return 0; }", use_cache=False, optimize=True)
+
+        scripts = [command[-1] for command, _ in calls if command[:2] == ["docker", "exec"]]
+        self.assertIn("g++ -std=c++17 -pipe -O0 $PCH $LD temp_code.cpp", scripts[0])
+        self.assertIn("g++ -std=c++17 -pipe -O2 $PCH $LD temp_code.cpp", scripts[1])
+
+    def test_precompiled_header_flags(self):
+        calls, fake_run = self._fake_docker()
+        with self._patch_docker(fake_run):
+            run_cpp_code("#include <bits/stdc++.h>\nint main() { return 0; }", use_cache=False)
+            run_cpp_code("// Sum\n#include <bits/stdc++.h>\nint main() { return 0; }", use_cache=False, compiler="clang++", optimize=True)
+            with patch("cpp_runner.PCH_ENABLED", False):
+                run_cpp_code("#include <bits/stdc++.h>\nint main() { return 0; }", use_cache=False)
+            # Not opted in: other headers, or a macro defined before the include
+            run_cpp_code("#include <iostream>\nusing namespace std; int count = 0; int main() { count++; }", use_cache=False)
+            run_cpp_code("#define _GLIBCXX_DEBUG\n#include <bits/stdc++.h>\nint main() { return 0; }", use_cache=False)
+
+        scripts = [command[-1] for command, _ in calls if command[:2] == ["docker", "exec"]]
+        self.assertIn("if [ -e /opt/pch/stdcpp.h ]; then PCH='-include /opt/pch/stdcpp.h'; fi;", scripts[0])
+        self.assertIn("PCH='-include-pch /opt/pch/stdcpp-clang-O2.pch'", scripts[1])
+        for script in scripts[2:]:
+            self.assertNotIn("PCH=", script)
+
+    def test_mold_linker_flags(self):
+        calls, fake_run = self._fake_docker()
+        with self._patch_docker(fake_run):
+            run_cpp_code("int main() { return 0; }", use_cache=False)
+            run_cpp_code("int main() { return 0; }", use_cache=False, compiler="clang++")
+
+        scripts = [command[-1] for command, _ in calls if command[:2] == ["docker", "exec"]]
+        self.assertIn("if [ -x /usr/libexec/mold/ld ]; then LD='-B/usr/libexec/mold'; fi;", scripts[0])
+        self.assertIn("if [ -x /usr/bin/ld.mold ]; then LD='-fuse-ld=mold'; fi;", scripts[1])
+        self.assertIn(" mold\n", cpp_runner.CPP_SANDBOX_DOCKERFILE)
+        self.assertIn("stdcpp.h.gch/$level.gch", cpp_runner.CPP_SANDBOX_DOCKERFILE)
+
+    def test_invalid_utf8_output_is_replaced(self):
+        calls, fake_run = self._fake_docker(job=lambda host_dir, command, kwargs: (0, b"ok \xff\r\n", b"\xfe"))
+        with self._patch_docker(fake_run):
+            result = run_cpp_code("int main() { return 0; }")
+
+        self.assertEqual(result['execution_stdout'], "ok \ufffd\r\n")
+        self.assertEqual(result['execution_stderr'], "\ufffd")
+
+    def test_run_many_uses_separate_containers_in_order(self):
+        barrier = threading.Barrier(3)
+        def job(host_dir, command, kwargs):
+            barrier.wait(timeout=5) # All three must be in flight at once
+            return 0, kwargs["input"].decode().split("|")[0] + "\n", ""
+        calls, fake_run = self._fake_docker(job=job)
+        snippets = ["first|int main() {}", {"cpp_code": "second|int main() {}", "compiler": "clang++"}, "third|int main() {}"]
+        with self._patch_docker(fake_run), patch("cpp_runner.SANDBOX_MAX_CONTAINERS", 3):
+            cpp_runner._sandbox_slots = threading.BoundedSemaphore(3)
+            results = run_cpp_code_many(snippets, use_cache=False)
+
+        self.assertEqual([result['execution_stdout'] for result in results], ["first\n", "second\n", "third\n"])
+        self.assertEqual([result['compiler_used'] for result in results], ["g++", "clang++", "g++"])
+        exec_commands = [command for command, _ in calls if command[:2] == ["docker", "exec"]]
+        self.assertEqual(len({command[command.index("-w") + 2] for command in exec_commands}), 3)
+        self.assertEqual(cpp_runner._idle_sandboxes.qsize(), 3)
+
+    def test_run_many_waits_for_a_free_container(self):
+        calls, fake_run = self._fake_docker()
+        with self._patch_docker(fake_run), patch("cpp_runner.SANDBOX_MAX_CONTAINERS", 1):
+            cpp_runner._sandbox_slots = threading.BoundedSemaphore(1)
+            results = run_cpp_code_many(["int main() { return 0; }"] * 4, max_parallel=4, use_cache=False)
+
+        self.assertEqual([result['execution_stdout'] for result in results], ["ran\n"] * 4)
+        self.assertEqual(len([command for command, _ in calls if command[:2] == ["docker", "run"]]), 1)
+
+    def test_bwrap_backend(self):
+        calls, fake_run = self._fake_docker()
+        with self._patch_docker(fake_run), patch("cpp_runner.BWRAP_PATH", "/usr/bin/bwrap"):
+            result = run_cpp_code("int main() { return 0; }", backend="bwrap")
+
+        self.assertEqual(result['execution_stdout'], "ran\n")
+        commands = [command for command, _ in calls]
+        self.assertFalse(any(command[0] == "docker" for command in commands)) # No image, no container
+        self.assertEqual(len(commands), 1)
+        command = commands[0]
+        self.assertEqual(command[0], "bwrap")
+        self.assertIn("--unshare-all", command)
+        self.assertEqual(command[command.index("--bind") + 2], cpp_runner.SANDBOX_MOUNT)
+        self.assertTrue(command[command.index("--bind") + 1].startswith(cpp_runner._sandbox_root))
+        self.assertEqual(command[-3:-1], ["sh", "-c"])
+
+    def test_bwrap_backend_falls_back_to_docker(self):
+        calls, fake_run = self._fake_docker()
+        with self._patch_docker(fake_run), patch("cpp_runner.BWRAP_PATH", None):
+            result = run_cpp_code("int main() { return 0; }", backend="bwrap")
+
+        self.assertEqual(result['execution_stdout'], "ran\n")
+        self.assertTrue(any(command[:2] == ["docker", "exec"] for command, _ in calls))
+
+    def test_unsupported_backend(self):
+        result = run_cpp_code("int main() { return 0; }", backend="chroot")
+
+        self.assertEqual(result['compilation_exit_code'], -100)
+        self.assertIn("Unsupported backend: 'chroot'", result['compilation_stderr'])
+        self.assertIsNone(result['execution_exit_code'])
+
+    def test_precheck_rejects_without_docker(self):
+        calls, fake_run = self._fake_docker()
+        with self._patch_docker(fake_run), patch("cpp_runner.MAX_SOURCE_BYTES", 64):
+            no_main = run_cpp_code("int helper() { return 0; }")
+            too_large = run_cpp_code("int main() { return 0; }" + " " * 64)
+            trailing_return = run_cpp_code("auto main() -> int { return 0; }", use_cache=False)
+
+        self.assertEqual(no_main['compilation_exit_code'], 1)
+        self.assertEqual(no_main['compilation_stderr'], "error: no 'main' function")
+        self.assertEqual(too_large['compilation_exit_code'], 1)
+        self.assertIn("exceeds 64 bytes", too_large['compilation_stderr'])
+        self.assertIsNone(too_large['execution_exit_code'])
+        self.assertEqual(trailing_return['compilation_exit_code'], 0)
+        self.assertEqual(len([command for command, _ in calls if command[:2] == ["docker", "exec"]]), 1)
+
+    def test_program_output_is_never_read_as_compile_status(self):
+        calls, fake_run = self._fake_docker(job=lambda host_dir, command, kwargs: (1, "__CC_FAIL__ok\n", ""))
+        with self._patch_docker(fake_run):
+            result = run_cpp_code("int main() { return 1; }")
+
+        self.assertEqual(result['compilation_exit_code'], 0)
+        self.assertEqual(result['execution_stdout'], "__CC_FAIL__ok\n")
+        self.assertEqual(result['execution_exit_code'], 1)
+        self.assertIn("> cc.rc", calls[-1][0][-1])
+
+    def test_compile_failure_status_file(self):
+        def job(host_dir, command, kwargs):
+            with open(os.path.join(host_dir, "cc.err"), "w") as f:
+                f.write("temp_code.cpp:1:1: error: expected unqualified-id\n")
+            with open(os.path.join(host_dir, cpp_runner.COMPILE_STATUS_FILE), "w") as f:
+                f.write("1\n")
+            return 1, "", ""
+        calls, fake_run = self._fake_docker(job=job)
+        with self._patch_docker(fake_run):
+            result = run_cpp_code("int main() { not c++ }")
+
+        self.assertEqual(result['compilation_exit_code'], 1)
+        self.assertIn("error: expected unqualified-id", result['compilation_stderr'])
+        self.assertFalse(result['timed_out_compilation'])
+        self.assertIsNone(result['execution_stdout'])
+        self.assertIsNone(result['execution_exit_code'])
+
+    def test_compilation_timeout_in_container(self):
+        def job(host_dir, command, kwargs):
+            with open(os.path.join(host_dir, "cc.err"), "w") as f:
+                f.write("timeout: sending signal KILL to command 'g++'\n")
+            with open(os.path.join(host_dir, cpp_runner.COMPILE_STATUS_FILE), "w") as f:
+                f.write("137\n")
+            return 137, "", ""
+        calls, fake_run = self._fake_docker(job=job)
+        with self._patch_docker(fake_run):
+            result = run_cpp_code("int main() { return 0; }", compile_timeout=2)
+
+        self.assertTrue(result['timed_out_compilation'])
+        self.assertEqual(result['compilation_exit_code'], -1)
+        self.assertIn("Compilation timed out after 2 seconds.", result['compilation_stderr'])
+        self.assertIsNone(result['execution_exit_code'])
+
+    def test_execution_timeout_in_container_keeps_container(self):
+        def job(host_dir, command, kwargs):
+            return 137, "partial output\n", "timeout: sending signal KILL to command './temp_exec'\n"
+        calls, fake_run = self._fake_docker(job=job)
+        with self._patch_docker(fake_run):
+            result = run_cpp_code("int main() { for (;;) {} }", exec_timeout=1)
+
+        self.assertEqual(result['compilation_exit_code'], 0)
+        self.assertTrue(result['timed_out_execution'])
+        self.assertEqual(result['execution_exit_code'], -1)
+        self.assertIn("Execution timed out after 1 seconds.", result['execution_stderr'])
+        self.assertEqual(cpp_runner._sandbox_containers, {self._container_name(calls)})
+        self.assertEqual(cpp_runner._idle_sandboxes.qsize(), 1)
+
+    def test_truncated_output_discards_container(self):
+        calls, fake_run = self._fake_docker(job=lambda host_dir, command, kwargs: (-9, "y\n" * 8, ""))
+        def fake_run_capped(command, input_bytes, timeout, max_output=cpp_runner.MAX_OUTPUT_BYTES):
+            process = fake_run(command, input=input_bytes, timeout=timeout)
+            return process.returncode, process.stdout, process.stderr, True
+        with patch("cpp_runner.subprocess.run", side_effect=fake_run), patch("cpp_runner._run_capped", side_effect=fake_run_capped):
+            result = run_cpp_code("int main() { for (;;) puts(\"y\"); }")
+            container_name = self._container_name(calls)
+
+        self.assertTrue(result['execution_stderr'].endswith(cpp_runner.OUTPUT_TRUNCATED_NOTICE))
+        self.assertEqual(cpp_runner._sandbox_containers, set())
+        self.assertEqual(cpp_runner._idle_sandboxes.qsize(), 0)
+        self.assertIn(["docker", "rm", "-f", container_name], [command for command, _ in calls])
+
+    def test_backstop_timeout_discards_container(self):
+        def job(host_dir, command, kwargs):
+            open(os.path.join(host_dir, "temp_exec"), "w").close()
+            raise subprocess.TimeoutExpired(command, kwargs["timeout"])
+        calls, fake_run = self._fake_docker(job=job)
+        with self._patch_docker(fake_run):
+            result = run_cpp_code("int main() { for (;;) {} }", exec_timeout=1)
+            container_name = self._container_name(calls)
+
+        self.assertTrue(result['timed_out_execution'])
+        self.assertIn("Execution timed out after 1 seconds.", result['execution_stderr'])
+        self.assertEqual(cpp_runner._sandbox_containers, set())
+        self.assertEqual(cpp_runner._idle_sandboxes.qsize(), 0)
+        self.assertIn(["docker", "rm", "-f", container_name], [command for command, _ in calls])
+
+class TestRunCapped(unittest.TestCase):
+    """Exercises the bounded output reader with real local processes."""
+
+    def test_collects_output_and_feeds_stdin(self):
+        script = "import sys; data = sys.stdin.buffer.read(); sys.stdout.buffer.write(data); sys.stderr.write('done'); sys.exit(3)"
+        payload = os.urandom(300000) # Larger than a pipe buffer in both directions
+        returncode, stdout, stderr, truncated = cpp_runner._run_capped([sys.executable, "-c", script], payload, timeout=30)
+
+        self.assertEqual(returncode, 3)
+        self.assertEqual(stdout, payload)
+        self.assertEqual(stderr, b"done")
+        self.assertFalse(truncated)
+
+    def test_runaway_output_is_truncated_and_killed(self):
+        script = "import sys\nwhile True: sys.stdout.write('x' * 4096)"
+        returncode, stdout, stderr, truncated = cpp_runner._run_capped([sys.executable, "-c", script], b"", timeout=30, max_output=10000)
+
+        self.assertTrue(truncated)
+        self.assertEqual(stdout, b"x" * 10000)
+        self.assertNotEqual(returncode, 0)
+
+    def test_program_not_reading_stdin(self):
+        returncode, stdout, stderr, truncated = cpp_runner._run_capped([sys.executable, "-c", "print('hi')"], b"y" * 1000000, timeout=30)
+
+        self.assertEqual(returncode, 0)
+        self.assertEqual(stdout.strip(), b"hi")
+
+    def test_timeout_kills_process(self):
+        with self.assertRaises(subprocess.TimeoutExpired):
+            cpp_runner._run_capped([sys.executable, "-c", "import time; time.sleep(30)"], b"", timeout=0.5)
+
+    def test_truncated_compiler_output_file(self):
+        with tempfile.NamedTemporaryFile("wb", delete=False) as f:
+            f.write(b"e" * 100)
+        self.addCleanup(os.unlink, f.name)
+
+        self.assertEqual(cpp_runner._read_text(f.name, limit=10), "e" * 10 + cpp_runner.OUTPUT_TRUNCATED_NOTICE)
+        self.assertEqual(cpp_runner._read_text(f.name, limit=100), "e" * 100)
+
 if __name__ == '__main__':
     print("Running cpp_runner tests...")
     print("IMPORTANT: Docker must be installed, running, and the user must have permissions to use it.")
     # Updated to reflect the change in cpp_runner.py for DOCKER_IMAGE
-    print(f"These tests will use the Docker image specified in cpp_runner.py (currently: ubuntu:22.04).")
-    print("If tests fail, check Docker installation and image availability (e.g., `docker pull ubuntu:22.04`).")
+    print(f"These tests will use the Docker image specified in cpp_runner.py (currently: {cpp_runner.DOCKER_IMAGE}).")
+    print(f"It is built from {cpp_runner.BASE_IMAGE} on first use if missing; if tests fail, check Docker installation and that the base image is pullable.")
     unittest.main()
-```
@@ -3,10 +3,18 @@ from unittest.mock import patch, MagicMock, call
 import subprocess # To reference subprocess.CompletedProcess
 
 # Assuming go_runner.py is in the same directory or accessible via PYTHONPATH
+import go_runner
 from go_runner import run_go_code 
 
 class TestGoRunner(unittest.TestCase):
 
+    def setUp(self):
+        # Each test starts with an empty container pool.
+        go_runner._idle_go_sandboxes.clear()
+        go_runner._go_sandboxes.clear()
+        self.addCleanup(go_runner._idle_go_sandboxes.clear)
+        self.addCleanup(go_runner._go_sandboxes.clear)
+
     def assertDockerCommand(self, mock_execute, expected_partial_command, call_index=-1):
         """Helper to assert that a docker command was called (similar to test_python_runner)."""
         self.assertTrue(mock_execute.call_count > 0, "Expected _execute_command_for_go to be called.")
@@ -23,14 +31,19 @@ class TestGoRunner(unittest.TestCase):
     @patch('go_runner._execute_command_for_go')
     def test_simple_go_code_success(self, mock_execute_command_for_go):
         print("\nRunning: test_simple_go_code_success (Go Runner)")
-        mock_build_process = MagicMock(spec=subprocess.CompletedProcess, returncode=0, stdout="Successfully built Go image", stderr="")
+        mock_start_process = MagicMock(spec=subprocess.CompletedProcess, returncode=0, stdout="container-id", stderr="")
+        mock_build_process = MagicMock(spec=subprocess.CompletedProcess, returncode=0, stdout="", stderr="")
         mock_run_process = MagicMock(spec=subprocess.CompletedProcess, returncode=0, stdout="Hello from Go!", stderr="")
-        mock_rmi_process = MagicMock(spec=subprocess.CompletedProcess, returncode=0)
+        mock_kill_process = MagicMock(spec=subprocess.CompletedProcess, returncode=0, stdout="", stderr="")
 
         mock_execute_command_for_go.side_effect = [
-            (mock_build_process, False), # (result, timed_out)
+            (mock_start_process, False), # (result, timed_out)
+            (mock_build_process, False),
+            (mock_run_process, False),
+            (mock_kill_process, False),
+            (mock_build_process, False), # Second call reuses the container
             (mock_run_process, False),
-            (mock_rmi_process, False) 
+            (mock_kill_process, False)
         ]
 
         go_code = """
@@ -46,23 +59,38 @@ func main() { fmt.Println("Hello from Go!") }
         self.assertFalse(result['timed_out'])
         self.assertIsNone(result['error'])
         
-        self.assertEqual(mock_execute_command_for_go.call_count, 3)
-        self.assertDockerCommand(mock_execute_command_for_go, ["docker", "build"], call_index=0)
-        self.assertDockerCommand(mock_execute_command_for_go, ["docker", "run", "--rm"], call_index=1)
-        self.assertDockerCommand(mock_execute_command_for_go, ["docker", "rmi", "-f"], call_index=2)
+        self.assertEqual(mock_execute_command_for_go.call_count, 4)
+        self.assertDockerCommand(mock_execute_command_for_go, ["docker", "run", "-d", "--rm"], call_index=0)
+        self.assertDockerCommand(mock_execute_command_for_go, ["--read-only"], call_index=0)
+        self.assertDockerCommand(mock_execute_command_for_go, ["sleep", "infinity"], call_index=0)
+        self.assertDockerCommand(mock_execute_command_for_go, ["docker", "exec", "-i"], call_index=1)
+        self.assertEqual(mock_execute_command_for_go.call_args_list[1][1]["input"], go_code)
+        container_name = mock_execute_command_for_go.call_args_list[1][0][0][3]
+        self.assertTrue(container_name.startswith(go_runner.GO_SANDBOX_PREFIX))
+        self.assertDockerCommand(mock_execute_command_for_go, ["-u", go_runner.GO_SANDBOX_USER, container_name, "./main"], call_index=2)
+
+        second = run_go_code(go_code, timeout=10)
+
+        self.assertEqual(second['stdout'], "Hello from Go!")
+        self.assertEqual(mock_execute_command_for_go.call_count, 7)
+        self.assertDockerCommand(mock_execute_command_for_go, ["docker", "exec", "-i", container_name], call_index=4)
+        self.assertEqual(list(go_runner._idle_go_sandboxes.values())[0].qsize(), 1)
 
     @patch('go_runner._execute_command_for_go')
     def test_go_code_runtime_error_panic(self, mock_execute_command_for_go):
         print("\nRunning: test_go_code_runtime_error_panic")
-        mock_build_process = MagicMock(returncode=0, stdout="Built Go", stderr="")
+        mock_start_process = MagicMock(returncode=0, stdout="container-id", stderr="")
+        mock_build_process = MagicMock(returncode=0, stdout="", stderr="")
         # Go panics often print to stderr and result in a non-zero exit code (e.g., 2 for panic)
         mock_run_process = MagicMock(returncode=2, stdout="", stderr="panic: test panic\n...stacktrace...")
-        mock_rmi_process = MagicMock(returncode=0)
+
+        mock_kill_process = MagicMock(returncode=0, stdout="", stderr="")
 
         mock_execute_command_for_go.side_effect = [
+            (mock_start_process, False),
             (mock_build_process, False),
             (mock_run_process, False),
-            (mock_rmi_process, False)
+            (mock_kill_process, False)
         ]
         
         go_code = "package main\nfunc main() { panic(\"test panic\") }"
@@ -74,22 +102,82 @@ func main() { fmt.Println("Hello from Go!") }
         self.assertFalse(result['timed_out'])
         self.assertIsNone(result['error'])
 
+    @patch('go_runner._execute_command_for_go')
+    def test_background_processes_killed_before_container_reused(self, mock_execute_command_for_go):
+        print("\nRunning: test_background_processes_killed_before_container_reused")
+        mock_start_process = MagicMock(returncode=0, stdout="container-id", stderr="")
+        mock_build_process = MagicMock(returncode=0, stdout="", stderr="")
+        mock_run_process = MagicMock(returncode=0, stdout="", stderr="")
+        mock_kill_process = MagicMock(returncode=0, stdout="", stderr="")
+        idle_when_killed = []
+
+        def execute(command_args, **kwargs):
+            if command_args[:2] == ["docker", "run"]:
+                return mock_start_process, False
+            if "-i" in command_args:
+                return mock_build_process, False
+            if command_args[-1] == "./main":
+                return mock_run_process, False
+            idle_when_killed.append(sum(idle.qsize() for idle in go_runner._idle_go_sandboxes.values()))
+            return mock_kill_process, False
+
+        mock_execute_command_for_go.side_effect = execute
+
+        # The program leaves a child running in the background after main returns.
+        go_code = "package main\nimport \"os/exec\"\nfunc main() { exec.Command(\"sleep\", \"1000\").Start() }"
+        result = run_go_code(go_code, timeout=10)
+
+        self.assertEqual(result['exit_code'], 0)
+        container_name = mock_execute_command_for_go.call_args_list[1][0][0][3]
+        self.assertEqual(mock_execute_command_for_go.call_args_list[3][0][0],
+                         ["docker", "exec", "-u", go_runner.GO_SANDBOX_USER, container_name,
+                          "sh", "-c", go_runner.GO_SANDBOX_KILL_SCRIPT])
+        # The kill runs while the container is still checked out, before the next job can take it.
+        self.assertEqual(idle_when_killed, [0])
+        self.assertEqual(list(go_runner._idle_go_sandboxes.values())[0].qsize(), 1)
+
+    @patch('go_runner._execute_command_for_go')
+    def test_failed_kill_discards_container(self, mock_execute_command_for_go):
+        print("\nRunning: test_failed_kill_discards_container")
+        mock_start_process = MagicMock(returncode=0, stdout="container-id", stderr="")
+        mock_build_process = MagicMock(returncode=0, stdout="", stderr="")
+        mock_run_process = MagicMock(returncode=0, stdout="ok", stderr="")
+        mock_kill_process = MagicMock(returncode=1, stdout="", stderr="Error response from daemon: container is not running")
+        mock_rm_process = MagicMock(returncode=0)
+
+        mock_execute_command_for_go.side_effect = [
+            (mock_start_process, False),
+            (mock_build_process, False),
+            (mock_run_process, False),
+            (mock_kill_process, False),
+            (mock_rm_process, False)
+        ]
+
+        result = run_go_code("package main\nfunc main() {}", timeout=10)
+
+        self.assertEqual(result['stdout'], "ok")
+        self.assertDockerCommand(mock_execute_command_for_go, ["docker", "rm", "-f"], call_index=4)
+        self.assertEqual(go_runner._go_sandboxes, set())
+        self.assertEqual(list(go_runner._idle_go_sandboxes.values())[0].qsize(), 0)
+
     @patch('go_runner._execute_command_for_go')
     def test_go_execution_timeout(self, mock_execute_command_for_go):
         print("\nRunning: test_go_execution_timeout")
-        mock_build_process = MagicMock(returncode=0, stdout="Built Go", stderr="")
+        mock_start_process = MagicMock(returncode=0, stdout="container-id", stderr="")
+        mock_build_process = MagicMock(returncode=0, stdout="", stderr="")
         mock_run_timeout_stdout = "Partial output before Go timeout"
         mock_run_timeout_stderr = "Some Go stderr before timeout"
         mock_run_process_timeout_obj = MagicMock(spec=subprocess.CompletedProcess, 
                                                  returncode=-1, # Or 137
                                                  stdout=mock_run_timeout_stdout, 
                                                  stderr=mock_run_timeout_stderr)
-        mock_rmi_process = MagicMock(returncode=0)
+        mock_rm_process = MagicMock(returncode=0)
 
         mock_execute_command_for_go.side_effect = [
+            (mock_start_process, False),
             (mock_build_process, False),
-            (mock_run_process_timeout_obj, True), # Docker run times out
-            (mock_rmi_process, False)
+            (mock_run_process_timeout_obj, True), # docker exec times out
+            (mock_rm_process, False)
         ]
 
         go_code = "package main\nimport \"time\"; func main() { time.Sleep(5 * time.Second) }"
@@ -99,6 +187,9 @@ func main() { fmt.Println("Hello from Go!") }
         self.assertEqual(result['stdout'], mock_run_timeout_stdout)
         self.assertIn("Execution timed out after 1 seconds.", result['stderr'])
         self.assertIsNone(result['error'])
+        # The program may still be running, so the container is removed rather than reused.
+        self.assertDockerCommand(mock_execute_command_for_go, ["docker", "rm", "-f"], call_index=3)
+        self.assertEqual(go_runner._go_sandboxes, set())
 
     @patch('go_runner._execute_command_for_go')
     def test_go_docker_build_fails(self, mock_execute_command_for_go):
@@ -110,19 +201,25 @@ func main() { fmt.Println("Hello from Go!") }
                                             stdout=mock_build_fail_stdout, 
                                             stderr=mock_build_fail_stderr)
         
+        mock_start_process = MagicMock(spec=subprocess.CompletedProcess, returncode=0, stdout="container-id", stderr="")
+        
         mock_execute_command_for_go.side_effect = [
+            (mock_start_process, False),
             (mock_build_process_fail, False) 
         ]
 
         result = run_go_code("package main\nfunc main() { var x int = \"string\" }", timeout=10) # Compilation error
 
         self.assertIsNotNone(result['error'])
-        self.assertIn("Docker image build for Go failed", result['error'])
+        self.assertIn("Go build failed", result['error'])
         self.assertIn(mock_build_fail_stderr, result['stderr'])
         self.assertEqual(result['exit_code'], 1)
         self.assertFalse(result['timed_out'])
-        self.assertEqual(mock_execute_command_for_go.call_count, 1)
-        self.assertDockerCommand(mock_execute_command_for_go, ["docker", "build"], call_index=0)
+        self.assertEqual(mock_execute_command_for_go.call_count, 2)
+        self.assertDockerCommand(mock_execute_command_for_go, ["docker", "exec", "-i"], call_index=1)
+        self.assertIn("go build -o main main.go", mock_execute_command_for_go.call_args_list[1][0][0][-1])
+        # A compilation error doesn't affect the container, so it goes back to the pool.
+        self.assertEqual(list(go_runner._idle_go_sandboxes.values())[0].qsize(), 1)
 
     @patch('go_runner._execute_command_for_go')
     def test_go_docker_command_not_found(self, mock_execute_command_for_go):
@@ -134,16 +231,18 @@ func main() { fmt.Println("Hello from Go!") }
                                        stderr=mock_build_fnf_stderr)
         
         mock_execute_command_for_go.side_effect = [
-             (mock_build_fnf_obj, False)
+             (mock_build_fnf_obj, False), # docker run
+             (mock_build_fnf_obj, False)  # docker rm -f of the container that didn't start
         ]
 
         result = run_go_code("package main", timeout=10)
 
         self.assertIsNotNone(result['error'])
-        self.assertIn("Docker image build for Go failed", result['error']) 
+        self.assertIn("Failed to start Go sandbox container", result['error']) 
         self.assertIn(mock_build_fnf_stderr, result['stderr'])
         self.assertFalse(result['timed_out'])
-        self.assertEqual(mock_execute_command_for_go.call_count, 1)
+        self.assertEqual(mock_execute_command_for_go.call_count, 2)
+        self.assertEqual(go_runner._go_sandboxes, set())
 
 if __name__ == '__main__':
     unittest.main()
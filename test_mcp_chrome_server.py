@@ -59,9 +59,9 @@ class TestChromeMCPServerIntegration(unittest.IsolatedAsyncioTestCase):
         # This is based on how FastMCP handles specific return types like mcp.server.fastmcp.Image
         self.assertIsInstance(tool_result.content, types.Image, f"Expected content to be mcp.types.Image, got {type(tool_result.content)}")
         if isinstance(tool_result.content, types.Image): # Redundant due to assertIsInstance, but good for type checker
-            self.assertEqual(tool_result.content.format, "png", "Image format should be PNG.")
+            self.assertEqual(tool_result.content.format, "jpeg", "Image format should default to JPEG.")
             self.assertIsInstance(tool_result.content.data, bytes, "Image data should be bytes.")
-            self.assertTrue(len(tool_result.content.data) > 100, "Image data seems too small for a PNG.")
+            self.assertTrue(len(tool_result.content.data) > 100, "Image data seems too small for a JPEG.")
 
     async def test_capture_with_custom_dimensions(self):
         """Tests successful screenshot capture with custom dimensions."""
@@ -76,7 +76,7 @@ class TestChromeMCPServerIntegration(unittest.IsolatedAsyncioTestCase):
         
         self.assertIsInstance(tool_result.content, types.Image, f"Expected content to be mcp.types.Image, got {type(tool_result.content)}")
         if isinstance(tool_result.content, types.Image):
-            self.assertEqual(tool_result.content.format, "png")
+            self.assertEqual(tool_result.content.format, "jpeg")
             self.assertIsInstance(tool_result.content.data, bytes)
             self.assertTrue(len(tool_result.content.data) > 100) 
             # Note: Verifying the actual dimensions of the image would require an image library.
@@ -131,4 +131,3 @@ if __name__ == '__main__':
             sys.exit(1) # Exit with error
 
     unittest.main()
-```
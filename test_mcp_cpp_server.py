@@ -205,4 +205,3 @@ if __name__ == '__main__':
             sys.exit(1)
 
     unittest.main()
-```
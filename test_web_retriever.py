@@ -1,9 +1,13 @@
 import asyncio
+import json
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, AsyncMock, MagicMock 
 
 # Assuming web_retriever.py is in the same directory or accessible via PYTHONPATH
 try:
+    import web_retriever
     from web_retriever import get_web_content, create_vector_store_from_url
     # Specific LangChain component imports for type hinting and mocking if necessary
     from langchain_community.vectorstores import FAISS as LangchainFAISS 
@@ -14,6 +18,7 @@ except ImportError:
     import sys
     import os
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    import web_retriever
     from web_retriever import get_web_content, create_vector_store_from_url
     from langchain_community.vectorstores import FAISS as LangchainFAISS
     from langchain_core.documents import Document
@@ -99,6 +104,34 @@ class TestGetWebContent(unittest.IsolatedAsyncioTestCase):
         # print(f"Content from minimal HTML data URI: '{content}'")
 
 
+class TestGetWebContentPooledClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncTearDown(self):
+        await web_retriever.close_http_client()
+
+    @unittest.skipIf(web_retriever.httpx is None, "httpx is not installed")
+    async def test_fetches_share_one_client_and_extract_text(self):
+        print("\nRunning: test_fetches_share_one_client_and_extract_text")
+        mock_response = MagicMock(text="<html><body><p>Pooled page</p></body></html>")
+        first_client = web_retriever._get_http_client()
+        with patch.object(first_client, 'get', new_callable=AsyncMock, return_value=mock_response) as mock_get:
+            first = await get_web_content("https://example.com/a")
+            second = await get_web_content("https://example.com/b")
+
+        self.assertEqual(first, "Pooled page")
+        self.assertEqual(second, "Pooled page")
+        self.assertEqual(mock_get.await_count, 2)
+        self.assertIs(web_retriever._get_http_client(), first_client)
+
+    @unittest.skipIf(web_retriever.httpx is None, "httpx is not installed")
+    async def test_client_identifies_itself(self):
+        print("\nRunning: test_client_identifies_itself")
+        await web_retriever.close_http_client() # drop any client created by an earlier test
+        with patch.dict(os.environ, {"USER_AGENT": "DeepBlueTest/2.0"}):
+            client = web_retriever._get_http_client()
+        self.assertEqual(client.headers["user-agent"], "DeepBlueTest/2.0")
+
+
 class TestCreateVectorStoreFromURL(unittest.IsolatedAsyncioTestCase):
 
     DUMMY_URL = "http://dummyurl.com"
@@ -106,35 +139,41 @@ class TestCreateVectorStoreFromURL(unittest.IsolatedAsyncioTestCase):
     MOCK_HTML_CONTENT = "<html><body>Mocked web content. This is a test page. It has some text.</body></html>"
     MOCK_ERROR_HTML_CONTENT_RETRIEVAL = "Error: Could not retrieve content from URL."
 
-    @patch('web_retriever.FAISS.afrom_documents', new_callable=AsyncMock)
+    def setUp(self):
+        # Each test patches OpenAIEmbeddings, so don't hand out an instance cached by another test.
+        web_retriever._get_embeddings_model.cache_clear()
+        self.addCleanup(web_retriever._get_embeddings_model.cache_clear)
+
+    @patch('web_retriever.FAISS.from_embeddings')
     @patch('web_retriever.OpenAIEmbeddings') # Patch the class
-    @patch('web_retriever.RecursiveCharacterTextSplitter.acreate_documents', new_callable=AsyncMock)
+    @patch('web_retriever.RecursiveCharacterTextSplitter.create_documents')
     @patch('web_retriever.get_web_content', new_callable=AsyncMock)
     async def test_successful_vector_store_creation(
         self, 
         mock_get_web_content, 
-        mock_acreate_documents,
+        mock_create_documents,
         mock_openai_embeddings_class, 
-        mock_faiss_afrom_documents
+        mock_faiss_from_embeddings
     ):
         print("\nRunning: test_successful_vector_store_creation")
         # --- Setup Mocks ---
         mock_get_web_content.return_value = self.MOCK_HTML_CONTENT
         
-        # Mock RecursiveCharacterTextSplitter().acreate_documents()
+        # Mock RecursiveCharacterTextSplitter().create_documents()
         mock_split_docs = [Document(page_content="Mocked web content.", metadata={"start_index": 0}), 
                            Document(page_content="This is a test page.", metadata={"start_index": 20}),
                            Document(page_content="It has some text.", metadata={"start_index": 40})]
-        mock_acreate_documents.return_value = mock_split_docs
+        mock_create_documents.return_value = mock_split_docs
 
         # Mock OpenAIEmbeddings instance
         mock_embeddings_instance = MagicMock(spec=OpenAIEmbeddings)
+        mock_embeddings_instance.aembed_documents = AsyncMock(return_value=[[1.0, 0.0], [0.0, 1.0], [-1.0, 0.0]])
         mock_openai_embeddings_class.return_value = mock_embeddings_instance
 
-        # Mock FAISS.afrom_documents to return a mock FAISS store
+        # Mock FAISS.from_embeddings to return a mock FAISS store
         mock_faiss_store_instance = AsyncMock(spec=LangchainFAISS)
         mock_faiss_store_instance.asimilarity_search = AsyncMock(return_value=[Document(page_content="Mocked web content.")])
-        mock_faiss_afrom_documents.return_value = mock_faiss_store_instance
+        mock_faiss_from_embeddings.return_value = mock_faiss_store_instance
 
         # --- Call the function ---
         vector_store = await create_vector_store_from_url(self.DUMMY_URL, self.DUMMY_API_KEY)
@@ -146,11 +185,17 @@ class TestCreateVectorStoreFromURL(unittest.IsolatedAsyncioTestCase):
         mock_get_web_content.assert_called_once_with(self.DUMMY_URL)
         
         # Assert RecursiveCharacterTextSplitter was initialized and used
-        # Harder to assert constructor directly, but acreate_documents call implies it was.
-        mock_acreate_documents.assert_called_once_with([self.MOCK_HTML_CONTENT])
+        # Harder to assert constructor directly, but create_documents call implies it was.
+        mock_create_documents.assert_called_once_with([self.MOCK_HTML_CONTENT])
         
-        mock_openai_embeddings_class.assert_called_once_with(openai_api_key=self.DUMMY_API_KEY)
-        mock_faiss_afrom_documents.assert_called_once_with(mock_split_docs, mock_embeddings_instance)
+        mock_openai_embeddings_class.assert_called_once_with(openai_api_key=self.DUMMY_API_KEY, request_timeout=30, max_retries=3)
+        mock_embeddings_instance.aembed_documents.assert_awaited_once_with([doc.page_content for doc in mock_split_docs])
+        mock_faiss_from_embeddings.assert_called_once_with(
+            [("Mocked web content.", [1.0, 0.0]), ("This is a test page.", [0.0, 1.0]), ("It has some text.", [-1.0, 0.0])],
+            mock_embeddings_instance,
+            metadatas=[doc.metadata for doc in mock_split_docs],
+            **web_retriever._FAISS_STORE_KWARGS,
+        )
         
         # Test similarity search on the returned (mocked) store
         query = "What is this page about?"
@@ -167,7 +212,7 @@ class TestCreateVectorStoreFromURL(unittest.IsolatedAsyncioTestCase):
         mock_get_web_content.return_value = self.MOCK_ERROR_HTML_CONTENT_RETRIEVAL
         
         with patch('web_retriever.OpenAIEmbeddings') as mock_embeddings, \
-             patch('web_retriever.FAISS.afrom_documents') as mock_faiss:
+             patch('web_retriever.FAISS.from_embeddings') as mock_faiss:
             vector_store = await create_vector_store_from_url(self.DUMMY_URL, self.DUMMY_API_KEY)
             
             self.assertIsNone(vector_store, "Vector store should be None if get_web_content fails.")
@@ -181,9 +226,9 @@ class TestCreateVectorStoreFromURL(unittest.IsolatedAsyncioTestCase):
         print("\nRunning: test_get_web_content_returns_empty_string")
         mock_get_web_content.return_value = "" # Empty string
         
-        with patch('web_retriever.RecursiveCharacterTextSplitter.acreate_documents') as mock_splitter, \
+        with patch('web_retriever.RecursiveCharacterTextSplitter.create_documents') as mock_splitter, \
              patch('web_retriever.OpenAIEmbeddings') as mock_embeddings, \
-             patch('web_retriever.FAISS.afrom_documents') as mock_faiss:
+             patch('web_retriever.FAISS.from_embeddings') as mock_faiss:
             vector_store = await create_vector_store_from_url(self.DUMMY_URL, self.DUMMY_API_KEY)
             
             self.assertIsNone(vector_store, "Vector store should be None for empty content.")
@@ -198,9 +243,9 @@ class TestCreateVectorStoreFromURL(unittest.IsolatedAsyncioTestCase):
         print("\nRunning: test_get_web_content_returns_whitespace_string")
         mock_get_web_content.return_value = "   \n\t   " # Whitespace only
         
-        with patch('web_retriever.RecursiveCharacterTextSplitter.acreate_documents') as mock_splitter, \
+        with patch('web_retriever.RecursiveCharacterTextSplitter.create_documents') as mock_splitter, \
              patch('web_retriever.OpenAIEmbeddings') as mock_embeddings, \
-             patch('web_retriever.FAISS.afrom_documents') as mock_faiss:
+             patch('web_retriever.FAISS.from_embeddings') as mock_faiss:
             vector_store = await create_vector_store_from_url(self.DUMMY_URL, self.DUMMY_API_KEY)
             
             self.assertIsNone(vector_store, "Vector store should be None for whitespace content.")
@@ -211,75 +256,440 @@ class TestCreateVectorStoreFromURL(unittest.IsolatedAsyncioTestCase):
         print("Whitespace web content test passed.")
 
     @patch('web_retriever.get_web_content', new_callable=AsyncMock)
-    @patch('web_retriever.RecursiveCharacterTextSplitter.acreate_documents', new_callable=AsyncMock)
-    async def test_text_splitting_yields_no_documents(self, mock_acreate_documents, mock_get_web_content):
+    @patch('web_retriever.RecursiveCharacterTextSplitter.create_documents')
+    async def test_text_splitting_yields_no_documents(self, mock_create_documents, mock_get_web_content):
         print("\nRunning: test_text_splitting_yields_no_documents")
         mock_get_web_content.return_value = self.MOCK_HTML_CONTENT
-        mock_acreate_documents.return_value = [] # Text splitter returns no docs
+        mock_create_documents.return_value = [] # Text splitter returns no docs
         
         with patch('web_retriever.OpenAIEmbeddings') as mock_embeddings, \
-             patch('web_retriever.FAISS.afrom_documents') as mock_faiss:
+             patch('web_retriever.FAISS.from_embeddings') as mock_faiss:
             vector_store = await create_vector_store_from_url(self.DUMMY_URL, self.DUMMY_API_KEY)
             
             self.assertIsNone(vector_store, "Vector store should be None if splitting yields no documents.")
             mock_get_web_content.assert_called_once_with(self.DUMMY_URL)
-            mock_acreate_documents.assert_called_once()
+            mock_create_documents.assert_called_once()
             mock_embeddings.assert_not_called() # Should not proceed to embeddings
             mock_faiss.assert_not_called()
         print("No documents after text splitting test passed.")
 
     @patch('web_retriever.get_web_content', new_callable=AsyncMock)
-    @patch('web_retriever.RecursiveCharacterTextSplitter.acreate_documents', new_callable=AsyncMock)
+    @patch('web_retriever.RecursiveCharacterTextSplitter.create_documents')
     @patch('web_retriever.OpenAIEmbeddings', side_effect=ValueError("Mocked OpenAI API Key Error"))
     async def test_openai_embeddings_initialization_raises_exception(
         self, 
         mock_openai_embeddings_class_with_error, 
-        mock_acreate_documents,
+        mock_create_documents,
         mock_get_web_content
     ):
         print("\nRunning: test_openai_embeddings_initialization_raises_exception")
         mock_get_web_content.return_value = self.MOCK_HTML_CONTENT
-        mock_acreate_documents.return_value = [Document(page_content="doc1")] # Assume splitting works
+        mock_create_documents.return_value = [Document(page_content="doc1")] # Assume splitting works
 
-        with patch('web_retriever.FAISS.afrom_documents') as mock_faiss:
+        with patch('web_retriever.FAISS.from_embeddings') as mock_faiss:
             vector_store = await create_vector_store_from_url(self.DUMMY_URL, self.DUMMY_API_KEY)
             
             self.assertIsNone(vector_store, "Vector store should be None if OpenAIEmbeddings init fails.")
             mock_get_web_content.assert_called_once()
-            mock_acreate_documents.assert_called_once()
-            mock_openai_embeddings_class_with_error.assert_called_once_with(openai_api_key=self.DUMMY_API_KEY)
+            mock_create_documents.assert_called_once()
+            mock_openai_embeddings_class_with_error.assert_called_once_with(openai_api_key=self.DUMMY_API_KEY, request_timeout=30, max_retries=3)
             mock_faiss.assert_not_called()
         print("OpenAIEmbeddings initialization failure test passed.")
 
     @patch('web_retriever.get_web_content', new_callable=AsyncMock)
-    @patch('web_retriever.RecursiveCharacterTextSplitter.acreate_documents', new_callable=AsyncMock)
+    @patch('web_retriever.RecursiveCharacterTextSplitter.create_documents')
     @patch('web_retriever.OpenAIEmbeddings')
-    @patch('web_retriever.FAISS.afrom_documents', new_callable=AsyncMock, side_effect=Exception("Mocked FAISS Creation Error"))
-    async def test_faiss_afrom_documents_raises_exception(
+    @patch('web_retriever.FAISS.from_embeddings', side_effect=Exception("Mocked FAISS Creation Error"))
+    async def test_faiss_from_embeddings_raises_exception(
         self, 
-        mock_faiss_afrom_documents_with_error, 
+        mock_faiss_from_embeddings_with_error, 
         mock_openai_embeddings_class,
-        mock_acreate_documents, 
+        mock_create_documents, 
         mock_get_web_content
     ):
-        print("\nRunning: test_faiss_afrom_documents_raises_exception")
+        print("\nRunning: test_faiss_from_embeddings_raises_exception")
         mock_get_web_content.return_value = self.MOCK_HTML_CONTENT
-        mock_acreate_documents.return_value = [Document(page_content="doc1")]
+        mock_create_documents.return_value = [Document(page_content="doc1")]
         
         mock_embeddings_instance = MagicMock(spec=OpenAIEmbeddings)
+        mock_embeddings_instance.aembed_documents = AsyncMock(return_value=[[1.0, 0.0]])
         mock_openai_embeddings_class.return_value = mock_embeddings_instance
 
         vector_store = await create_vector_store_from_url(self.DUMMY_URL, self.DUMMY_API_KEY)
         
-        self.assertIsNone(vector_store, "Vector store should be None if FAISS.afrom_documents fails.")
+        self.assertIsNone(vector_store, "Vector store should be None if FAISS.from_embeddings fails.")
         mock_get_web_content.assert_called_once()
-        mock_acreate_documents.assert_called_once()
-        mock_openai_embeddings_class.assert_called_once_with(openai_api_key=self.DUMMY_API_KEY)
-        mock_faiss_afrom_documents_with_error.assert_called_once_with(
-            [Document(page_content="doc1")], 
-            mock_embeddings_instance
+        mock_create_documents.assert_called_once()
+        mock_openai_embeddings_class.assert_called_once_with(openai_api_key=self.DUMMY_API_KEY, request_timeout=30, max_retries=3)
+        mock_faiss_from_embeddings_with_error.assert_called_once_with(
+            [("doc1", [1.0, 0.0])],
+            mock_embeddings_instance,
+            metadatas=[{}],
+            **web_retriever._FAISS_STORE_KWARGS,
+        )
+        print("FAISS.from_embeddings failure test passed.")
+
+    @patch('web_retriever.FAISS.from_embeddings')
+    @patch('web_retriever.OpenAIEmbeddings')
+    @patch('web_retriever.RecursiveCharacterTextSplitter.create_documents', return_value=[Document(page_content="doc1")])
+    @patch('web_retriever.get_web_content', new_callable=AsyncMock)
+    async def test_embeddings_model_is_reused_across_builds(
+        self, mock_get_web_content, mock_create_documents, mock_openai_embeddings_class, mock_faiss_from_embeddings
+    ):
+        print("\nRunning: test_embeddings_model_is_reused_across_builds")
+        mock_get_web_content.return_value = self.MOCK_HTML_CONTENT
+        mock_openai_embeddings_class.return_value.aembed_documents = AsyncMock(return_value=[[0.1]])
+
+        await create_vector_store_from_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+        await create_vector_store_from_url("http://otherurl.com", self.DUMMY_API_KEY)
+
+        mock_openai_embeddings_class.assert_called_once_with(openai_api_key=self.DUMMY_API_KEY, request_timeout=30, max_retries=3)
+        self.assertEqual(mock_faiss_from_embeddings.call_count, 2)
+
+
+class TestEmbedAll(unittest.IsolatedAsyncioTestCase):
+
+    async def test_batches_run_concurrently_and_keep_order(self):
+        print("\nRunning: test_batches_run_concurrently_and_keep_order")
+        in_flight = 0
+        max_in_flight = 0
+
+        async def fake_aembed_documents(batch):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return [[float(text)] for text in batch]
+
+        embedder = MagicMock(spec=OpenAIEmbeddings)
+        embedder.aembed_documents = AsyncMock(side_effect=fake_aembed_documents)
+        texts = [str(i) for i in range(10)]
+
+        vectors = await web_retriever._embed_all(texts, embedder, batch_size=2, concurrency=3)
+
+        self.assertEqual(vectors, [[float(i)] for i in range(10)])
+        self.assertEqual(embedder.aembed_documents.await_count, 5)
+        self.assertEqual(max_in_flight, 3)
+
+
+class TestBuildFaissStore(unittest.TestCase):
+
+    TEXTS = ["alpha", "beta", "gamma", "delta"]
+    VECTORS = [[2.0, 0.0], [0.0, 3.0], [-1.0, 0.0], [0.0, -0.5]] # deliberately not unit length
+    METADATAS = [{"start_index": i} for i in range(4)]
+
+    def test_small_pages_use_exact_inner_product_index(self):
+        print("\nRunning: test_small_pages_use_exact_inner_product_index")
+        store = web_retriever._build_faiss_store(self.TEXTS, self.VECTORS, self.METADATAS, MagicMock(spec=OpenAIEmbeddings))
+
+        self.assertIsInstance(store.index, web_retriever.faiss.IndexFlatIP)
+        # Stored vectors were normalized, so a unit query scores its cosine similarity.
+        (top_doc, score), = store.similarity_search_with_score_by_vector([1.0, 0.0], k=1)
+        self.assertEqual(top_doc.page_content, "alpha")
+        self.assertAlmostEqual(score, 1.0, places=5)
+
+    @patch('web_retriever.HNSW_MIN_CHUNKS', 2)
+    def test_large_pages_use_quantized_hnsw_index(self):
+        print("\nRunning: test_large_pages_use_quantized_hnsw_index")
+        store = web_retriever._build_faiss_store(self.TEXTS, self.VECTORS, self.METADATAS, MagicMock(spec=OpenAIEmbeddings))
+
+        self.assertIsInstance(store.index, web_retriever.faiss.IndexHNSWSQ)
+        self.assertEqual(store.index.metric_type, web_retriever.faiss.METRIC_INNER_PRODUCT)
+        self.assertEqual(store.index.hnsw.efSearch, web_retriever.HNSW_EF_SEARCH)
+        self.assertEqual(store.index.ntotal, 4)
+        top_doc = store.similarity_search_by_vector([0.1, 0.9], k=1)[0]
+        self.assertEqual((top_doc.page_content, top_doc.metadata), ("beta", {"start_index": 1}))
+
+
+class TestEmbedQueries(unittest.IsolatedAsyncioTestCase):
+
+    async def test_query_embeddings_are_unit_length_and_batched(self):
+        print("\nRunning: test_query_embeddings_are_unit_length_and_batched")
+        vector_store = MagicMock()
+        vector_store.embeddings.aembed_documents = AsyncMock(return_value=[[3.0, 4.0], [0.0, 2.0]])
+
+        query_embeddings = await web_retriever.embed_queries(vector_store, ["what is this?", "how?"])
+
+        self.assertEqual([[round(x, 5) for x in e] for e in query_embeddings], [[0.6, 0.8], [0.0, 1.0]])
+        vector_store.embeddings.aembed_documents.assert_awaited_once_with(["what is this?", "how?"])
+
+
+class TestSearchVectorStore(unittest.IsolatedAsyncioTestCase):
+
+    async def test_all_queries_are_answered_by_one_index_search(self):
+        print("\nRunning: test_all_queries_are_answered_by_one_index_search")
+        store = web_retriever._build_faiss_store(
+            TestBuildFaissStore.TEXTS, TestBuildFaissStore.VECTORS, TestBuildFaissStore.METADATAS,
+            MagicMock(spec=OpenAIEmbeddings),
+        )
+        real_search = store.index.search
+        with patch.object(store, 'index', MagicMock(ntotal=store.index.ntotal, search=MagicMock(side_effect=real_search))):
+            results = await web_retriever.search_vector_store(store, [[1.0, 0.0], [0.0, 1.0]], 2)
+            store.index.search.assert_called_once()
+
+        self.assertEqual([[doc.page_content for doc in docs] for docs in results], [["alpha", "beta"], ["beta", "alpha"]])
+        self.assertEqual(results[1][0].metadata, {"start_index": 1})
+
+    async def test_k_larger_than_the_store_returns_what_exists(self):
+        print("\nRunning: test_k_larger_than_the_store_returns_what_exists")
+        store = web_retriever._build_faiss_store(["only"], [[1.0, 0.0]], [{}], MagicMock(spec=OpenAIEmbeddings))
+
+        results = await web_retriever.search_vector_store(store, [[1.0, 0.0]], 5)
+
+        self.assertEqual([[doc.page_content for doc in docs] for docs in results], [["only"]])
+
+
+class TestWarmUp(unittest.TestCase):
+
+    def setUp(self):
+        web_retriever._get_embeddings_model.cache_clear()
+        self.addCleanup(web_retriever._get_embeddings_model.cache_clear)
+
+    @patch('web_retriever.tiktoken.encoding_for_model')
+    @patch('web_retriever.OpenAIEmbeddings')
+    def test_creates_embedder_and_loads_tokenizer(self, mock_openai_embeddings_class, mock_encoding_for_model):
+        print("\nRunning: test_creates_embedder_and_loads_tokenizer")
+        mock_openai_embeddings_class.return_value = MagicMock(
+            tiktoken_enabled=True, tiktoken_model_name=None, model="text-embedding-ada-002"
         )
-        print("FAISS.afrom_documents failure test passed.")
+
+        web_retriever.warm_up("sk-fakekey123")
+
+        mock_encoding_for_model.assert_called_once_with("text-embedding-ada-002")
+        self.assertIs(web_retriever._get_embeddings_model("sk-fakekey123"), mock_openai_embeddings_class.return_value)
+        mock_openai_embeddings_class.assert_called_once_with(openai_api_key="sk-fakekey123", request_timeout=30, max_retries=3)
+
+    @patch('web_retriever.OpenAIEmbeddings')
+    def test_without_api_key_does_nothing(self, mock_openai_embeddings_class):
+        print("\nRunning: test_without_api_key_does_nothing")
+        web_retriever.warm_up(None)
+        mock_openai_embeddings_class.assert_not_called()
+
+
+class TestGetVectorStoreForURL(unittest.IsolatedAsyncioTestCase):
+
+    DUMMY_URL = "http://dummyurl.com"
+    DUMMY_API_KEY = "sk-fakekey123"
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        patcher = patch('web_retriever.INDEX_CACHE_DIR', self.cache_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.cache_dir.cleanup)
+        web_retriever._STORE_CACHE.clear()
+        web_retriever._STORE_LOCKS.clear()
+        web_retriever._URL_FINGERPRINTS.clear()
+        web_retriever._get_embeddings_model.cache_clear()
+        self.addCleanup(web_retriever._get_embeddings_model.cache_clear)
+        self.addCleanup(web_retriever._STORE_CACHE.clear)
+        self.addCleanup(web_retriever._STORE_LOCKS.clear)
+        self.addCleanup(web_retriever._URL_FINGERPRINTS.clear)
+
+    @patch('web_retriever.FAISS.load_local')
+    @patch('web_retriever.OpenAIEmbeddings')
+    @patch('web_retriever.create_vector_store_from_url', new_callable=AsyncMock)
+    @patch('web_retriever._fetch_url_fingerprint', new_callable=AsyncMock, return_value='"etag-1"')
+    async def test_second_request_loads_saved_index(
+        self, mock_fingerprint, mock_create, mock_embeddings_class, mock_load_local
+    ):
+        print("\nRunning: test_second_request_loads_saved_index")
+        mock_embeddings_class.return_value = MagicMock(model="text-embedding-ada-002")
+        built_store = MagicMock()
+        # Simulate FAISS.save_local by writing the index file the cache looks for.
+        built_store.save_local.side_effect = lambda path: os.makedirs(path) or open(os.path.join(path, "index.faiss"), "w").close()
+        mock_create.return_value = built_store
+        loaded_store = MagicMock()
+        mock_load_local.return_value = loaded_store
+
+        first = await web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+        web_retriever._STORE_CACHE.clear() # force the second call past the in-memory cache
+        second = await web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+
+        self.assertIs(first, built_store)
+        self.assertIs(second, loaded_store)
+        mock_create.assert_awaited_once_with(self.DUMMY_URL, self.DUMMY_API_KEY)
+        mock_load_local.assert_called_once()
+
+    @patch('web_retriever.OpenAIEmbeddings')
+    @patch('web_retriever.create_vector_store_from_url', new_callable=AsyncMock)
+    @patch('web_retriever._fetch_url_fingerprint', new_callable=AsyncMock)
+    async def test_new_page_version_replaces_old_index(self, mock_fingerprint, mock_create, mock_embeddings_class):
+        print("\nRunning: test_new_page_version_replaces_old_index")
+        mock_embeddings_class.return_value = MagicMock(model="text-embedding-ada-002")
+        built_store = MagicMock()
+        built_store.save_local.side_effect = lambda path: os.makedirs(path) or open(os.path.join(path, "index.faiss"), "w").close()
+        mock_create.return_value = built_store
+        other_page_dir = os.path.join(self.cache_dir.name, "other")
+        os.makedirs(other_page_dir)
+        with open(os.path.join(other_page_dir, "meta.json"), "w") as f:
+            json.dump({"url": "http://otherurl.com", "fingerprint": '"x"'}, f)
+
+        mock_fingerprint.return_value = '"etag-1"'
+        await web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+        mock_fingerprint.return_value = '"etag-2"'
+        web_retriever._URL_FINGERPRINTS.clear() # the page is revalidated once its validator expires
+        await web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+
+        remaining = sorted(os.listdir(self.cache_dir.name))
+        self.assertEqual(len(remaining), 2) # the current DUMMY_URL index and the other page's
+        self.assertIn("other", remaining)
+        current_dir = next(d for d in remaining if d != "other")
+        with open(os.path.join(self.cache_dir.name, current_dir, "meta.json")) as f:
+            meta = json.load(f)
+        self.assertEqual((meta["url"], meta["fingerprint"]), (self.DUMMY_URL, '"etag-2"'))
+
+    @patch('web_retriever.OpenAIEmbeddings')
+    @patch('web_retriever.create_vector_store_from_url', new_callable=AsyncMock)
+    @patch('web_retriever._fetch_url_fingerprint', new_callable=AsyncMock, return_value='"etag-1"')
+    async def test_hot_url_is_not_revalidated_until_its_validator_expires(
+        self, mock_fingerprint, mock_create, mock_embeddings_class
+    ):
+        print("\nRunning: test_hot_url_is_not_revalidated_until_its_validator_expires")
+        mock_embeddings_class.return_value = MagicMock(model="text-embedding-ada-002")
+        built_store = MagicMock()
+        built_store.save_local.side_effect = lambda path: os.makedirs(path) or open(os.path.join(path, "index.faiss"), "w").close()
+        mock_create.return_value = built_store
+
+        first = await web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+        second = await web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+
+        self.assertIs(second, first)
+        mock_fingerprint.assert_awaited_once_with(self.DUMMY_URL) # no HEAD request for the hot hit
+
+        with patch('web_retriever.URL_FINGERPRINT_TTL', 0):
+            third = await web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+
+        self.assertIs(third, first)
+        self.assertEqual(mock_fingerprint.await_count, 2)
+        mock_create.assert_awaited_once()
+
+    @patch('web_retriever.STORE_CACHE_MAX_ENTRIES', 1)
+    @patch('web_retriever.OpenAIEmbeddings')
+    @patch('web_retriever.create_vector_store_from_url', new_callable=AsyncMock)
+    @patch('web_retriever._fetch_url_fingerprint', new_callable=AsyncMock)
+    async def test_locks_are_dropped_for_uncached_keys(self, mock_fingerprint, mock_create, mock_embeddings_class):
+        print("\nRunning: test_locks_are_dropped_for_uncached_keys")
+        mock_embeddings_class.return_value = MagicMock(model="text-embedding-ada-002")
+        built_store = MagicMock()
+        built_store.save_local.side_effect = lambda path: os.makedirs(path) or open(os.path.join(path, "index.faiss"), "w").close()
+
+        mock_fingerprint.return_value = None
+        mock_create.return_value = None # the build fails
+        self.assertIsNone(await web_retriever.get_vector_store_for_url("http://broken.example", self.DUMMY_API_KEY))
+        self.assertEqual(web_retriever._STORE_LOCKS, {})
+
+        mock_create.return_value = built_store
+        mock_fingerprint.return_value = '"etag-1"'
+        await web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+        mock_fingerprint.return_value = '"etag-2"'
+        web_retriever._URL_FINGERPRINTS.clear()
+        await web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+
+        # Only the current page version keeps a lock; the superseded one went with its store.
+        self.assertEqual(list(web_retriever._STORE_LOCKS), list(web_retriever._STORE_CACHE))
+        self.assertEqual(len(web_retriever._STORE_LOCKS), 1)
+
+    @patch('web_retriever.OpenAIEmbeddings')
+    @patch('web_retriever.create_vector_store_from_url', new_callable=AsyncMock)
+    @patch('web_retriever._fetch_url_fingerprint', new_callable=AsyncMock, return_value=None)
+    async def test_no_fingerprint_skips_disk_cache(self, mock_fingerprint, mock_create, mock_embeddings_class):
+        print("\nRunning: test_no_fingerprint_skips_disk_cache")
+        built_store = MagicMock()
+        mock_create.return_value = built_store
+
+        vector_store = await web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY)
+
+        self.assertIs(vector_store, built_store)
+        built_store.save_local.assert_not_called()
+        self.assertEqual(os.listdir(self.cache_dir.name), [])
+
+    async def test_invalid_url_has_no_fingerprint(self):
+        print("\nRunning: test_invalid_url_has_no_fingerprint")
+        # httpx.InvalidURL is not an httpx.HTTPError; the caller falls back to the uncached path.
+        self.assertIsNone(await web_retriever._fetch_url_fingerprint("http://a:badport/"))
+
+    @patch('web_retriever.OpenAIEmbeddings')
+    @patch('web_retriever.create_vector_store_from_url', new_callable=AsyncMock)
+    @patch('web_retriever._fetch_url_fingerprint', new_callable=AsyncMock, return_value=None)
+    async def test_concurrent_requests_share_one_build(self, mock_fingerprint, mock_create, mock_embeddings_class):
+        print("\nRunning: test_concurrent_requests_share_one_build")
+        mock_embeddings_class.return_value = MagicMock(model="text-embedding-ada-002")
+        built_store = MagicMock()
+
+        async def slow_build(url, api_key):
+            await asyncio.sleep(0.01)
+            return built_store
+        mock_create.side_effect = slow_build
+
+        stores = await asyncio.gather(*(
+            web_retriever.get_vector_store_for_url(self.DUMMY_URL, self.DUMMY_API_KEY) for _ in range(3)
+        ))
+
+        self.assertTrue(all(store is built_store for store in stores))
+        mock_create.assert_awaited_once()
+
+    @patch('web_retriever.STORE_CACHE_MAX_ENTRIES', 1)
+    @patch('web_retriever.OpenAIEmbeddings')
+    @patch('web_retriever.create_vector_store_from_url', new_callable=AsyncMock)
+    @patch('web_retriever._fetch_url_fingerprint', new_callable=AsyncMock, return_value=None)
+    async def test_least_recently_used_store_is_evicted(self, mock_fingerprint, mock_create, mock_embeddings_class):
+        print("\nRunning: test_least_recently_used_store_is_evicted")
+        mock_embeddings_class.return_value = MagicMock(model="text-embedding-ada-002")
+        mock_create.side_effect = lambda url, api_key: MagicMock(name=url)
+
+        await web_retriever.get_vector_store_for_url("http://a.example", self.DUMMY_API_KEY)
+        await web_retriever.get_vector_store_for_url("http://b.example", self.DUMMY_API_KEY)
+        await web_retriever.get_vector_store_for_url("http://a.example", self.DUMMY_API_KEY)
+
+        self.assertEqual(mock_create.await_count, 3)
+        self.assertEqual(len(web_retriever._STORE_CACHE), 1)
+
+
+class TestSemanticCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.vector_store = MagicMock(embeddings=MagicMock(spec=OpenAIEmbeddings))
+
+    def test_similar_query_reuses_answer(self):
+        print("\nRunning: test_similar_query_reuses_answer")
+        self.assertIsNone(web_retriever.lookup_semantic_cache(self.vector_store, [1.0, 0.0], 3))
+
+        web_retriever.add_to_semantic_cache(self.vector_store, "what is this?", [1.0, 0.0], 3, "Relevant Chunk 1")
+
+        self.assertEqual(web_retriever.lookup_semantic_cache(self.vector_store, [0.9999, 0.01], 3), "Relevant Chunk 1")
+
+    def test_dissimilar_query_misses(self):
+        print("\nRunning: test_dissimilar_query_misses")
+        web_retriever.add_to_semantic_cache(self.vector_store, "what is this?", [1.0, 0.0], 3, "Relevant Chunk 1")
+        web_retriever.add_to_semantic_cache(self.vector_store, "who wrote it?", [0.0, 1.0], 3, "Relevant Chunk 2")
+
+        self.assertIsNone(web_retriever.lookup_semantic_cache(self.vector_store, [0.7071, 0.7071], 3))
+        self.assertEqual(web_retriever.lookup_semantic_cache(self.vector_store, [0.0, 1.0], 3), "Relevant Chunk 2")
+
+    def test_answer_for_a_different_k_misses(self):
+        print("\nRunning: test_answer_for_a_different_k_misses")
+        web_retriever.add_to_semantic_cache(self.vector_store, "what is this?", [1.0, 0.0], 3, "Relevant Chunk 1")
+
+        self.assertIsNone(web_retriever.lookup_semantic_cache(self.vector_store, [1.0, 0.0], 5))
+
+    def test_repeated_query_text_hits_without_an_embedding(self):
+        print("\nRunning: test_repeated_query_text_hits_without_an_embedding")
+        self.assertIsNone(web_retriever.lookup_query_cache(self.vector_store, "what is this?", 3))
+
+        web_retriever.add_to_semantic_cache(self.vector_store, "what is this?", [1.0, 0.0], 3, "Relevant Chunk 1")
+
+        self.assertEqual(web_retriever.lookup_query_cache(self.vector_store, "  What  is this? ", 3), "Relevant Chunk 1")
+        self.assertIsNone(web_retriever.lookup_query_cache(self.vector_store, "what is this?", 5))
+        self.assertIsNone(web_retriever.lookup_query_cache(self.vector_store, "what is that?", 3))
+
+    def test_caches_are_per_store(self):
+        print("\nRunning: test_caches_are_per_store")
+        web_retriever.add_to_semantic_cache(self.vector_store, "what is this?", [1.0, 0.0], 3, "Relevant Chunk 1")
+        other_store = MagicMock(embeddings=MagicMock(spec=OpenAIEmbeddings))
+
+        self.assertIsNone(web_retriever.lookup_semantic_cache(other_store, [1.0, 0.0], 3))
 
 
 if __name__ == '__main__':
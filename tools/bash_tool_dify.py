@@ -4,6 +4,11 @@ import sys
 import os
 from datetime import datetime
 import traceback
+import logging
+
+# Per-call debug tracing goes through logging (lazily formatted); bash_tool's BASH_TOOL_DEBUG=1
+# switch enables the underlying command trace as well.
+logger = logging.getLogger(__name__)
 
 # --- IMPORTANT: Python Path Configuration for Importing Original ADK Tool Logic ---
 adk_project_root_relative = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
@@ -13,8 +18,7 @@ if adk_project_root_relative not in sys.path:
 try:
     from bash_tool import run_bash_command
     original_bash_tool_module_found = True
-    timestamp_init_ok = datetime.now().isoformat()
-    print(f"DEBUG: [{timestamp_init_ok}] bash_tool_dify.py: Successfully imported run_bash_command from ADK project.", file=sys.stderr)
+    logger.debug("bash_tool_dify.py: Successfully imported run_bash_command from ADK project.")
 except ImportError as e:
     timestamp_init_err = datetime.now().isoformat()
     print(f"ERROR: [{timestamp_init_err}] bash_tool_dify.py: Could not import 'run_bash_command' from ADK project (path: {adk_project_root_relative}). Error: {e}. Ensure 'bash_tool.py' is accessible.", file=sys.stderr)
@@ -30,8 +34,7 @@ except ImportError as e:
 
 class BashToolDify(Tool):
     def _invoke(self, user_id: str, tool_parameters: Dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
-        timestamp_entry = datetime.now().isoformat()
-        print(f"DEBUG: [{timestamp_entry}] BashToolDify._invoke called by user '{user_id}' with parameters: {tool_parameters}", file=sys.stderr)
+        logger.debug("BashToolDify._invoke called by user '%s' with parameters: %s", user_id, tool_parameters)
 
         command = tool_parameters.get("command")
         # Dify should provide defaults based on YAML, but good to have fallbacks.
@@ -39,9 +42,8 @@ class BashToolDify(Tool):
         working_directory = tool_parameters.get("working_directory") 
 
         if not command:
-            timestamp_err_cmd = datetime.now().isoformat()
             error_msg = "Error: 'command' parameter is required for execute_bash tool."
-            print(f"DEBUG: [{timestamp_err_cmd}] BashToolDify._invoke: {error_msg}", file=sys.stderr)
+            logger.debug("BashToolDify._invoke: %s", error_msg)
             yield self.create_text_message(error_msg)
             return
 
@@ -59,15 +61,13 @@ class BashToolDify(Tool):
             return
             
         try:
-            timestamp_call = datetime.now().isoformat()
-            print(f"DEBUG: [{timestamp_call}] BashToolDify._invoke: Calling original run_bash_command with command='{command}', timeout={timeout}, working_directory='{working_directory}'", file=sys.stderr)
+            logger.debug("BashToolDify._invoke: Calling original run_bash_command with command='%s', timeout=%s, working_directory='%s'", command, timeout, working_directory)
             result = run_bash_command(
                 command=str(command), # Ensure command is string
                 timeout=int(timeout),
                 working_directory=str(working_directory) if working_directory is not None else None
             )
-            timestamp_result = datetime.now().isoformat()
-            print(f"DEBUG: [{timestamp_result}] BashToolDify._invoke: run_bash_command returned: {result}", file=sys.stderr)
+            logger.debug("BashToolDify._invoke: run_bash_command returned: %s", result)
             yield self.create_json_message(result)
 
         except Exception as e:
@@ -1,15 +1,113 @@
 import asyncio
+from collections import OrderedDict
 from langchain_community.document_loaders import WebBaseLoader
 from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter # For splitting text
 from langchain_openai.embeddings import OpenAIEmbeddings # For OpenAI embeddings
 from langchain_community.vectorstores import FAISS # For FAISS vector store
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore # For FAISS stores built around a custom index
 from datetime import datetime
+from functools import lru_cache
+import hashlib
+import importlib.util
+import json
+import faiss # For HNSW indexes and vector normalization
+import numpy as np
+import os
+import shutil
+import tiktoken # OpenAIEmbeddings' tokenizer, preloaded by warm_up
+import time
 import traceback
+import weakref
+
+# Optional: fetch pages through one pooled httpx.AsyncClient instead of a new connection per call.
+# Without httpx, get_web_content falls back to LangChain's WebBaseLoader.
+try:
+    import httpx
+    from bs4 import BeautifulSoup
+except ImportError:
+    httpx = None
+
+_HTTP_CLIENT = None # httpx.AsyncClient | None, created on first fetch
+
+
+def _get_http_client():
+    """
+    Returns the shared httpx.AsyncClient, creating it on first use (or after it was closed).
+    """
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None or _HTTP_CLIENT.is_closed:
+        _HTTP_CLIENT = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            timeout=httpx.Timeout(10.0),
+            follow_redirects=True,
+            http2=importlib.util.find_spec("h2") is not None, # HTTP/2 needs the optional 'h2' package
+            headers={"User-Agent": os.environ.get("USER_AGENT", "DeepBlue/1.0")}, # same variable WebBaseLoader reads
+        )
+    return _HTTP_CLIENT
+
+
+async def close_http_client():
+    """
+    Closes the shared httpx.AsyncClient, if one was created. Must run on the loop that used it.
+    """
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is not None:
+        client, _HTTP_CLIENT = _HTTP_CLIENT, None
+        await client.aclose()
+
+
+# A stalled embeddings request fails (and is retried) after this many seconds instead of hanging
+# the tool call; the client's default has no timeout.
+EMBEDDING_REQUEST_TIMEOUT = 30
+EMBEDDING_MAX_RETRIES = 3
+
+
+@lru_cache(maxsize=4)
+def _get_embeddings_model(openai_api_key: str) -> OpenAIEmbeddings:
+    """
+    Returns the OpenAIEmbeddings for an API key, created once so its HTTP clients (and their
+    kept-alive connections) are reused by every index build and query.
+    """
+    return OpenAIEmbeddings(
+        openai_api_key=openai_api_key, request_timeout=EMBEDDING_REQUEST_TIMEOUT, max_retries=EMBEDDING_MAX_RETRIES
+    )
+
+
+def warm_up(openai_api_key: str | None) -> None:
+    """
+    Creates the embeddings client and loads its tokenizer ahead of the first query, so the user's
+    first request does not pay for them (tiktoken fetches and parses its BPE table on first use).
+    Blocking; meant to run in a worker thread.
+
+    Args:
+        openai_api_key: The OpenAI API key, or None to skip (the RAG tool will not work anyway).
+    """
+    if not openai_api_key:
+        return
+    embeddings_model = _get_embeddings_model(openai_api_key)
+    if embeddings_model.tiktoken_enabled:
+        # Same lookup OpenAIEmbeddings does before tokenizing; tiktoken caches the encoding.
+        try:
+            tiktoken.encoding_for_model(embeddings_model.tiktoken_model_name or embeddings_model.model)
+        except KeyError:
+            tiktoken.get_encoding("cl100k_base")
+
+
+async def _fetch_page_text(url: str) -> str:
+    """
+    Fetches a page with the shared client and extracts its text the way WebBaseLoader does.
+    """
+    response = await _get_http_client().get(url)
+    response.raise_for_status()
+    # HTML parsing is CPU-bound; keep it off the event loop.
+    return await asyncio.to_thread(lambda: BeautifulSoup(response.text, "html.parser").get_text())
 
 async def get_web_content(url: str) -> str:
     """
-    Asynchronously loads content from a given URL using WebBaseLoader.
+    Asynchronously loads content from a given URL through the shared pooled httpx client,
+    or WebBaseLoader when httpx is not installed.
 
     Args:
         url: The URL to fetch content from.
@@ -28,16 +126,21 @@ async def get_web_content(url: str) -> str:
         print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting get_web_content (validation failed) with error: '{error_string}'")
         return error_string
 
-    loader = WebBaseLoader(url)
-    print(f"DEBUG: [%{datetime.now().isoformat()}] WebBaseLoader initialized for {url}")
     all_page_content = []
     try:
-        async for doc in loader.alazy_load():
-            if isinstance(doc, Document) and hasattr(doc, 'page_content'):
-                all_page_content.append(doc.page_content)
-            else:
-                # Handle cases where the item might not be a Document or lacks page_content
-                print(f"DEBUG: [%{datetime.now().isoformat()}] Warning: Encountered an unexpected item in loader: {doc}") 
+        if httpx is not None:
+            page_text = await _fetch_page_text(url)
+            if page_text:
+                all_page_content.append(page_text)
+        else:
+            loader = WebBaseLoader(url)
+            print(f"DEBUG: [%{datetime.now().isoformat()}] WebBaseLoader initialized for {url}")
+            async for doc in loader.alazy_load():
+                if isinstance(doc, Document) and hasattr(doc, 'page_content'):
+                    all_page_content.append(doc.page_content)
+                else:
+                    # Handle cases where the item might not be a Document or lacks page_content
+                    print(f"DEBUG: [%{datetime.now().isoformat()}] Warning: Encountered an unexpected item in loader: {doc}") 
         
         print(f"DEBUG: [%{datetime.now().isoformat()}] Loaded {len(all_page_content)} document parts from {url}")
         if not all_page_content:
@@ -55,6 +158,87 @@ async def get_web_content(url: str) -> str:
         print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting get_web_content (exception) with error: '{error_string}'")
         return error_string
 
+# Chunks per embeddings request, and how many requests may be in flight at once.
+EMBEDDING_BATCH_SIZE = 512
+EMBEDDING_CONCURRENCY = 5
+
+
+async def _embed_all(
+    texts: list[str], embedder: OpenAIEmbeddings,
+    batch_size: int = EMBEDDING_BATCH_SIZE, concurrency: int = EMBEDDING_CONCURRENCY,
+) -> list[list[float]]:
+    """
+    Embeds texts in batches of batch_size, with at most `concurrency` batches in flight.
+
+    Args:
+        texts: The texts to embed.
+        embedder: The embeddings model.
+        batch_size: The number of texts per embeddings request.
+        concurrency: The maximum number of concurrent embeddings requests.
+
+    Returns:
+        One embedding per text, in the same order as texts.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def embed_batch(batch: list[str]) -> list[list[float]]:
+        async with semaphore:
+            return await embedder.aembed_documents(batch)
+
+    # gather returns results in argument order, so the batches reassemble in text order.
+    batches = await asyncio.gather(*(
+        embed_batch(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)
+    ))
+    return [vector for batch in batches for vector in batch]
+
+
+# Pages with more chunks than this get an approximate HNSW index instead of an exact flat one. Its
+# vectors are stored as 8-bit scalar-quantized codes (4x smaller than float32, trained per page),
+# which shrinks the index in memory and on disk; small pages keep exact float32 vectors.
+HNSW_MIN_CHUNKS = 1024
+# Candidates HNSW explores per query: the recall/speed knob (FAISS defaults to 16). It is saved
+# with the index, so stores loaded from disk search the same way.
+HNSW_EF_SEARCH = 64
+
+# Stores hold unit-length vectors and rank by inner product, which for unit vectors is the cosine
+# similarity: one dot product per candidate, and the score needs no conversion. Queries must be
+# unit-length too (see embed_queries). Stores loaded from disk must be constructed the same way.
+_FAISS_STORE_KWARGS = {"distance_strategy": DistanceStrategy.MAX_INNER_PRODUCT}
+
+
+def _unit_vectors(vectors: list[list[float]]) -> list[list[float]]:
+    """
+    Returns the vectors scaled to unit L2 norm.
+    """
+    array = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(array)
+    return array.tolist()
+
+
+def _build_faiss_store(
+    texts: list[str], vectors: list[list[float]], metadatas: list[dict], embeddings_model: OpenAIEmbeddings
+) -> FAISS:
+    """
+    Builds an inner-product FAISS store from precomputed embeddings. Small pages get an exact
+    IndexFlatIP; above HNSW_MIN_CHUNKS chunks an 8-bit quantized IndexHNSWSQ makes each search
+    sub-linear and stores a quarter of the bytes.
+    """
+    vectors = _unit_vectors(vectors)
+    if len(vectors) <= HNSW_MIN_CHUNKS:
+        return FAISS.from_embeddings(
+            list(zip(texts, vectors)), embeddings_model, metadatas=metadatas, **_FAISS_STORE_KWARGS
+        )
+
+    print(f"DEBUG: [%{datetime.now().isoformat()}] Using a quantized HNSW index for {len(vectors)} chunks.")
+    index = faiss.IndexHNSWSQ(len(vectors[0]), faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+    index.train(np.asarray(vectors, dtype=np.float32)) # Learns the per-dimension value ranges
+    index.hnsw.efConstruction = 40
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    vector_store = FAISS(embeddings_model, index, InMemoryDocstore(), {}, **_FAISS_STORE_KWARGS)
+    vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+    return vector_store
+
+
 async def create_vector_store_from_url(url: str, openai_api_key: str) -> FAISS | None:
     """
     Creates a FAISS vector store from the content of a given URL.
@@ -92,18 +276,20 @@ async def create_vector_store_from_url(url: str, openai_api_key: str) -> FAISS |
     try:
         # 2. Initialize RecursiveCharacterTextSplitter
         # add_start_index can be helpful for locating the source of chunks.
+        chunk_size, chunk_overlap = 1000, 200
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, 
-            chunk_overlap=200,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
             add_start_index=True
         )
-        print(f"DEBUG: [%{datetime.now().isoformat()}] Initialized RecursiveCharacterTextSplitter with chunk_size={text_splitter.chunk_size}, chunk_overlap={text_splitter.chunk_overlap}")
+        print(f"DEBUG: [%{datetime.now().isoformat()}] Initialized RecursiveCharacterTextSplitter with chunk_size={chunk_size}, chunk_overlap={chunk_overlap}")
 
         # 3. Split the text into document chunks
         # create_documents expects a list of texts. We have one large text.
-        # It will create Document objects for each chunk.
+        # It will create Document objects for each chunk. Splitting is CPU-bound, so it runs in a
+        # worker thread to keep the event loop (and every other tool call on it) responsive.
         print(f"DEBUG: [%{datetime.now().isoformat()}] Splitting document into chunks...")
-        split_docs = await text_splitter.acreate_documents([raw_text_content])
+        split_docs = await asyncio.to_thread(text_splitter.create_documents, [raw_text_content])
         
         if not split_docs:
             print(f"DEBUG: [%{datetime.now().isoformat()}] Text splitting resulted in no documents. Cannot create vector store.")
@@ -113,13 +299,17 @@ async def create_vector_store_from_url(url: str, openai_api_key: str) -> FAISS |
 
         # 4. Initialize OpenAIEmbeddings
         print(f"DEBUG: [%{datetime.now().isoformat()}] Initializing OpenAI embeddings model...")
-        embeddings_model = OpenAIEmbeddings(openai_api_key=openai_api_key)
+        embeddings_model = _get_embeddings_model(openai_api_key)
         print(f"DEBUG: [%{datetime.now().isoformat()}] OpenAIEmbeddings model initialized.")
 
-        # 5. Create FAISS vector store
+        # 5. Embed the chunks in concurrent batches, then build the FAISS index off the event loop
+        print(f"DEBUG: [%{datetime.now().isoformat()}] Embedding {len(split_docs)} chunks...")
+        texts = [doc.page_content for doc in split_docs]
+        vectors = await _embed_all(texts, embeddings_model)
         print(f"DEBUG: [%{datetime.now().isoformat()}] Creating FAISS vector store from documents and embeddings...")
-        # FAISS.afrom_documents is the asynchronous method to create the store
-        vector_store = await FAISS.afrom_documents(split_docs, embeddings_model)
+        vector_store = await asyncio.to_thread(
+            _build_faiss_store, texts, vectors, [doc.metadata for doc in split_docs], embeddings_model
+        )
         print(f"DEBUG: [%{datetime.now().isoformat()}] FAISS vector store created successfully.")
         
         print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting create_vector_store_from_url successfully. Returning FAISS vector store instance.")
@@ -132,6 +322,282 @@ async def create_vector_store_from_url(url: str, openai_api_key: str) -> FAISS |
         print(f"DEBUG: [%{datetime.now().isoformat()}] Exiting create_vector_store_from_url (exception during creation) returning None.")
         return None
 
+# Built FAISS indexes are saved here, one directory per (URL, page version, embedding model).
+INDEX_CACHE_DIR = os.path.expanduser(os.environ.get("DEEPBLUE_FAISS_CACHE_DIR", "~/.cache/deepblue/faiss"))
+
+# Most recently used vector stores kept in memory so hot URLs skip the disk load.
+STORE_CACHE_MAX_ENTRIES = 32
+_STORE_CACHE: "OrderedDict[str, FAISS]" = OrderedDict()
+_STORE_LOCKS: dict[str, asyncio.Lock] = {} # one lock per cache key, so a URL is only built once at a time
+
+# Page validators from recent HEAD requests, so hot URLs are served from _STORE_CACHE without a round
+# trip to their server; a URL is revalidated once its validator is older than URL_FINGERPRINT_TTL.
+URL_FINGERPRINT_TTL = float(os.environ.get("DEEPBLUE_URL_FINGERPRINT_TTL", "60")) # Seconds
+_URL_FINGERPRINTS: "OrderedDict[str, tuple[float, str | None]]" = OrderedDict() # url -> (checked at, validator)
+
+
+async def _fetch_url_fingerprint(url: str) -> str | None:
+    """
+    Returns the ETag or Last-Modified validator of a URL from a HEAD request, or None if the
+    server sends neither (or httpx is not installed), in which case the index is not saved to disk.
+    """
+    if httpx is None:
+        return None
+    try:
+        response = await _get_http_client().head(url)
+    except (httpx.HTTPError, httpx.InvalidURL, ValueError) as e: # InvalidURL is not an HTTPError
+        print(f"DEBUG: [%{datetime.now().isoformat()}] HEAD request for {url} failed: {e}")
+        return None
+    return response.headers.get("etag") or response.headers.get("last-modified")
+
+
+async def _get_url_fingerprint(url: str) -> str | None:
+    """
+    Returns the page validator of a URL, from _URL_FINGERPRINTS if it was checked less than
+    URL_FINGERPRINT_TTL seconds ago, otherwise from a new HEAD request.
+    """
+    cached = _URL_FINGERPRINTS.get(url)
+    if cached is not None and time.monotonic() - cached[0] < URL_FINGERPRINT_TTL:
+        _URL_FINGERPRINTS.move_to_end(url)
+        return cached[1]
+    fingerprint = await _fetch_url_fingerprint(url)
+    _URL_FINGERPRINTS[url] = (time.monotonic(), fingerprint)
+    _URL_FINGERPRINTS.move_to_end(url)
+    if len(_URL_FINGERPRINTS) > STORE_CACHE_MAX_ENTRIES:
+        _URL_FINGERPRINTS.popitem(last=False)
+    return fingerprint
+
+
+def _drop_unused_store_locks() -> None:
+    """
+    Drops the locks of keys that are neither cached nor being built, such as URLs whose build
+    failed and page versions that have been superseded, so _STORE_LOCKS stays bounded.
+    """
+    for key in [key for key, lock in _STORE_LOCKS.items() if key not in _STORE_CACHE and not lock.locked()]:
+        del _STORE_LOCKS[key]
+
+
+def _save_index(vector_store: FAISS, index_dir: str, url: str, fingerprint: str) -> None:
+    """
+    Saves vector_store to index_dir with a meta.json sidecar (URL, page validator, save time),
+    then deletes indexes saved for earlier versions of the same page. Blocking.
+    """
+    vector_store.save_local(index_dir)
+    with open(os.path.join(index_dir, "meta.json"), "w") as f:
+        json.dump({"url": url, "fingerprint": fingerprint, "saved_at": datetime.now().isoformat()}, f)
+
+    for entry in os.scandir(INDEX_CACHE_DIR):
+        if not entry.is_dir() or entry.path == index_dir:
+            continue
+        try:
+            with open(os.path.join(entry.path, "meta.json")) as f:
+                stale = json.load(f).get("url") == url
+        except (OSError, ValueError):
+            continue # not one of ours, or saved before sidecars existed
+        if stale:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            print(f"DEBUG: [%{datetime.now().isoformat()}] Removed superseded FAISS index {entry.path} for {url}")
+
+
+async def _load_or_build_vector_store(
+    url: str, openai_api_key: str, embeddings_model: OpenAIEmbeddings, fingerprint: str | None, index_dir: str
+) -> FAISS | None:
+    """
+    Loads the FAISS index saved in index_dir, or builds it from the URL and saves it there.
+    Without a fingerprint the page cannot be revalidated, so the disk cache is skipped.
+    """
+    if fingerprint is None:
+        print(f"DEBUG: [%{datetime.now().isoformat()}] No ETag/Last-Modified for {url}; building vector store without the disk cache.")
+        return await create_vector_store_from_url(url, openai_api_key)
+
+    if os.path.exists(os.path.join(index_dir, "index.faiss")):
+        try:
+            vector_store = await asyncio.to_thread(
+                FAISS.load_local, index_dir, embeddings_model, allow_dangerous_deserialization=True,
+                **_FAISS_STORE_KWARGS,
+            )
+            print(f"DEBUG: [%{datetime.now().isoformat()}] Loaded cached FAISS index for {url} from {index_dir}")
+            return vector_store
+        except Exception as e:
+            print(f"DEBUG: [%{datetime.now().isoformat()}] Could not load cached FAISS index {index_dir}: {e}. Rebuilding.")
+
+    vector_store = await create_vector_store_from_url(url, openai_api_key)
+    if vector_store is not None:
+        try:
+            await asyncio.to_thread(_save_index, vector_store, index_dir, url, fingerprint)
+            print(f"DEBUG: [%{datetime.now().isoformat()}] Saved FAISS index for {url} to {index_dir}")
+        except Exception as e:
+            print(f"DEBUG: [%{datetime.now().isoformat()}] Could not save FAISS index to {index_dir}: {e}")
+    return vector_store
+
+
+async def get_vector_store_for_url(url: str, openai_api_key: str) -> FAISS | None:
+    """
+    Returns a FAISS vector store for the content of a URL. Stores stay resident in an in-process
+    LRU (STORE_CACHE_MAX_ENTRIES) keyed by URL, page validator and embedding model. The validator comes
+    from a HEAD request at most every URL_FINGERPRINT_TTL seconds per URL. On a miss the
+    index is loaded from INDEX_CACHE_DIR when the page has not changed since it was last indexed,
+    and built (then saved) otherwise. Concurrent requests for the same key share one build.
+
+    Args:
+        url: The URL to fetch content from.
+        openai_api_key: The OpenAI API key for generating embeddings.
+
+    Returns:
+        A FAISS vector store instance if successful, otherwise None.
+    """
+    fingerprint = await _get_url_fingerprint(url)
+    embeddings_model = _get_embeddings_model(openai_api_key)
+    # "ip-sq8" marks the index format (inner product, quantized HNSW for large pages), so indexes
+    # saved by older versions are not reused.
+    cache_key = hashlib.sha256(f"{url}\n{fingerprint or ''}\n{embeddings_model.model}\nip-sq8".encode()).hexdigest()
+
+    lock = _STORE_LOCKS.setdefault(cache_key, asyncio.Lock())
+    try:
+        async with lock:
+            if cache_key in _STORE_CACHE:
+                _STORE_CACHE.move_to_end(cache_key)
+                print(f"DEBUG: [%{datetime.now().isoformat()}] Using in-memory vector store for {url}")
+                return _STORE_CACHE[cache_key]
+
+            vector_store = await _load_or_build_vector_store(
+                url, openai_api_key, embeddings_model, fingerprint, os.path.join(INDEX_CACHE_DIR, cache_key)
+            )
+            if vector_store is not None:
+                _STORE_CACHE[cache_key] = vector_store
+                if len(_STORE_CACHE) > STORE_CACHE_MAX_ENTRIES:
+                    _STORE_CACHE.popitem(last=False)
+            return vector_store
+    finally:
+        _drop_unused_store_locks()
+
+# Queries whose embedding is at least this cosine-similar to an earlier query on the same store
+# reuse that query's formatted answer instead of searching the store again.
+SEMANTIC_CACHE_MIN_SIMILARITY = 0.95
+# Per vector store, a small FAISS index of past query embeddings with the answer as metadata.
+# Weak keys: when a store leaves the LRU (or the page changes), its query cache goes with it.
+_QUERY_CACHES: "weakref.WeakKeyDictionary[FAISS, FAISS]" = weakref.WeakKeyDictionary()
+# Per vector store, answers keyed by (normalized query text, k). A repeated query is answered from
+# here before it is embedded, so it costs no embeddings request at all.
+_QUERY_TEXT_CACHES: "weakref.WeakKeyDictionary[FAISS, dict[tuple[str, int], str]]" = weakref.WeakKeyDictionary()
+
+
+def _query_text_key(query: str, k: int) -> tuple[str, int]:
+    """
+    Returns the exact-match cache key for a query: case and whitespace differences are ignored.
+    """
+    return " ".join(query.split()).casefold(), k
+
+
+async def embed_queries(vector_store: FAISS, queries: list[str]) -> list[list[float]]:
+    """
+    Embeds queries with the store's embeddings model in one request, normalized to unit length to
+    match the store's vectors. The results serve both the semantic cache and the store search.
+
+    Args:
+        vector_store: The store the queries will be answered from.
+        queries: The query texts.
+
+    Returns:
+        One unit-length embedding per query, in order.
+    """
+    return _unit_vectors(await vector_store.embeddings.aembed_documents(queries))
+
+
+def _search_by_vectors(vector_store: FAISS, query_embeddings: list[list[float]], k: int) -> list[list[Document]]:
+    """
+    Runs one FAISS search for all query embeddings (a single matrix call instead of one LangChain
+    call per query) and maps the hits back to their documents. Blocking.
+    """
+    _, hit_ids = vector_store.index.search(np.asarray(query_embeddings, dtype=np.float32), k)
+    return [
+        [vector_store.docstore.search(vector_store.index_to_docstore_id[i]) for i in row if i != -1]
+        for row in hit_ids
+    ]
+
+
+async def search_vector_store(vector_store: FAISS, query_embeddings: list[list[float]], k: int) -> list[list[Document]]:
+    """
+    Returns the k most similar chunks for each query embedding, searched in one batch off the
+    event loop.
+
+    Args:
+        vector_store: The store to search.
+        query_embeddings: Unit-length query embeddings (from embed_queries).
+        k: The number of chunks per query.
+
+    Returns:
+        One list of documents per query embedding, most similar first.
+    """
+    return await asyncio.to_thread(_search_by_vectors, vector_store, query_embeddings, k)
+
+
+def lookup_query_cache(vector_store: FAISS, query: str, k: int) -> str | None:
+    """
+    Returns the answer cached for an earlier query on vector_store with the same text (ignoring
+    case and whitespace) and number of chunks. Checked before embedding the query.
+
+    Args:
+        vector_store: The store the query is being answered from.
+        query: The query text.
+        k: The number of chunks the answer should contain.
+
+    Returns:
+        The cached answer, or None on a miss.
+    """
+    text_cache = _QUERY_TEXT_CACHES.get(vector_store)
+    if text_cache is None:
+        return None
+    return text_cache.get(_query_text_key(query, k))
+
+
+def lookup_semantic_cache(vector_store: FAISS, query_embedding: list[float], k: int) -> str | None:
+    """
+    Returns the answer cached for the most similar earlier query on vector_store, if that query
+    is at least SEMANTIC_CACHE_MIN_SIMILARITY cosine-similar to query_embedding and asked for the
+    same number of chunks.
+
+    Args:
+        vector_store: The store the query is being answered from.
+        query_embedding: The unit-length embedding of the new query (from embed_queries).
+        k: The number of chunks the answer should contain.
+
+    Returns:
+        The cached answer, or None on a miss.
+    """
+    query_cache = _QUERY_CACHES.get(vector_store)
+    if query_cache is None:
+        return None
+    matches = query_cache.similarity_search_with_score_by_vector(query_embedding, k=1)
+    if not matches:
+        return None
+    cached_doc, similarity = matches[0] # inner product of unit vectors, i.e. cosine similarity
+    if similarity < SEMANTIC_CACHE_MIN_SIMILARITY or cached_doc.metadata["k"] != k:
+        return None
+    print(f"DEBUG: [%{datetime.now().isoformat()}] Semantic cache hit for query similar to '{cached_doc.page_content}'")
+    return cached_doc.metadata["result"]
+
+
+def add_to_semantic_cache(vector_store: FAISS, query: str, query_embedding: list[float], k: int, result: str) -> None:
+    """
+    Records the answer to a query so repeated and similar later queries on vector_store can reuse it.
+
+    Args:
+        vector_store: The store the query was answered from.
+        query: The query text.
+        query_embedding: The unit-length embedding of the query (from embed_queries).
+        k: The number of chunks in the answer.
+        result: The formatted answer returned for the query.
+    """
+    query_cache = _QUERY_CACHES.get(vector_store)
+    if query_cache is None:
+        _QUERY_CACHES[vector_store] = FAISS.from_embeddings(
+            [(query, query_embedding)], vector_store.embeddings, metadatas=[{"result": result, "k": k}], **_FAISS_STORE_KWARGS
+        )
+    else:
+        query_cache.add_embeddings([(query, query_embedding)], metadatas=[{"result": result, "k": k}])
+    _QUERY_TEXT_CACHES.setdefault(vector_store, {})[_query_text_key(query, k)] = result
+
 # Example of how to run these async functions (optional, for testing)
 # if __name__ == '__main__':
 #     async def main():